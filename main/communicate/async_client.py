@@ -0,0 +1,209 @@
+"""
+事件驅動的手臂連線 (asyncio)
+───────────────────────────────────────────────────
+取代 main.py 的輪詢迴圈 (2 秒 socket timeout + loading 動畫 + 任何錯誤睡 5 秒)：
+‣ 非阻塞讀取：資料一到就經 codec.FrameDecoder 切訊框，立即分派，不受輪詢週期限制
+‣ 指令分派：client.on("MOVING") 註冊處理函式 (async，回傳要送的訊息 list 或 None)
+‣ 心跳：TCP keepalive (閒置 KEEPALIVE_IDLE 秒開始探測，約 20 秒內) 偵測半開連線；
+  idle_timeout 秒沒收到任何資料且沒有進行中的工作 → 主動重連；
+  heartbeat_msg 有值 (控制器認得的指令) 時另外每 heartbeat_sec 送一次，送不出去就斷線重連
+‣ 重連：指數退避 backoff_base·2ⁿ (上限 backoff_max) 乘上隨機抖動；
+  連上後維持超過 stable_sec 才歸零，連上就被踢掉的伺服器不會被全速重試
+‣ 進行中的工作：run_blocking() 把拍照 / 偵測丟到執行緒池，讀取迴圈照常收 EXIT 等指令；
+  同一條連線上同一 key 的工作還沒做完又收到請求 → 共用同一個結果 (不會重複拍照)；
+  連線斷掉時舊連線的回覆直接作廢，新連線的請求也不會接上舊連線留下的工作
+
+    client = RobotClient(HOST, PORT)
+
+    @client.on("MOVING")
+    async def _(msg):
+        return await client.run_blocking("MOVING", shot_reply)
+
+    asyncio.run(client.run())
+"""
+import random
+import socket
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from communicate.codec import FrameDecoder, encode, encode_batch, set_keepalive, set_nodelay
+import tracing
+
+HEARTBEAT_SEC   = 5.0
+IDLE_TIMEOUT    = 120.0     # 秒；None = 不因閒置重連 (控制器平常不主動送資料，設太短會一直重連)
+KEEPALIVE_IDLE  = 10        # TCP keepalive：閒置幾秒開始探測
+KEEPALIVE_INTVL = 3         #                探測間隔 (秒)，KEEPALIVE_CNT 次沒回應即斷線
+KEEPALIVE_CNT   = 3
+STABLE_SEC      = 10.0      # 連線維持超過此秒數才把退避次數歸零
+CONNECT_TIMEOUT = 3.0
+BACKOFF_BASE    = 0.5
+BACKOFF_MAX     = 10.0
+JITTER          = 0.5       # 每次等待乘上 (1 − JITTER·rand)
+EXIT_DELAY      = 5.0       # 收到 EXIT 後等多久再連 (同原本 main.py)
+
+Handler = Callable[[str], Awaitable[Optional[List[str]]]]
+log = tracing.get_logger("client")
+
+
+class RobotClient:
+    def __init__(self, host: str, port: int, *, heartbeat_sec: float = HEARTBEAT_SEC,
+                 heartbeat_msg: Optional[str] = None, idle_timeout: Optional[float] = IDLE_TIMEOUT,
+                 connect_timeout: float = CONNECT_TIMEOUT, backoff_base: float = BACKOFF_BASE,
+                 backoff_max: float = BACKOFF_MAX, jitter: float = JITTER, stable_sec: float = STABLE_SEC,
+                 exit_cmd: str = "EXIT", exit_delay: float = EXIT_DELAY, workers: int = 1):
+        self.host, self.port = host, port
+        self.heartbeat_sec, self.heartbeat_msg = heartbeat_sec, heartbeat_msg
+        self.idle_timeout, self.connect_timeout = idle_timeout, connect_timeout
+        self.backoff_base, self.backoff_max, self.jitter = backoff_base, backoff_max, jitter
+        self.stable_sec = stable_sec
+        self.exit_cmd, self.exit_delay = exit_cmd, exit_delay
+        self.handlers: Dict[str, Handler] = {}
+        self.stats = {"connects": 0, "messages": 0, "coalesced": 0, "dropped_replies": 0, "idle_reconnects": 0}
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="robot-work")
+        self._inflight: Dict[tuple, asyncio.Future] = {}     # (連線世代, key) → 進行中的工作
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._gen = 0                  # 連線世代；回覆只送給發出請求的那條連線
+
+    # ── 註冊 / 送出 ───────────────────────────────
+    def on(self, cmd: str):
+        def deco(fn: Handler) -> Handler:
+            self.handlers[cmd] = fn
+            return fn
+        return deco
+
+    async def send(self, *payloads: str) -> None:
+        w = self._writer
+        if w is None:
+            raise ConnectionError("尚未連線")
+        msg = encode_batch(payloads)
+        with tracing.span("tcp.send"):
+            w.write(msg)
+            await w.drain()
+        log.debug("已送出訊息：%s", msg.decode('utf-8'))
+
+    async def run_blocking(self, key: str, fn, *args):
+        """阻塞工作丟執行緒池；同一連線世代、同 key 進行中就共用結果"""
+        key = (self._gen, key)
+        fut = self._inflight.get(key)
+        if fut is None:
+            ctx = contextvars.copy_context()      # 帶上 tracing.cycle 編號
+            fut = asyncio.get_running_loop().run_in_executor(self._executor, ctx.run, fn, *args)
+            self._inflight[key] = fut
+            fut.add_done_callback(lambda f: self._inflight.pop(key, None) if self._inflight.get(key) is f else None)
+        else:
+            self.stats["coalesced"] += 1
+        return await asyncio.shield(fut)          # 請求被取消 (斷線) 不影響背景工作
+
+    # ── 主迴圈 ────────────────────────────────────
+    def _backoff(self, attempt: int) -> float:
+        d = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+        return d * (1 - self.jitter * random.random())
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        attempt = 0
+        while True:
+            try:
+                log.info("嘗試連線到 %s:%s...", self.host, self.port)
+                reader, writer = await asyncio.wait_for(
+                    asyncio.open_connection(self.host, self.port), self.connect_timeout)
+            except (OSError, asyncio.TimeoutError) as e:
+                delay = self._backoff(attempt)
+                attempt += 1
+                log.warning("連線失敗: %r，%.1f 秒後重試", e, delay)
+                await asyncio.sleep(delay)
+                continue
+            self.stats["connects"] += 1
+            log.info("已連線成功！")
+            t0 = loop.time()
+            delay = await self._session(reader, writer)
+            if loop.time() - t0 >= self.stable_sec:
+                attempt = 0                               # 連線有撐住才歸零
+            if delay is None:
+                delay = self._backoff(attempt)
+                attempt += 1
+                log.info("%.1f 秒後重新連線", delay)
+            await asyncio.sleep(delay)
+
+    async def _session(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> Optional[float]:
+        """處理一條連線直到斷線 → 回傳重連前要等的秒數；None = 異常斷線，由 run() 退避"""
+        sock = writer.get_extra_info("socket")
+        if sock is not None:
+            set_nodelay(sock)
+            set_keepalive(sock, KEEPALIVE_IDLE, KEEPALIVE_INTVL, KEEPALIVE_CNT)
+        self._gen += 1
+        gen, self._writer = self._gen, writer
+        dec = FrameDecoder()
+        tasks: set = set()
+        hb = None
+        if self.heartbeat_msg:
+            hb = asyncio.create_task(self._heartbeat(writer))
+            hb.add_done_callback(lambda t: self._heartbeat_done(t, writer))
+        try:
+            while True:
+                try:
+                    data = await asyncio.wait_for(reader.read(4096), self.idle_timeout)
+                except asyncio.TimeoutError:
+                    if tasks:
+                        continue                          # 工作進行中，控制器本來就在等回覆
+                    log.warning("%.1f 秒沒有資料，重新連線", self.idle_timeout)
+                    self.stats["idle_reconnects"] += 1
+                    return 0.0
+                if not data:
+                    log.warning("伺服器已關閉連線")
+                    return None
+                for msg in dec.feed(data):
+                    self.stats["messages"] += 1
+                    log.debug("收到伺服器訊息：%s", msg)
+                    if msg == self.exit_cmd:
+                        log.info("伺服器結束連線，%.0f 秒後嘗試重新連線", self.exit_delay)
+                        return self.exit_delay
+                    fn = self.handlers.get(msg)
+                    if fn is None:
+                        continue                          # 其他訊息：忽略
+                    t = asyncio.create_task(self._dispatch(fn, msg, gen))
+                    tasks.add(t)
+                    t.add_done_callback(tasks.discard)
+        except (OSError, ConnectionError) as e:
+            log.warning("連線異常：%r", e)
+            return None
+        finally:
+            if hb is not None:
+                hb.cancel()
+            for t in tasks:                               # 舊連線的回覆作廢
+                t.cancel()
+            self._writer = None
+            writer.close()
+
+    async def _dispatch(self, fn: Handler, msg: str, gen: int) -> None:
+        try:
+            with tracing.cycle(msg):                      # 收到指令 → 回覆送出 算一輪
+                reply = await fn(msg)
+                if not reply:
+                    return
+                if gen != self._gen:
+                    self.stats["dropped_replies"] += 1
+                    return
+                await self.send(*reply)
+        except asyncio.CancelledError:
+            self.stats["dropped_replies"] += 1
+            raise
+        except Exception as e:
+            log.error("[Client] 處理 %s 失敗：%r", msg, e)
+
+    @staticmethod
+    def _heartbeat_done(task: asyncio.Task, writer: asyncio.StreamWriter) -> None:
+        """心跳送不出去 = 連線已壞：記錄原因並中止連線，讀取迴圈隨即收到斷線"""
+        if task.cancelled() or task.exception() is None:
+            return
+        log.warning("心跳失敗：%r，中止連線", task.exception())
+        writer.transport.abort()
+
+    async def _heartbeat(self, writer: asyncio.StreamWriter) -> None:
+        frame = encode(self.heartbeat_msg)
+        while True:
+            await asyncio.sleep(self.heartbeat_sec)
+            writer.write(frame)
+            await writer.drain()
@@ -0,0 +1,120 @@
+"""
+串流訊框編解碼 (手臂連線)
+───────────────────────────────────────────────────
+TCP 是位元組串流，不保證一次 recv 剛好一則訊息：
+"{MOVING}" 可能被拆成 "{MOV" + "ING}"，也可能和下一則黏成 "{MOVING}{EXIT}"。
+FrameDecoder 持有一個持續累積的接收緩衝 (bytearray)，每次 feed 後
+以 memoryview 切出所有完整訊框，剩下的半截留到下次。
+
+訊框格式：
+‣ 文字：{payload}              (UTF-8，payload 不含 '}'；原本的協定)
+‣ 二進位 (選用)：STX(0x02) + 長度 2 bytes (big-endian) + payload
+  decoder 以 binary=True 建立才會解析；文字訊框回 str、二進位回 bytes。
+訊框之間的其他位元組 (換行、雜訊) 直接略過並重新同步。
+
+送出端 encode_batch 把多則訊息接成一個 buffer，一次 sendall；
+set_nodelay 關閉 Nagle，小封包不會被延遲合併；set_keepalive 開啟 TCP keepalive 並縮短探測間隔。
+"""
+import socket
+import struct
+from typing import Iterable, List, Union
+
+STX       = 0x02
+MAX_FRAME = 64 * 1024      # 單一訊框上限；超過視為雜訊丟棄
+_LEN      = struct.Struct(">H")
+
+Frame = Union[str, bytes]
+
+
+# ═════════ 編碼 ═════════
+
+def encode(payload: str) -> bytes:
+    return f"{{{payload}}}".encode("utf-8")
+
+
+def encode_binary(payload: bytes) -> bytes:
+    if len(payload) > 0xFFFF:
+        raise ValueError("二進位訊框最長 65535 bytes")
+    return bytes([STX]) + _LEN.pack(len(payload)) + payload
+
+
+def encode_batch(frames: Iterable[Frame]) -> bytes:
+    """多則訊息 (str → 文字訊框、bytes → 二進位訊框) 接成一個 buffer"""
+    return b"".join(encode_binary(f) if isinstance(f, (bytes, bytearray)) else encode(f)
+                    for f in frames)
+
+
+def set_nodelay(sock: socket.socket) -> None:
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+
+def set_keepalive(sock: socket.socket, idle: int = 10, interval: int = 3, count: int = 3) -> None:
+    """閒置 idle 秒後每 interval 秒探測一次，count 次沒回應 → 讀取端收到錯誤
+
+    系統預設閒置約 2 小時才開始探測，半開連線 (拔線、控制器當機) 要等很久才發現。
+    """
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    if hasattr(socket, "TCP_KEEPIDLE"):                                  # Linux
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, idle)
+    elif hasattr(socket, "TCP_KEEPALIVE"):                               # macOS
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPALIVE, idle)
+    if hasattr(socket, "TCP_KEEPINTVL"):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, interval)
+    if hasattr(socket, "TCP_KEEPCNT"):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPCNT, count)
+    if hasattr(socket, "SIO_KEEPALIVE_VALS") and hasattr(sock, "ioctl"):  # Windows (次數固定 10)
+        sock.ioctl(socket.SIO_KEEPALIVE_VALS, (1, idle * 1000, interval * 1000))
+
+
+# ═════════ 解碼 ═════════
+
+class FrameDecoder:
+    def __init__(self, binary: bool = False, max_frame: int = MAX_FRAME):
+        self.binary = binary
+        self.max_frame = max_frame
+        self._buf = bytearray()
+        self.dropped = 0            # 被略過的雜訊位元組數
+
+    def __len__(self) -> int:
+        """緩衝中尚未成框的位元組數"""
+        return len(self._buf)
+
+    def feed(self, data: bytes) -> List[Frame]:
+        """加入新收到的資料，回傳這次湊出的所有完整訊框 (依序)"""
+        self._buf += data
+        out: List[Frame] = []
+        buf = self._buf
+        mv = memoryview(buf)
+        pos, n = 0, len(buf)
+        try:
+            while pos < n:
+                b = buf[pos]
+                if b == 0x7B:                                   # '{'
+                    end = buf.find(b"}", pos + 1)
+                    if end < 0:
+                        if n - pos > self.max_frame + 2:        # 永遠等不到 '}' → 丟掉重新同步
+                            self.dropped += 1; pos += 1; continue
+                        break
+                    out.append(str(mv[pos + 1:end], "utf-8", "replace"))
+                    pos = end + 1
+                elif b == STX and self.binary:
+                    if n - pos < 3:
+                        break
+                    ln = _LEN.unpack_from(mv, pos + 1)[0]
+                    if n - pos - 3 < ln:
+                        break
+                    out.append(bytes(mv[pos + 3:pos + 3 + ln]))
+                    pos += 3 + ln
+                else:                                           # 雜訊：跳到下一個可能的訊框開頭
+                    nxt = buf.find(b"{", pos + 1)
+                    if self.binary:
+                        s = buf.find(bytes([STX]), pos + 1)
+                        if s >= 0 and (nxt < 0 or s < nxt): nxt = s
+                    nxt = n if nxt < 0 else nxt
+                    self.dropped += nxt - pos
+                    pos = nxt
+        finally:
+            mv.release()
+        del buf[:pos]
+        return out
+
@@ -0,0 +1,257 @@
+"""
+HIWIN 控制器模擬器 / 壓力測試
+───────────────────────────────────────────────────
+在本機扮演控制器 (TCP server)，講同一套 {...} 協定：送 MOVING / EXIT，
+收視覺端的 "100" + "角度, x, y"、"101" + 候選清單 (MOVING_MULTI) 或 "200"。不接手臂也能跑完整個
+main.py 迴圈並量測每一輪的端到端時間 (MOVING 送出 → 回覆收齊)。
+
+‣ 腳本：步驟 list，每步一個 dict
+    {"send": "MOVING"}        送一則訊息；送 EXIT 後結束這條連線 (視覺端 EXIT_DELAY 秒後重連)
+    {"reply": 30}             等回覆 (秒)，記一輪 cycle
+    {"sleep": 1.0}            等待
+    {"disconnect": true}      主動斷線 (測重連)
+  斷線 / EXIT 後，下一條連線從下一步繼續。
+  內建 SCENARIOS：single / exit / cycles (--cycles N 壓力模式) / flaky / multi；
+  或 --script steps.json 自訂。
+‣ 注入：--latency / --jitter (ms，每則送出前延遲)、
+  --split N (訊框拆成 ≤N bytes 的小段分批送)、--drop P (送出 MOVING 後以機率 P 斷線)
+‣ 送出 MOVING 後、回覆收齊前連線中斷 → 記一輪 "lost" (失敗)，不會被當成沒發生
+‣ 等回覆逾時後，那輪的回覆可能晚到；協定沒有 cycle 編號，所以同一條連線上記下欠幾則，
+  之後先收到的回覆 (含只收了狀態碼、payload 晚到的半則) 依序丟棄並計入 stale，
+  不會被當成下一輪的回覆
+‣ 結束時印出 100/200/逾時/斷線 統計與 cycle 時間 p50/p95/max，--out 存 JSON；
+  有 timeout 或 lost 時 exit code = 1
+
+用法 (於專案根目錄)：
+    PYTHONPATH=main python -m communicate.sim_server --scenario cycles --cycles 100 --out sim.json
+    HIWIN_HOST=127.0.0.1 python main/main.py          # 另一個終端機
+"""
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+from typing import List, Optional
+
+import numpy as np
+
+from communicate.codec import FrameDecoder, encode
+from configs.setting import PORT
+
+REPLY_TIMEOUT = 30.0
+
+
+def scenario(name: str, cycles: int = 10, gap: float = 0.5) -> List[dict]:
+    if name == "single":
+        return [{"send": "MOVING"}, {"reply": REPLY_TIMEOUT}]
+    if name == "exit":
+        return [{"send": "MOVING"}, {"reply": REPLY_TIMEOUT}, {"send": "EXIT"},
+                {"send": "MOVING"}, {"reply": REPLY_TIMEOUT}]
+    if name == "cycles":
+        return [s for _ in range(cycles) for s in
+                ({"send": "MOVING"}, {"reply": REPLY_TIMEOUT}, {"sleep": gap})]
+    if name == "flaky":
+        steps = []
+        for k in range(cycles):
+            steps += [{"send": "MOVING"}, {"reply": REPLY_TIMEOUT}, {"sleep": gap}]
+            if k % 3 == 2:
+                steps.append({"disconnect": True})
+        return steps
+    if name == "multi":
+        return [s for _ in range(cycles) for s in
+                ({"send": "MOVING_MULTI"}, {"reply": REPLY_TIMEOUT}, {"sleep": gap})]
+    raise ValueError(f"未知情境 {name!r}")
+
+SCENARIOS = ("single", "exit", "cycles", "flaky", "multi")
+FAILED = ("timeout", "lost")      # 算失敗的 cycle 狀態
+
+
+def _parse_payload(p: str) -> Optional[List[float]]:
+    try:
+        v = [float(x) for x in p.split(",")]
+        return v if len(v) == 3 else None
+    except ValueError:
+        return None
+
+
+def _parse_candidates(p: str) -> Optional[List[List[float]]]:
+    """"角度, x, y, score; ..." → [[角度, x, y, score], ...]；score 需由高到低"""
+    try:
+        c = [[float(x) for x in part.split(",")] for part in p.split(";")]
+    except ValueError:
+        return None
+    if not c or any(len(v) != 4 for v in c):
+        return None
+    scores = [v[3] for v in c]
+    return c if scores == sorted(scores, reverse=True) else None
+
+
+class SimController:
+    def __init__(self, steps: List[dict], *, latency_ms: float = 0.0, jitter_ms: float = 0.0,
+                 split: int = 0, drop: float = 0.0, seed: Optional[int] = None):
+        self.steps = steps
+        self.latency_ms, self.jitter_ms = latency_ms, jitter_ms
+        self.split, self.drop = split, drop
+        self.rng = random.Random(seed)
+        self.idx = 0
+        self.cycles: List[dict] = []
+        self.sessions = 0
+        self.stale = 0                    # 逾時後才到、被丟棄的回覆數
+        self._owed = 0                    # 這條連線上逾時未收的回覆數
+        self.done = asyncio.Event()
+
+    # ── 送 / 收 ───────────────────────────────────
+    async def _send(self, writer: asyncio.StreamWriter, msg: str) -> None:
+        d = self.latency_ms + self.rng.uniform(-self.jitter_ms, self.jitter_ms)
+        if d > 0:
+            await asyncio.sleep(d / 1e3)
+        data = encode(msg)
+        if self.split > 0:
+            i = 0
+            while i < len(data):
+                k = self.rng.randint(1, self.split)
+                writer.write(data[i:i + k]); await writer.drain()
+                i += k
+                await asyncio.sleep(0.001)
+        else:
+            writer.write(data); await writer.drain()
+        print(f"[Sim] → {msg}")
+
+    async def _next(self, reader: asyncio.StreamReader, dec: FrameDecoder, pend: list, timeout: float) -> str:
+        while not pend:
+            data = await asyncio.wait_for(reader.read(4096), timeout)
+            if not data:
+                raise ConnectionError("視覺端關閉連線")
+            pend += dec.feed(data)
+        return pend.pop(0)
+
+    async def _reply(self, reader, dec, pend, timeout: float, t0: float) -> dict:
+        end = time.perf_counter() + timeout
+        left = lambda: max(0.0, end - time.perf_counter())
+        while True:
+            status = await self._next(reader, dec, pend, left())
+            if not self._owed:
+                break
+            # 前幾輪逾時的回覆：狀態碼 (100/101 連同 payload) 或逾時前只收到狀態碼的那則 payload
+            self._owed -= 1; self.stale += 1
+            if status in ("100", "101"):
+                await self._next(reader, dec, pend, left())
+            print(f"[Sim] 丟棄逾時後才到的回覆 {status}")
+        rec = {"status": status, "payload": None}
+        if status == "100":
+            rec["payload"] = await self._next(reader, dec, pend, left())
+            rec["valid"] = _parse_payload(rec["payload"]) is not None
+        elif status == "101":
+            rec["payload"] = await self._next(reader, dec, pend, left())
+            cands = _parse_candidates(rec["payload"])
+            rec["valid"], rec["candidates"] = cands is not None, len(cands or [])
+        rec["ms"] = round((time.perf_counter() - t0) * 1e3, 2)
+        print(f"[Sim] ← {status} {rec['payload'] or ''} ({rec['ms']} ms)")
+        return rec
+
+    # ── 一條連線 ──────────────────────────────────
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.sessions += 1
+        print(f"[Sim] 視覺端已連線 (第 {self.sessions} 次)")
+        dec, pend, t_moving = FrameDecoder(), [], None
+        open_cycle = False                # 已送 MOVING、回覆還沒記錄
+        self._owed = 0                    # 舊連線的回覆不會送到這條
+        try:
+            while self.idx < len(self.steps):
+                step = self.steps[self.idx]
+                self.idx += 1
+                if "send" in step:
+                    if step["send"] in ("MOVING", "MOVING_MULTI"):
+                        open_cycle = True
+                    await self._send(writer, step["send"])
+                    if step["send"] in ("MOVING", "MOVING_MULTI"):
+                        t_moving = time.perf_counter()
+                        if self.rng.random() < self.drop:
+                            self.cycles.append({"status": "dropped", "ms": None})
+                            self._skip_reply()
+                            print("[Sim] 注入斷線")
+                            return
+                    elif step["send"] == "EXIT":
+                        print("[Sim] EXIT，等視覺端重連")
+                        return
+                elif "reply" in step:
+                    try:
+                        t0 = time.perf_counter() if t_moving is None else t_moving
+                        self.cycles.append(await self._reply(reader, dec, pend, step["reply"], t0))
+                    except asyncio.TimeoutError:
+                        self.cycles.append({"status": "timeout", "ms": None})
+                        self._owed += 1           # 之後晚到的回覆屬於這輪
+                        print("[Sim] 等回覆逾時")
+                    open_cycle = False
+                elif "sleep" in step:
+                    await asyncio.sleep(step["sleep"])
+                elif step.get("disconnect"):
+                    print("[Sim] 腳本斷線")
+                    return
+            self.done.set()
+        except (ConnectionError, OSError) as e:
+            print(f"[Sim] 連線中斷：{e}")
+            if open_cycle:                # 這輪的來回沒有完成 → 記為失敗
+                self.cycles.append({"status": "lost", "ms": None})
+                if "send" in self.steps[self.idx - 1]:
+                    self._skip_reply()    # 斷在送 MOVING 時，它的 reply 還沒輪到
+        finally:
+            writer.close()
+
+    def _skip_reply(self) -> None:
+        """這輪已記錄 (dropped / lost)：下一步若是它的 reply 就跳過"""
+        if self.idx < len(self.steps) and "reply" in self.steps[self.idx]:
+            self.idx += 1
+
+    # ── 統計 ──────────────────────────────────────
+    def summary(self) -> dict:
+        ms = [c["ms"] for c in self.cycles if c.get("ms") is not None]
+        count = {}
+        for c in self.cycles:
+            count[c["status"]] = count.get(c["status"], 0) + 1
+        pct = lambda q: round(float(np.percentile(ms, q)), 2) if ms else None
+        return {"cycles": len(self.cycles), "status": count, "sessions": self.sessions, "stale": self.stale,
+                "invalid_payload": sum(1 for c in self.cycles if c.get("valid") is False),
+                "ms": {"p50": pct(50), "p95": pct(95), "max": max(ms) if ms else None}}
+
+
+async def serve(sim: SimController, host: str, port: int) -> None:
+    srv = await asyncio.start_server(sim.handle, host, port)
+    print(f"[Sim] 控制器模擬器 listening {host}:{port}，共 {len(sim.steps)} 步")
+    async with srv:
+        await sim.done.wait()
+    await asyncio.sleep(0.1)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser("HIWIN 控制器模擬器")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=PORT)
+    ap.add_argument("--scenario", default="single", choices=SCENARIOS)
+    ap.add_argument("--script", help="步驟 JSON 檔 (取代 --scenario)")
+    ap.add_argument("--cycles", type=int, default=10, help="cycles / flaky 的輪數")
+    ap.add_argument("--gap", type=float, default=0.5, help="每輪之間的間隔 (秒)")
+    ap.add_argument("--latency", type=float, default=0.0, help="每則送出前延遲 (ms)")
+    ap.add_argument("--jitter", type=float, default=0.0, help="延遲抖動 ± (ms)")
+    ap.add_argument("--split", type=int, default=0, help="訊框拆成 ≤N bytes 分批送")
+    ap.add_argument("--drop", type=float, default=0.0, help="送出 MOVING 後斷線的機率")
+    ap.add_argument("--seed", type=int, default=None)
+    ap.add_argument("--out", help="統計 + 每輪紀錄存成 JSON")
+    args = ap.parse_args()
+
+    steps = (json.load(open(args.script, encoding="utf-8")) if args.script
+             else scenario(args.scenario, args.cycles, args.gap))
+    sim = SimController(steps, latency_ms=args.latency, jitter_ms=args.jitter,
+                        split=args.split, drop=args.drop, seed=args.seed)
+    try:
+        asyncio.run(serve(sim, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    res = sim.summary()
+    print(json.dumps(res, ensure_ascii=False, indent=2))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"summary": res, "cycles": sim.cycles}, f, ensure_ascii=False, indent=2)
+        print(f"[Saved] {args.out}")
+    sys.exit(1 if any(res["status"].get(k, 0) for k in FAILED) else 0)
@@ -1,7 +1,16 @@
 import socket
 import time
+import weakref
 from typing import Optional
 
+from communicate.codec import FrameDecoder, encode_batch, set_nodelay
+import tracing
+
+log = tracing.get_logger("tcp")
+
+# 每個 socket 一個持續的接收緩衝：沒讀完的半截訊框 / 已解出但還沒取走的訊息
+_DECODERS: "weakref.WeakKeyDictionary[socket.socket, tuple]" = weakref.WeakKeyDictionary()
+
 
 def create_connection(host: str,
                       port: int,
@@ -13,48 +22,61 @@ def create_connection(host: str,
     """
     for attempt in range(1, max_retries + 1):
         try:
-            print(f"嘗試連線到 {host}:{port}... (第 {attempt} 次)")
+            log.info("嘗試連線到 %s:%s... (第 %d 次)", host, port, attempt)
             sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             sock.connect((host, port))
-            print("已連線成功！")
+            set_nodelay(sock)   # 指令都是小封包，不等 Nagle 合併
+            log.info("已連線成功！")
             return sock         # 連線成功就直接回傳
         except Exception as e:
-            print(f"連線失敗: {e}")
+            log.warning("連線失敗: %s", e)
             if attempt < max_retries:
-                print(f"等待 {retry_delay} 秒後再嘗試連線...")
+                log.info("等待 %s 秒後再嘗試連線...", retry_delay)
                 time.sleep(retry_delay)
             else:
-                print("已達最大重試次數，放棄連線。")
+                log.error("已達最大重試次數，放棄連線。")
     return None
 
 
-def send_message(sock: socket.socket, payload: str) -> None:
+def send_message(sock: socket.socket, payload: str, *more: str) -> None:
     """
-    將字串包裝成 {payload} 格式後送出。
+    將字串包裝成 {payload} 格式後送出；多則訊息 (如 "100" + 座標)
+    接成一個 buffer 一次 sendall。
     呼叫者需保證 sock 已連線且仍然有效。
     """
-    message = f"{{{payload}}}"
-    sock.sendall(message.encode("utf-8"))
-    print(f"已送出訊息：{message}")
+    message = encode_batch((payload,) + more)
+    with tracing.span("tcp.send"):
+        sock.sendall(message)
+    log.debug("已送出訊息：%s", message.decode('utf-8'))
+
+
+def _decoder(sock: socket.socket):
+    st = _DECODERS.get(sock)
+    if st is None:
+        st = _DECODERS[sock] = (FrameDecoder(), [])
+    return st
 
 
 def receive_message(sock: socket.socket,
                     bufsize: int = 1024,
-                    strip_braces: bool = True) -> Optional[str]:
+                    strip_braces: bool = True) -> str:
     """
-    等待並接收伺服器回傳資料。
-    回傳解碼後的字串，若 strip_braces 為 True 則移除前後大括號。
-    若連線被關閉或無資料則回傳 None。
+    等待並接收伺服器回傳的「一則」訊息。
+    資料依 {...} 訊框切割：被拆開的訊息會等到收齊，黏在一起的多則訊息
+    依序在之後的呼叫回傳。strip_braces 為 False 時保留大括號。
+    逾時照常丟 socket.timeout；連線被對方關閉丟 ConnectionError。
     """
-    data = sock.recv(bufsize)
-    if not data:
-        #print("未收到任何回應。")
-        return None
-
-    text = data.decode("utf-8", errors="replace")
-    if strip_braces and text.startswith("{") and text.endswith("}"):
-        text = text[1:-1]      # 去除首尾花括號
-    print(f"伺服器回應：{text}")
+    dec, pending = _decoder(sock)
+    while not pending:
+        data = sock.recv(bufsize)
+        if not data:
+            raise ConnectionError("伺服器已關閉連線")
+        pending += dec.feed(data)
+
+    text = pending.pop(0)
+    if not strip_braces:
+        text = f"{{{text}}}"
+    log.debug("伺服器回應：%s", text)
     return text
 
 
@@ -1,47 +1,138 @@
 import socket
 import time
+import threading
+from typing import Dict, List, Optional, Tuple
 
+from communicate.codec import FrameDecoder, encode_batch, set_nodelay
 
-def connect(HOST, PORT, input):
-    
-    MAX_RETRIES = 3         # 最多重試次數
-    RETRY_DELAY = 5         # 每次重試間隔 (秒)
-    
-    attempt = 0
-    while attempt < MAX_RETRIES:
-        try:
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                print(f"嘗試連線到 {HOST}:{PORT}... (第 {attempt+1} 次)")
-                s.connect((HOST, PORT))
+MAX_RETRIES   = 3         # 最多重試次數
+RETRY_DELAY   = 0.5       # 第一次重試間隔 (秒)，之後加倍
+REPLY_TIMEOUT = 10.0      # 等回應的上限 (秒)
+
+
+class Connection:
+    """
+    單一控制器端點的長連線。
+    ‣ 第一次 request 才連線，之後重複使用同一條 socket
+    ‣ 每次送出前做健康檢查 (非阻塞 MSG_PEEK)：對方已關閉 → 透明重連
+    ‣ 回應依送出順序對應 (FIFO)；request_many 一次送出多則、依序收回
+    ‣ 送出後才斷線的請求不自動重送 (避免手臂重複動作)，回傳 None
+    """
+
+    def __init__(self, host: str, port: int, timeout: float = REPLY_TIMEOUT):
+        self.host, self.port, self.timeout = host, port, timeout
+        self.sock: Optional[socket.socket] = None
+        self.stats = {"connects": 0, "requests": 0, "stale": 0}
+        self._dec = FrameDecoder()
+        self._replies: List[str] = []
+        self._lock = threading.Lock()
+
+    # ----------- 連線管理 -----------
+    def _open(self) -> bool:
+        delay = RETRY_DELAY
+        for attempt in range(1, MAX_RETRIES + 1):
+            try:
+                print(f"嘗試連線到 {self.host}:{self.port}... (第 {attempt} 次)")
+                s = socket.create_connection((self.host, self.port), timeout=self.timeout)
+                set_nodelay(s)
+                s.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+                self.sock, self._dec, self._replies = s, FrameDecoder(), []
+                self.stats["connects"] += 1
                 print("已連線成功！")
+                return True
+            except OSError as e:
+                print(f"連線失敗: {e}")
+                if attempt < MAX_RETRIES:
+                    print(f"等待 {delay:.1f} 秒後再嘗試連線...")
+                    time.sleep(delay)
+                    delay *= 2
+        print("已達最大重試次數，放棄連線。")
+        return False
+
+    def close(self) -> None:
+        if self.sock is not None:
+            self.sock.close()
+        self.sock = None
+
+    def healthy(self) -> bool:
+        """非阻塞偷看一個 byte：b'' = 對方已關閉；沒資料 = 正常。
+        殘留的資料 (前一輪逾時才到的回應) 先讀掉，避免回應錯位。"""
+        if self.sock is None:
+            return False
+        try:
+            self.sock.setblocking(False)
+            try:
+                while True:
+                    data = self.sock.recv(4096)
+                    if not data:
+                        return False
+                    stale = self._dec.feed(data)
+                    self.stats["stale"] += len(stale)
+                    for m in stale:
+                        print(f"略過過期回應：{m}")
+            except BlockingIOError:
+                return True
+            finally:
+                self.sock.settimeout(self.timeout)
+        except OSError:
+            return False
+
+    def _ensure(self) -> bool:
+        if self.healthy():
+            return True
+        self.close()
+        return self._open()
+
+    # ----------- 請求 / 回應 -----------
+    def _read_reply(self) -> str:
+        while not self._replies:
+            data = self.sock.recv(4096)
+            if not data:
+                raise ConnectionError("伺服器已關閉連線")
+            self._replies += self._dec.feed(data)
+        return self._replies.pop(0)
+
+    def request_many(self, payloads: List[str]) -> Optional[List[str]]:
+        """多則訊息一次送出，依序收回同樣數量的回應；失敗回 None"""
+        with self._lock:
+            if not self._ensure():
+                return None
+            try:
+                self.sock.sendall(encode_batch(payloads))
+                print(f"已送出訊息：{', '.join(payloads)}")
+                out = [self._read_reply() for _ in payloads]
+                self.stats["requests"] += len(payloads)
+                for o in out:
+                    print(f"伺服器回應：{o}")
+                return out
+            except (OSError, ConnectionError) as e:
+                print(f"連線異常：{e}")
+                self.close()
+                return None
+
+    def request(self, payload: str) -> Optional[str]:
+        out = self.request_many([payload])
+        return None if out is None else out[0]
+
+
+_POOL: Dict[Tuple[str, int], Connection] = {}
+_POOL_LOCK = threading.Lock()
+
+
+def get_connection(HOST, PORT) -> Connection:
+    """每個 (HOST, PORT) 共用一條長連線"""
+    with _POOL_LOCK:
+        conn = _POOL.get((HOST, PORT))
+        if conn is None:
+            conn = _POOL[(HOST, PORT)] = Connection(HOST, PORT)
+        return conn
+
+
+def connect(HOST, PORT, input):
+    """送出 {input}，回傳伺服器回應 (去掉大括號)；失敗回 None。
+    連線由 get_connection 管理，呼叫之間不再重新建立。"""
+    return get_connection(HOST, PORT).request(input)
+
 
-                # 傳送測試訊息 (根據實際需求修改訊息或指令格式)
-                message =  f"{{{input}}}"
-                s.sendall(message.encode('utf-8'))
-                print(f"已送出訊息：{message.strip()}")
-
-                # 等待伺服器回應，最多接收 1024 bytes
-                data = s.recv(1024)
-                output = data.decode('utf-8', errors='replace').strip("{}")
-                if data:
-                    print(f"伺服器回應：{output}")
-                    return output
-                else:
-                    print("未收到任何回應。")
-
-                # 若執行到此，表示連線成功且已送出/接收完畢，故可直接跳出 while 迴圈
-                break
-
-        except Exception as e:
-            print(f"連線失敗: {e}")
-            attempt += 1
-            if attempt < MAX_RETRIES:
-                print(f"等待 {RETRY_DELAY} 秒後再嘗試連線...")
-                time.sleep(RETRY_DELAY)
-            else:
-                print("已達最大重試次數，程式結束。")
-                
-                
 if __name__ == '__main__':
     connect(HOST = '192.168.0.152',PORT = 4000,input = '')  # 傳送 '100' 給伺服器
-    
\ No newline at end of file
@@ -1,3 +1,13 @@
-HOST = '192.168.0.152'
-PORT = 4000
+import os
 
+# 控制器位址；環境變數可覆蓋 (例：HIWIN_HOST=127.0.0.1 連本機 communicate/sim_server)
+HOST = os.environ.get("HIWIN_HOST", '192.168.0.152')
+PORT = int(os.environ.get("HIWIN_PORT", 4000))
+
+# 桌面 (cm) → 手臂 (mm)：x_mm = 10·x_cm，y_mm = 375 − 10·y_cm
+TABLE_TO_ROBOT = [[10.0,   0.0,   0.0],
+                  [ 0.0, -10.0, 375.0],
+                  [ 0.0,   0.0,   1.0]]
+# 拍照時手臂 TCP 位姿 (x,y,z mm, A,B,C deg)；有值時改由手眼校正推算 TABLE_TO_ROBOT
+CAPTURE_POSE = None
+TABLE_Z_MM   = 0.0       # 桌面在手臂座標的高度 (mm)
@@ -11,6 +11,8 @@ POCKETS = [np.array([0,0]),
 
 _solver = BilliardSolver(TABLE, POCKETS)
 
+MAX_CANDIDATES = 5      # compute_shots 預設最多回傳幾個候選
+
 def compute_shot(cue, target, blockers):
     cue     = np.asarray(cue,    dtype=float)
     target  = np.asarray(target, dtype=float)
@@ -19,8 +21,19 @@ def compute_shot(cue, target, blockers):
     plan = _solver.solve(cue, target, blockers)
     if plan is None:
         return None
+    return _result(cue, plan)
 
-    
+def compute_shots(cue, target, blockers, k=MAX_CANDIDATES):
+    """所有可行解依 score 排序取前 k 個；格式同 compute_shot，多一個 'score'。
+    無解回 []"""
+    cue     = np.asarray(cue,    dtype=float)
+    target  = np.asarray(target, dtype=float)
+    blockers= [np.asarray(b, dtype=float) for b in blockers]
+
+    plans = _solver.solve_all(cue, target, blockers)[:k]
+    return [{**_result(cue, p), 'score':p['score']} for p in plans]
+
+def _result(cue, plan):
     if plan['type'] == 'direct':          # 直球：對準 ghost ball
         v = plan['ghost'] - cue
     elif plan['type'] == 'bank-1':        # 單庫：先打到 rail_pt
@@ -2,6 +2,7 @@ import math, numpy as np
 
 BALL_R = 0.0125          # (m) 花式撞球半徑
 EPS    = 1e-9
+BANK_PENALTY = 0.6       # 單庫解的 score 折扣
 norm   = np.linalg.norm
 dist   = lambda a, b: norm(a - b)
 
@@ -46,6 +47,24 @@ class BilliardSolver:
 
     # ── API ───────────────────────────────────────
     def solve(self, cue, tgt, others):
+        """第一個可行解 (袋口依切角排序，直球優先於單庫)；
+        與 solve_all 相同，score = 0 (切角 ≥ 90°) 的不算可行"""
+        for p in self._candidates(cue, tgt, others):
+            p['score'] = self._score(cue, tgt, p)
+            if p['score'] > 0:
+                return p
+        return None
+
+    def solve_all(self, cue, tgt, others):
+        """所有可行解加上 score (0~1，越大越好)，依 score 由高到低排序；
+        score = 0 (切角 ≥ 90°，目標球打不進袋) 的不回傳"""
+        plans = list(self._candidates(cue, tgt, others))
+        for p in plans:
+            p['score'] = self._score(cue, tgt, p)
+        return sorted((p for p in plans if p['score'] > 0), key=lambda p: -p['score'])
+
+    # ── 私有 ───────────────────────────────────────
+    def _candidates(self, cue, tgt, others):
         balls = [{'id':0,'pos':cue}, {'id':1,'pos':tgt}] + \
                 [{'id':i+2,'pos':p} for i,p in enumerate(others)]
 
@@ -58,23 +77,36 @@ class BilliardSolver:
             G = self._ghost(tgt, pk)
             if not self._inside(G): continue
 
+            ok_TP = path_clear(tgt, pk, balls, ignore={1})
+            if not ok_TP: continue
+
             ok_CG = path_clear(cue, G, balls,
                                ignore={0,1},
                                rail=True, table=(self.W, self.H))
-            ok_TP = path_clear(tgt, pk, balls, ignore={1})
-
-            if ok_CG and ok_TP:
-                return {'type':'direct', 'pocket':pk, 'ghost':G}
+            if ok_CG:
+                yield {'type':'direct', 'pocket':pk, 'ghost':G}
 
             for R in self._mirror(G):
                 ok_CR = path_clear(cue, R, balls, ignore={0,1})
                 ok_RG = path_clear(R,  G, balls, ignore={0,1})
-                if ok_CR and ok_RG and ok_TP:
-                    return {'type':'bank-1',
-                            'pocket':pk, 'ghost':G, 'rail_pt':R}
-        return None
+                if ok_CR and ok_RG:
+                    yield {'type':'bank-1',
+                           'pocket':pk, 'ghost':G, 'rail_pt':R}
+
+    def _score(self, cue, tgt, plan):
+        """切角越小、行程越短越好；單庫再打折"""
+        G, pk = plan['ghost'], plan['pocket']
+        R = plan.get('rail_pt')
+        if R is None:
+            v_in, travel = G - cue, dist(cue, G)
+        else:
+            v_in, travel = G - R, dist(cue, R) + dist(R, G)
+        cut = angle(v_in, pk - tgt)
+        if cut >= math.pi / 2:
+            return 0.0
+        s = math.cos(cut) / (1.0 + travel + dist(tgt, pk))
+        return round(float(s) * (BANK_PENALTY if R is not None else 1.0), 4)
 
-    # ── 私有 ───────────────────────────────────────
     def _ghost(self, T, P):
         v = T - P; v /= norm(v)
         return T + v * 2*BALL_R
@@ -0,0 +1,193 @@
+"""
+即時操作面板：校正後桌面 + 偵測 + 規劃 + 各階段延遲
+----------------------------------------------------------------
+原本操作員看的是 _snap 的 cv2.imshow 預覽 (會卡拍照流程) 和另一個 pygame 視窗，
+兩者都看不到管線當下的狀態。Dashboard：
+‣ 共享狀態：publish(frame=/H=/data=/plan=/reply=) 只在 lock 內換掉參考 (O(1))，
+  不複製影像、不排隊；相機 / 偵測 / 規劃執行緒呼叫它不會被拖慢
+‣ 繪圖執行緒：固定 fps 取最新狀態 → 俯視桌面 → 畫球 / 球號 / 出桿方向 / 回覆；
+  兩次繪圖之間被覆蓋掉的狀態直接丟棄 (stats["dropped"])
+‣ 俯視：publish 的是相機原始影格 (有畸變)，H 是去畸變後像素 → cm；給 K / D 時
+  「俯視 px → cm → 去畸變 px → 原始 px」預先算成一張 remap 表 (H 或影像尺寸變了才重算)，
+  一次 remap 同時去畸變 + 校正；沒給 K / D 視為影格已去畸變，直接 warpPerspective
+‣ 右側面板：tracing.stats() 各階段 p50 / p95 (每 STATS_SEC 秒更新一次)
+‣ 輸出：繪圖執行緒只更新 self.image，不碰 GUI (macOS 等平台只准主執行緒開視窗)；
+  主執行緒定期呼叫 show() 顯示，或 sink=callable 交給呼叫端
+
+    dash = Dashboard(K=chain.K, D=chain.D).start()
+    pipe = Pipeline(intrinsics_path=..., dashboard=dash).start()
+    dash.publish(plan=result, reply=reply)
+    while ...: dash.show()                    # 主執行緒
+"""
+import time, threading, cv2, numpy as np
+import tracing
+
+DASH_FPS  = 15
+PX_PER_CM = 10                  # 俯視圖解析度
+TABLE_CM  = (73.5, 37.5)        # 同 vision.yoloball TABLE_W_CM / TABLE_H_CM
+BALL_R_CM = 1.25
+PANEL_W   = 280
+STATS_SEC = 1.0
+ARROW_CM  = 25.0                # 出桿方向箭頭長度
+
+CUE_COL   = (245, 245, 245)
+BALL_COL  = (40, 160, 255)
+LOCK_COL  = (60, 220, 60)       # BallTracker 已鎖定球號
+BEST_COL  = (0, 0, 255)
+ALT_COL   = (0, 200, 255)
+TEXT_COL  = (230, 230, 230)
+BG_COL    = (30, 30, 30)
+
+log = tracing.get_logger("dashboard")
+
+
+WINDOW    = "HIWIN POOL"
+
+
+class Dashboard:
+    def __init__(self, *, fps=DASH_FPS, px_per_cm=PX_PER_CM, table_cm=TABLE_CM, sink=None, K=None, D=None):
+        self.period = 1.0 / fps
+        self.s = px_per_cm
+        self.size = (int(round(table_cm[0] * px_per_cm)), int(round(table_cm[1] * px_per_cm)))
+        self.sink = sink                # None = 只更新 self.image，由主執行緒 show()
+        self.K = None if K is None else np.asarray(K, np.float64)
+        self.D = None if D is None else np.asarray(D, np.float64)
+        self.stats = {"published": 0, "rendered": 0, "dropped": 0}
+        self.image = None               # 最後一張合成畫面 (BGR)
+        self._img_ver = self._shown = 0
+        self._maps, self._maps_key = None, None
+
+        self._state = {"frame": None, "H": None, "data": None, "plan": None, "reply": None}
+        self._ver = 0                   # publish 次數；繪圖執行緒比對是否有新狀態
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._lat, self._lat_t = {}, 0.0
+
+    # ── 生命週期 ──────────────────────────────────
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="dashboard", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=2.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    # ── 共享狀態 ──────────────────────────────────
+    def publish(self, **fields):
+        """frame / H / data / plan / reply 任選；只換參考，呼叫端交出後不要再修改"""
+        with self._lock:
+            self._state.update(fields)
+            self._ver += 1
+            self.stats["published"] += 1
+
+    # ── 繪圖執行緒 ────────────────────────────────
+    def _run(self):
+        seen = 0
+        while not self._stop.is_set():
+            t0 = time.monotonic()
+            with self._lock:
+                ver, st = self._ver, dict(self._state)
+            if ver != seen or t0 - self._lat_t >= STATS_SEC:
+                if ver - seen > 1:
+                    self.stats["dropped"] += ver - seen - 1
+                seen = ver
+                try:
+                    self.image = self.compose(st)
+                    self._img_ver += 1
+                    if self.sink is not None:
+                        self.sink(self.image)
+                    self.stats["rendered"] += 1
+                except Exception as e:             # 面板出錯不影響管線
+                    log.warning("[Dashboard] 繪圖失敗：%r", e)
+            self._stop.wait(max(0.0, self.period - (time.monotonic() - t0)))
+
+    def show(self, title=WINDOW, wait_ms=1):
+        """主執行緒呼叫：有新畫面才 imshow，並處理視窗事件；回傳 waitKey 按鍵 (-1 = 沒按)"""
+        img, ver = self.image, self._img_ver
+        if img is not None and ver != self._shown:
+            cv2.imshow(title, img)
+            self._shown = ver
+        return cv2.waitKey(wait_ms)
+
+    def compose(self, st):
+        """狀態 dict → 合成畫面 (俯視桌面 + 右側延遲面板)"""
+        W, H = self.size
+        if st["frame"] is not None and st["H"] is not None:
+            view = self._topdown(st["frame"], np.asarray(st["H"], float))
+        else:
+            view = np.full((H, W, 3), 50, np.uint8)
+            cv2.putText(view, "NO FRAME", (W // 2 - 80, H // 2), cv2.FONT_HERSHEY_SIMPLEX, 1.0, TEXT_COL, 2)
+
+        cue = None
+        for b in (st["data"] or {}).get("balls", []):
+            x, y = b.get("x_cm", b.get("cx_cm")), b.get("y_cm", b.get("cy_cm"))
+            c = self._pt(x, y)
+            if b["type"] == "0":
+                cue = (x, y)
+            col = CUE_COL if b["type"] == "0" else LOCK_COL if b.get("locked") else BALL_COL
+            cv2.circle(view, c, int(BALL_R_CM * self.s), col, 2)
+            cv2.putText(view, f"{b['type']} {b.get('conf', 0):.2f}", (c[0] + 10, c[1] - 10),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.45, col, 1)
+
+        self._draw_plan(view, st["plan"], cue)
+        if st["reply"]:
+            cv2.putText(view, "-> " + " | ".join(st["reply"])[:80], (8, H - 10),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, TEXT_COL, 1)
+        return np.hstack([view, self._panel(H)])
+
+    def _topdown(self, frame, H):
+        """原始影格 → 俯視桌面 (W, H)"""
+        if self.K is None:
+            M = np.diag([self.s, self.s, 1.0]) @ H                       # pixel → 俯視 px
+            return cv2.warpPerspective(frame, M, self.size, flags=cv2.INTER_LINEAR)
+        key = (H.tobytes(), frame.shape[:2])
+        if key != self._maps_key:
+            self._maps, self._maps_key = self._build_maps(H, frame.shape[:2]), key
+        return cv2.remap(frame, self._maps[0], self._maps[1], cv2.INTER_LINEAR)
+
+    def _build_maps(self, H, shape):
+        """俯視 px → 原始影格 px 的 remap 表；去畸變用的 newK 同 yoloball._undistort"""
+        h, w = shape
+        W, Hh = self.size
+        u, v = np.meshgrid(np.arange(W, dtype=np.float64), np.arange(Hh, dtype=np.float64))
+        cm = np.stack([u.ravel(), v.ravel()], axis=1) / self.s
+        px = cv2.perspectiveTransform(cm.reshape(-1, 1, 2), np.linalg.inv(H)).reshape(-1, 2)
+        newK, _ = cv2.getOptimalNewCameraMatrix(self.K, self.D, (w, h), 0)
+        n = np.c_[px, np.ones(len(px))] @ np.linalg.inv(newK).T              # 正規化座標
+        raw, _ = cv2.projectPoints(n.reshape(-1, 1, 3), np.zeros(3), np.zeros(3), self.K, self.D)
+        raw = raw.reshape(Hh, W, 2).astype(np.float32)
+        return cv2.convertMaps(raw[..., 0], raw[..., 1], cv2.CV_16SC2)
+
+    def _pt(self, x_cm, y_cm):
+        return int(round(x_cm * self.s)), int(round(y_cm * self.s))
+
+    def _draw_plan(self, view, plan, cue):
+        """plan_shot (angle, cue_xy) 或 plan_shots [(angle, cue_xy, score), ...]"""
+        if not plan:
+            return
+        cands = plan if isinstance(plan, list) else [(plan[0], plan[1], None)]
+        for k, (angle, cue_xy, score) in reversed(list(enumerate(cands))):
+            x, y = (cue_xy[0] * 100, cue_xy[1] * 100) if cue_xy is not None else cue
+            a = np.radians(angle)
+            p0 = self._pt(x, y)
+            p1 = self._pt(x + ARROW_CM * np.cos(a), y + ARROW_CM * np.sin(a))
+            cv2.arrowedLine(view, p0, p1, BEST_COL if k == 0 else ALT_COL, 3 if k == 0 else 1, tipLength=0.08)
+            label = f"{angle:.1f}" + ("" if score is None else f" ({score:.2f})")
+            cv2.putText(view, label, (p1[0] + 4, p1[1]), cv2.FONT_HERSHEY_SIMPLEX, 0.45,
+                        BEST_COL if k == 0 else ALT_COL, 1)
+
+    def _panel(self, h):
+        now = time.monotonic()
+        if now - self._lat_t >= STATS_SEC:
+            self._lat, self._lat_t = tracing.stats(), now
+        p = np.full((h, PANEL_W, 3), BG_COL, np.uint8)
+        lines = ["stage          p50    p95 ms"]
+        lines += [f"{k[:13]:<13}{v['p50']:>6.1f}{v['p95']:>7.1f}" for k, v in sorted(self._lat.items())]
+        s = self.stats
+        lines += ["", f"pub {s['published']}  draw {s['rendered']}  drop {s['dropped']}"]
+        for i, t in enumerate(lines):
+            cv2.putText(p, t, (8, 20 + 18 * i), cv2.FONT_HERSHEY_PLAIN, 1.0, TEXT_COL, 1)
+        return p
@@ -0,0 +1,134 @@
+"""
+離屏繪圖：佈局 + 路徑 → PNG / NumPy (不開視窗)
+----------------------------------------------------------------
+visualize.show() 會開 pygame 視窗並卡到關閉為止，run_shot(show=True) 因此卡住管線，
+也沒辦法一次檢查大量佈局。這裡只畫在 pygame.Surface 上 (不初始化 display)，不需要螢幕：
+‣ render_plan()：單一佈局 → RGB 陣列 (H, W, 3)，可順便存 PNG
+‣ render_batch()：多進程批次繪圖；每個 worker 只建一次 PlanRenderer (靜態層共用)，
+  可每張存 PNG，並回傳縮圖拼成總覽圖 (contact sheet)
+‣ CLI：隨機產生佈局 → compute_shot → 總覽圖 (佈局與繪圖都用 compute_shot 規劃用的 billiard_api.TABLE)
+
+用法 (於 main/ 目錄)：
+    python -m gui.headless --random 2000 --seed 0 --workers 8 --sheet sheet.png
+    python -m gui.headless --random 50 --out plans/        # 每張各存一個 PNG
+"""
+import os, argparse, time, numpy as np, pygame
+from multiprocessing import Pool
+from pathlib import Path
+from core.billiard_api import compute_shot, TABLE
+import gui.simulator as sim
+import gui.render as render
+
+THUMB_W    = 240     # 總覽圖每格寬度 (px)
+SHEET_COLS = 10
+
+_R = None            # 每個進程一個 PlanRenderer
+
+# ──────────────────────────────────────────────────────────────
+# 單張
+# ──────────────────────────────────────────────────────────────
+
+def _renderer(table=None):
+    global _R
+    if _R is None or (table is not None and tuple(table) != _R.table):
+        _R = render.PlanRenderer(table)
+    return _R
+
+def to_array(surf):
+    """pygame surface → RGB uint8 (H, W, 3)"""
+    return pygame.surfarray.array3d(surf).swapaxes(0, 1).copy()
+
+def save_png(img, path):
+    """RGB 陣列或 surface → PNG"""
+    surf = img if isinstance(img, pygame.Surface) else \
+        pygame.surfarray.make_surface(np.ascontiguousarray(np.asarray(img).swapaxes(0, 1)))
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    pygame.image.save(surf, str(path))
+
+def render_surface(cue, target, blockers, info=None, table=None):
+    """佈局 + 路徑 → pygame surface；info 省略時內部呼叫 compute_shot"""
+    if info is None:
+        info = compute_shot(cue, target, blockers)
+    r = _renderer(table)
+    r.set_plan(np.asarray(cue), np.asarray(target), [np.asarray(b) for b in blockers], info)
+    return r.render()
+
+def render_plan(cue, target, blockers, info=None, path=None, table=None):
+    """佈局 + 路徑 → RGB 陣列 (H, W, 3)；給 path 時另存 PNG"""
+    s = render_surface(cue, target, blockers, info, table)
+    if path:
+        save_png(s, path)
+    return to_array(s)
+
+# ──────────────────────────────────────────────────────────────
+# 批次
+# ──────────────────────────────────────────────────────────────
+
+def _job(args):
+    i, job, out_dir, thumb_w = args
+    info = job.get("info", False)
+    if info is False:
+        info = compute_shot(job["cue"], job["target"], job["blockers"])
+    s = render_surface(job["cue"], job["target"], job["blockers"], info, job.get("table"))
+    name = job.get("name", f"{i:05d}")
+    if out_dir:
+        save_png(s, Path(out_dir) / f"{name}.png")
+    if not thumb_w:
+        return None
+    w, h = s.get_size()
+    t = pygame.transform.smoothscale(s, (thumb_w, round(h * thumb_w / w)))
+    kind = info["type"] if info else "none"
+    t.blit(sim.font(16).render(f"{name} {kind}", True, (255, 255, 255)), (4, 2))
+    return to_array(t)
+
+def render_batch(jobs, out_dir=None, *, workers=None, thumb_w=THUMB_W, chunksize=16):
+    """jobs: [{"cue","target","blockers"[, "info", "name", "table"]}, ...]
+    (沒給 info → worker 內 compute_shot)。回傳縮圖 list (thumb_w=0 時為 None)，順序同輸入"""
+    args = [(i, j, out_dir, thumb_w) for i, j in enumerate(jobs)]
+    if workers == 1:
+        return [_job(a) for a in args]
+    with Pool(workers) as pool:
+        return pool.map(_job, args, chunksize=chunksize)
+
+def contact_sheet(thumbs, cols=SHEET_COLS, pad=4, bg=(30, 30, 30)):
+    """縮圖 → 一張總覽圖 (RGB 陣列)"""
+    thumbs = [t for t in thumbs if t is not None]
+    if not thumbs:
+        return None
+    th, tw = max(t.shape[0] for t in thumbs), max(t.shape[1] for t in thumbs)
+    rows = -(-len(thumbs) // cols)
+    sheet = np.empty((rows*(th+pad)+pad, cols*(tw+pad)+pad, 3), np.uint8)
+    sheet[:] = bg
+    for k, t in enumerate(thumbs):
+        r, c = divmod(k, cols)
+        y, x = pad + r*(th+pad), pad + c*(tw+pad)
+        sheet[y:y+t.shape[0], x:x+t.shape[1]] = t
+    return sheet
+
+
+if __name__ == "__main__":
+    from core.ball_generator import generate_layout
+    ap = argparse.ArgumentParser("headless plan rendering")
+    ap.add_argument("--random", type=int, default=100, help="隨機佈局數")
+    ap.add_argument("--blockers", type=int, default=3)
+    ap.add_argument("--seed", type=int, default=0, help="第 i 張用 seed+i")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--out", help="每張各存 PNG 的資料夾")
+    ap.add_argument("--sheet", default="sheet.png", help="總覽圖路徑；'' = 不產生")
+    ap.add_argument("--cols", type=int, default=SHEET_COLS)
+    ap.add_argument("--thumb", type=int, default=THUMB_W)
+    args = ap.parse_args()
+
+    jobs = []
+    for i in range(args.random):
+        L = generate_layout(TABLE, n_blockers=args.blockers, seed=args.seed + i)
+        jobs.append({"cue": L["cue"], "target": L["target"], "blockers": L["blockers"],
+                     "table": TABLE, "name": str(args.seed + i)})
+    t0 = time.perf_counter()
+    thumbs = render_batch(jobs, args.out, workers=args.workers,
+                          thumb_w=args.thumb if args.sheet else 0)
+    dt = time.perf_counter() - t0
+    print(f"[headless] {len(jobs)} 張 / {dt:.1f}s ({len(jobs) / max(dt, 1e-9):.0f} 張/s)")
+    if args.sheet:
+        save_png(contact_sheet(thumbs, args.cols), args.sheet)
+        print(f"[Saved] {args.sheet}")
@@ -0,0 +1,116 @@
+"""
+Pygame 繪圖層：靜態圖層快取 + 髒矩形更新
+----------------------------------------------------------------
+visualize / simulator 原本每幀 (60 FPS) 重畫桌布、網格 (每個座標標籤都重新
+font.render)、袋口與所有虛線，dashed() 每一段還配置 NumPy 陣列。PlanRenderer：
+‣ 靜態層：桌框 / 桌布 / 網格 + 標籤 / 袋口 只畫一次，存成 surface
+‣ 路徑層：set_plan() 時才重畫一次 (球 + 虛線 + 路徑線，透明 surface)
+‣ draw()：只補畫有變動的矩形 (新舊路徑層的外框)，沒變動回傳 []
+‣ run_window()：有變動時 ACTIVE_FPS，沒變動降到 IDLE_FPS，閒置時幾乎不吃 CPU
+
+    r = PlanRenderer()
+    r.set_plan(cue, target, blockers, info)
+    run_window(r, "compute_shot visualize")
+"""
+import numpy as np, pygame
+import gui.simulator as sim   # 所有視覺常數 / 函式
+
+ACTIVE_FPS = 60
+IDLE_FPS   = 4     # 沒有變動時的輪詢頻率 (只處理事件)
+
+
+class PlanRenderer:
+    def __init__(self, table=None):
+        pygame.font.init()
+        self.table = tuple(table or sim.TABLE)
+        w, h = self.table
+        self.size = (int(w*sim.SCALE + sim.MARGIN*2), int(h*sim.SCALE + sim.MARGIN*2))
+        self.pockets = [np.array(p, float) for p in
+                        ((0,0), (w/2,0), (w,0), (0,h), (w/2,h), (w,h))]
+        self.static = self._build_static()
+        self.layer  = pygame.Surface(self.size, pygame.SRCALPHA)
+        self._bbox  = pygame.Rect(0, 0, 0, 0)     # 路徑層目前內容的外框
+        self._dirty = []
+        self.invalidate()
+
+    # ── 靜態層 ────────────────────────────────────
+    def _build_static(self):
+        w, h = self.table
+        s = pygame.Surface(self.size)
+        s.fill(sim.RAIL)
+        pygame.draw.rect(s, sim.GREEN, (sim.MARGIN, sim.MARGIN, w*sim.SCALE, h*sim.SCALE))
+        sim.draw_grid(s, w, h)
+        for pk in self.pockets:
+            pygame.draw.circle(s, sim.PKCOL, sim.px(pk), sim.R_PK)
+        return s
+
+    # ── 路徑層 ────────────────────────────────────
+    def set_plan(self, cue, target, blockers, info):
+        """換佈局 / 路徑：重畫路徑層，標記新舊外框為髒矩形"""
+        L = self.layer
+        L.fill((0, 0, 0, 0))
+        ball = lambda p, c: pygame.draw.circle(L, c, sim.px(p), sim.R_BALL)
+        ball(cue, sim.CUE); ball(target, sim.TARGET)
+        for b in blockers:
+            ball(b, sim.OTH)
+
+        if info:
+            G  = np.array(info["ghost"])
+            PK = self.pockets[info["pocket_id"]]
+            legs = [cue, G] if info["type"] == "direct" else [cue, np.array(info["rail_pt"]), G]
+            for a, b in zip(legs, legs[1:]):
+                sim.dashed(L, sim.DASH, a, b, sim.DASH_W)
+            for a, b in zip(legs, legs[1:]):
+                pygame.draw.line(L, sim.LINE1, sim.px(a), sim.px(b), 2)
+            sim.dashed(L, sim.DASH, target, PK, sim.DASH_W)
+            pygame.draw.line(L, sim.LINE2, sim.px(G), sim.px(target), 2)
+            pygame.draw.line(L, sim.LINE2, sim.px(target), sim.px(PK), 2)
+        else:
+            txt = sim.font(48).render("NO  PATH", True, (255,0,0))
+            L.blit(txt, txt.get_rect(center=(self.size[0]/2, self.size[1]/2)))
+
+        box = L.get_bounding_rect()
+        self._dirty += [self._bbox, box]
+        self._bbox = box
+
+    # ── 合成 ──────────────────────────────────────
+    def invalidate(self):
+        """整個畫面都要重畫 (視窗被遮住後重現等)"""
+        self._dirty = [pygame.Rect((0, 0), self.size)]
+
+    def draw(self, surf):
+        """只補畫髒矩形；回傳給 pygame.display.update 的 rect list (沒變動 = [])"""
+        rects = [r for r in self._dirty if r.w and r.h]
+        for r in rects:
+            surf.blit(self.static, r, r)
+            surf.blit(self.layer, r, r)
+        self._dirty = []
+        return rects
+
+    def render(self):
+        """完整合成一張新的 surface (不需要視窗)"""
+        s = self.static.copy()
+        s.blit(self.layer, (0, 0))
+        return s
+
+
+def run_window(renderer, caption="Billiard Path"):
+    """開視窗顯示 renderer，直到關閉；只更新髒矩形，閒置時降頻"""
+    pygame.init()
+    scr = pygame.display.set_mode(renderer.size)
+    pygame.display.set_caption(caption)
+    renderer.invalidate()
+    clock = pygame.time.Clock()
+
+    run = True
+    while run:
+        for e in pygame.event.get():
+            if e.type == pygame.QUIT:
+                run = False
+            elif e.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                renderer.invalidate()
+        rects = renderer.draw(scr)
+        if rects:
+            pygame.display.update(rects)
+        clock.tick(ACTIVE_FPS if rects else IDLE_FPS)
+    pygame.quit()
@@ -22,15 +22,36 @@ CUE=(245,245,245); TARGET=(255,90,40); OTH=(40,120,255)
 LINE1=(250,0,0); LINE2=(255,255,0); DASH=(185,185,185)
 px=lambda p:(int(p[0]*SCALE+MARGIN),int(p[1]*SCALE+MARGIN))
 
+def dash_segments(a,b,dash=10,gap=6):
+    """a→b (m) 的虛線 → [(起點 px, 終點 px), ...]；整條一次向量化算完"""
+    A=np.array(px(a),float); v=np.array(px(b),float)-A
+    L=np.hypot(*v)
+    if L<1e-9: return []
+    v/=L
+    st=A+v*(np.arange(int(L//(dash+gap))+1)[:,None]*(dash+gap)); ed=st+v*dash
+    return list(zip(map(tuple,st.tolist()),map(tuple,ed.tolist())))
+
 def dashed(surf,col,a,b,w,dash=10,gap=6):
-    ax,ay=px(a); bx,by=px(b); vec=np.array([bx-ax,by-ay],float)
-    L=np.linalg.norm(vec); vec/=L
-    n=int(L//(dash+gap))+1
-    for i in range(n):
-        st=np.array([ax,ay])+vec*i*(dash+gap); ed=st+vec*dash
+    for st,ed in dash_segments(a,b,dash,gap):
         pygame.draw.line(surf,col,st,ed,int(w))
 
 
+_FONTS={}; _LABELS={}
+
+def font(size):
+    """SysFont 快取 (建立字型很慢)"""
+    if size not in _FONTS:
+        pygame.font.init()
+        _FONTS[size]=pygame.font.SysFont(None,size)
+    return _FONTS[size]
+
+def _label(text):
+    """座標標籤 surface 快取：同一個字串只 render 一次"""
+    if text not in _LABELS:
+        _LABELS[text]=(LABEL_FONT or font(18)).render(text, True, LABEL_COLOR)
+    return _LABELS[text]
+
+
 def draw_grid(surface, table_w, table_h):
     """在桌布上畫網格線並標註座標 (m)"""
     # 垂直線 +  x 數字
@@ -42,7 +63,7 @@ def draw_grid(surface, table_w, table_h):
                          (px_x, MARGIN + table_h * SCALE),
                          GRID_WIDTH)
         # 座標標籤（畫在桌布下方 5px）
-        label = LABEL_FONT.render(f"{x:.2f}", True, LABEL_COLOR)
+        label = _label(f"{x:.2f}")
         rect  = label.get_rect(center=(px_x, MARGIN + table_h * SCALE + 12))
         surface.blit(label, rect)
         x += GRID_STEP
@@ -56,7 +77,7 @@ def draw_grid(surface, table_w, table_h):
                          (MARGIN + table_w * SCALE, px_y),
                          GRID_WIDTH)
         # 座標標籤（畫在桌布左側 5px）
-        label = LABEL_FONT.render(f"{y:.2f}", True, LABEL_COLOR)
+        label = _label(f"{y:.2f}")
         rect  = label.get_rect(center=(MARGIN - 15, px_y))
         surface.blit(label, rect)
         y += GRID_STEP
@@ -71,49 +92,11 @@ def main():
     plan=compute_shot(cue,tgt,blks)
     print("plan =", plan) 
 
-    pockets=[np.array([0,0]),np.array([w/2,0]),np.array([w,0]),
-             np.array([0,h]),np.array([w/2,h]),np.array([w,h])]
-
-    pygame.init()
-    global LABEL_FONT
-    LABEL_FONT = pygame.font.SysFont(None, 18)
-    scr=pygame.display.set_mode((int(w*SCALE+MARGIN*2),
-                                 int(h*SCALE+MARGIN*2)))
-    pygame.display.set_caption("Billiard Path – demo")
-    clock=pygame.time.Clock()
-
-    run=True
-    while run:
-        for e in pygame.event.get():
-            if e.type==pygame.QUIT: run=False
-
-        scr.fill(RAIL)
-        pygame.draw.rect(scr,GREEN,(MARGIN,MARGIN,w*SCALE,h*SCALE))
-        draw_grid(scr, w, h)
-        for pk in pockets: pygame.draw.circle(scr,PKCOL,px(pk),R_PK)
-
-        draw=lambda p,c:pygame.draw.circle(scr,c,px(p),R_BALL)
-        draw(cue,CUE); draw(tgt,TARGET); [draw(b,OTH) for b in blks]
-
-        if plan:
-            G=np.array(plan['ghost'])
-            PK=pockets[plan['pocket_id']]
-            if plan['type']=='direct':
-                dashed(scr,DASH,cue,G,DASH_W)
-                pygame.draw.line(scr,LINE1,px(cue),px(G),2)
-            else:
-                R=np.array(plan['rail_pt'])
-                dashed(scr,DASH,cue,R,DASH_W)
-                dashed(scr,DASH,R,G,DASH_W)
-                pygame.draw.line(scr,LINE1,px(cue),px(R),2)
-                pygame.draw.line(scr,LINE1,px(R),px(G),2)
-
-            dashed(scr,DASH,tgt,PK,DASH_W)
-            pygame.draw.line(scr,LINE2,px(G),px(tgt),2)
-            pygame.draw.line(scr,LINE2,px(tgt),px(PK),2)
-
-        pygame.display.flip(); clock.tick(60)
-    pygame.quit()
+    # 靜態層 / 路徑層快取 + 髒矩形更新 (gui/render.py)
+    from gui.render import PlanRenderer, run_window
+    r=PlanRenderer((w,h))
+    r.set_plan(cue,tgt,blks,plan)
+    run_window(r,"Billiard Path – demo")
 
 if __name__=='__main__':
     main()
@@ -8,86 +8,21 @@
        vis.show(cue, target, blockers, info)   # info 可省略
    這樣就不會因為 argparse 卡住。
 """
-import argparse, numpy as np, pygame
+import argparse, numpy as np
 from core.billiard_api import compute_shot
 import gui.simulator as sim   # 所有視覺常數 / 函式
+import gui.render as render   # 靜態圖層快取 + 髒矩形
 
 # ──────────────────────────────────────────────────────────────
 # Internal: 單純把顯示流程包成函式，讓 CLI 與 show() 共用
 # ──────────────────────────────────────────────────────────────
 
 def _render(cue, target, blockers, info):
-    """在 Pygame 視窗即時顯示路徑，直到關閉窗口"""
-
-    pygame.init()
-    # 給 simulator 用的字型（draw_grid 會用到）
-    sim.LABEL_FONT = pygame.font.SysFont(None, 18)
-
-    scr = pygame.display.set_mode((
-        int(sim.TABLE[0]*sim.SCALE + sim.MARGIN*2),
-        int(sim.TABLE[1]*sim.SCALE + sim.MARGIN*2)
-    ))
-    pygame.display.set_caption("compute_shot visualize")
-    clock = pygame.time.Clock()
-    font  = pygame.font.SysFont(None, 48)
-
-    # 袋口世界座標
-    w, h = sim.TABLE
-    pkts = [np.array([0,0]), np.array([w/2,0]), np.array([w,0]),
-            np.array([0,h]), np.array([w/2,h]), np.array([w,h])]
-
-    # ---- 主迴圈 --------------------------------------------------
-    run = True
-    while run:
-        for e in pygame.event.get():
-            if e.type == pygame.QUIT:
-                run = False
-
-        # --- 背景 & 桌布 ---
-        scr.fill(sim.RAIL)
-        pygame.draw.rect(scr, sim.GREEN,
-                         (sim.MARGIN, sim.MARGIN,
-                          w*sim.SCALE, h*sim.SCALE))
-        # --- 網格線 + 座標 ---
-        sim.draw_grid(scr, w, h)
-
-        # --- 袋口 ---
-        for pk in pkts:
-            pygame.draw.circle(scr, sim.PKCOL, sim.px(pk), sim.R_PK)
-
-        # --- 球 ---
-        draw_ball = lambda p,c: pygame.draw.circle(scr, c, sim.px(p), sim.R_BALL)
-        draw_ball(cue,    sim.CUE)
-        draw_ball(target, sim.TARGET)
-        for b in blockers:
-            draw_ball(b, sim.OTH)
-
-        # --- 路徑 / NO PATH ---
-        if info:
-            G  = np.array(info["ghost"])
-            PK = pkts[info["pocket_id"]]
-            if info["type"] == "direct":
-                sim.dashed(scr, sim.DASH, cue, G, sim.DASH_W)
-                pygame.draw.line(scr, sim.LINE1, sim.px(cue), sim.px(G), 2)
-            else:
-                R = np.array(info["rail_pt"])
-                sim.dashed(scr, sim.DASH, cue, R, sim.DASH_W)
-                sim.dashed(scr, sim.DASH, R, G, sim.DASH_W)
-                pygame.draw.line(scr, sim.LINE1, sim.px(cue), sim.px(R), 2)
-                pygame.draw.line(scr, sim.LINE1, sim.px(R), sim.px(G), 2)
-
-            sim.dashed(scr, sim.DASH, target, PK, sim.DASH_W)
-            pygame.draw.line(scr, sim.LINE2, sim.px(G), sim.px(target), 2)
-            pygame.draw.line(scr, sim.LINE2, sim.px(target), sim.px(PK), 2)
-        else:
-            txt = font.render("NO  PATH", True, (255,0,0))
-            rect = txt.get_rect(center=(scr.get_width()/2, scr.get_height()/2))
-            scr.blit(txt, rect)
-
-        pygame.display.flip()
-        clock.tick(60)
-
-    pygame.quit()
+    """在 Pygame 視窗顯示路徑，直到關閉窗口
+    (靜態層 / 路徑層只畫一次，之後只更新髒矩形；沒變動時降到 IDLE_FPS)"""
+    r = render.PlanRenderer(sim.TABLE)
+    r.set_plan(cue, target, blockers, info)
+    render.run_window(r, "compute_shot visualize")
 
 
 # ──────────────────────────────────────────────────────────────
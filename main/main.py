@@ -1,18 +1,127 @@
-from vision.yoloball import capture_balls
+from vision.yoloball import capture_balls, last_frame
 from communicate.tcp import create_connection, send_message, receive_message
 import socket
 from configs.setting import HOST, PORT
-from run_shot import plan_shot_from_json
+from run_shot import plan_shot, plan_shots
+from vision.coords import CoordChain
+from pipeline import Pipeline
+from communicate.async_client import RobotClient
+from session import SessionRecorder
+from gui.dashboard import Dashboard
+from vision import yoloball
+import tracing
 
 import time
-import math 
+import asyncio
 
-j6_diff = 4
+J6_OFFSET_MM = 0.0           # 沿出桿方向的 j6 補償 (mm)；原本註解掉的 j6_diff = 4，需要時改這裡
+PIPELINE = True   # True：相機 / 偵測 / 規劃常駐背景執行緒，MOVING 時直接取最新結果
+ASYNC_CLIENT = True   # True：asyncio 事件驅動連線；False：原本的輪詢迴圈
+INTRINSICS = "/Users/caiminhan/Projects/HIWIN_MAIN/main/vision/intrinsics.yaml"
+MULTI_CMD = "MOVING_MULTI"   # 控制器要候選清單時送這個；舊控制器照送 MOVING
+N_CANDIDATES = 3             # MOVING_MULTI 回覆的候選數上限
+RECORD = False               # True：每輪 MOVING 錄進 sessions/<時間戳> (session.py 可重播)
+RECORDER = None              # SessionRecorder；__main__ 依 RECORD 建立
+ARCHIVE = False              # True：每輪 MOVING 的影格連同偵測 / 規劃存進 captured_images (manifest.jsonl)
+DASHBOARD = False            # True：另開操作面板 (俯視桌面 + 偵測 + 規劃 + 延遲)，不卡管線
+DASH = None                  # gui.dashboard.Dashboard；__main__ 依 DASHBOARD 建立
+TRACE_OUT = "trace.json"   # 結束時匯出 Chrome trace (chrome://tracing)；None = 不匯出
+log = tracing.get_logger("main")
 
 
-if __name__ == "__main__":
-    CORD_JSON = "/Users/caiminhan/Projects/HIWIN_MAIN/captures_json/cords.json"
+def _arm_pose(chain, angle, cue_xy) -> str:
+    # 桌面 → 手臂座標 (configs.setting.TABLE_TO_ROBOT / 手眼校正)，j6 偏移沿出桿方向補償
+    arm_angle, arm_x, arm_y = chain.plan_to_robot(angle, cue_xy, tool_offset_mm=J6_OFFSET_MM)
+    return f"{arm_angle:.2f}, {arm_x:.2f}, {arm_y:.2f}"
+
+
+def shot_reply(pipe, chain, multi: int = 0) -> list:
+    """MOVING → 回傳給手臂的訊息：["100", "角度, x, y"] 或 ["200"] (無法計算路徑)
+
+    multi=k (MOVING_MULTI)：["101", "角度, x, y, score; 角度, x, y, score; ..."]，
+    最多 k 個候選依 score 由高到低放在同一則訊息；手臂到不了第一個就換下一個。
+    RECORDER 有設定時，這一輪的影格 / 偵測 / 規劃 / 回覆另存成 session；
+    ARCHIVE 時影格背景編碼封存，manifest 同一行記下偵測與規劃。
+    """
+    log.info("開始拍攝")
+    if pipe is not None:
+        # 管線已在手臂移動時持續偵測 / 規劃；桌面靜止後的結果直接取用
+        with tracing.span("pipeline.wait"):
+            data, result = pipe.request()
+        frame, H = (pipe.last["frame"], pipe.last["H"]) if data is not None else (None, None)
+    else:
+        # 桌面靜止即拍 (取代固定 3 秒倒數)；逾時未靜止 → data 為 None
+        _, data = capture_balls(settle=True, show=False, intrinsics_path=INTRINSICS)
+        frame, H = last_frame() if data is not None else (None, None)
+        # 偵測結果直接交給規劃器；cords.json 由背景執行緒另外存檔
+        with tracing.span("plan"):
+            result = None if data is None or multi else plan_shot(data, 'min', show=False)
+
+    if multi:
+        result = [] if data is None else plan_shots(data, 'min', multi)
+    reply = _format_reply(chain, result, multi)
+    if DASH is not None:
+        DASH.publish(plan=result, reply=reply)          # 實際送出的路線
+    if RECORDER is not None:
+        RECORDER.record(MULTI_CMD if multi else "MOVING", frame=frame, H=H,
+                        data=data, plan=result, reply=reply)
+    if ARCHIVE and frame is not None:
+        from vision.capture import archive
+        archive().save(frame, det=data, plan=result)
+    return reply
+
+
+def _format_reply(chain, result, multi: int) -> list:
+    if multi:
+        cands = result
+        if not cands:
+            return ["200"]
+        log.info("計算結果：%d 個候選，最佳 %.2f° (score %.3f)", len(cands), cands[0][0], cands[0][2])
+        with tracing.span("to_robot"):
+            poses = [f"{_arm_pose(chain, a, cue_xy)}, {score:.3f}" for a, cue_xy, score in cands]
+        return ["101", "; ".join(poses)]   # 候選一次送出，控制器端自行退而求其次
+
+    if result is None:
+        return ["200"]
+    angle, cue_xy = result
+    log.info("計算結果：%.2f°，%s", angle, cue_xy)
+    with tracing.span("to_robot"):
+        payload = _arm_pose(chain, angle, cue_xy)
+    return ["100", payload]      # 成功計算路徑：狀態 + 座標一次送出
+
+
+def run_async(pipe, chain) -> None:
+    client = RobotClient(HOST, PORT)
+
+    @client.on("MOVING")
+    async def _moving(msg):
+        # 拍照 / 偵測在執行緒池跑，期間照常收指令；重複的 MOVING 共用同一次結果
+        return await client.run_blocking("MOVING", shot_reply, pipe, chain)
+
+    @client.on(MULTI_CMD)
+    async def _moving_multi(msg):
+        return await client.run_blocking(MULTI_CMD, shot_reply, pipe, chain, N_CANDIDATES)
+
+    async def _main():
+        pump = asyncio.create_task(_pump_dashboard(DASH)) if DASH is not None else None
+        try:
+            await client.run()
+        finally:
+            if pump is not None:
+                pump.cancel()
+
+    asyncio.run(_main())
 
+
+async def _pump_dashboard(dash) -> None:
+    """面板視窗只能由主執行緒操作 (macOS)：事件迴圈就在主執行緒，定期 show()"""
+    while True:
+        dash.show()
+        await asyncio.sleep(dash.period)
+
+
+def poll_loop(pipe, chain) -> None:
+    """原本的輪詢迴圈 (ASYNC_CLIENT = False 時使用)"""
     dots = 0          # loading 點數
     sock = None
     while True:
@@ -22,46 +131,29 @@ if __name__ == "__main__":
             if sock is None:                  # 建立失敗，5 秒後重試
                 time.sleep(5)
                 continue
-            sock.settimeout(2)                # 2 秒沒資料就丟 socket.timeout
+            # 2 秒沒資料就丟 socket.timeout；有面板時縮短，逾時順便更新視窗
+            sock.settimeout(2 if DASH is None else DASH.period)
+
+        if DASH is not None:
+            DASH.show()                       # 面板視窗在主執行緒更新
 
         # ----------- 嘗試收訊息 -----------
         try:
-            msg = receive_message(sock)
-            if msg is None:                   # 沒資料 → 顯示 loading
-                loading = "." * dots
-                print(f"\r等待中{loading:<3}", end="", flush=True)
-                dots = (dots + 1) % 4
-                continue
-
-            print(f"\n收到伺服器訊息：{msg}")   # 有資料就換行顯示
+            msg = receive_message(sock)       # 沒資料丟 socket.timeout；對方關閉丟 ConnectionError
+            print()                           # 有資料就換行 (結束 loading 動畫)
+            log.debug("收到伺服器訊息：%s", msg)
 
             # ----------- 指令判斷 -----------
             if msg == "MOVING":
-                print("開始拍攝")
-                capture_balls(wait_sec=3, show=False, intrinsics_path="/Users/caiminhan/Projects/HIWIN_MAIN/main/vision/intrinsics.yaml")
-                result = plan_shot_from_json(CORD_JSON, 'min', show=False)
-                
-                if result is None:
-                    send_message(sock, "200") # 無法計算路徑
-                else:
-                    send_message(sock, "100") # 成功計算路徑
-                    angle, cue_xy = result
-                    print(f"計算結果：{angle:.2f}°，{cue_xy}")
-                    arm_angle = -angle                       # 依你原本邏輯
-                    arm_x = round(cue_xy[0] * 1000, 2)       # m → mm
-                    arm_y = round(375 - cue_xy[1] * 1000, 2) # 底邊座標換算
-                    '''
-                    dx = j6_diff * math.cos(math.radians(arm_angle))
-                    dy = j6_diff * math.sin(math.radians(arm_angle))
-                    
-                    arm_x += dx
-                    arm_y += dy
-                    '''
-                    payload = f"{arm_angle:.2f}, {arm_x:.2f}, {arm_y:.2f}"
-                    send_message(sock, payload)
+                with tracing.cycle(msg):          # 收到 MOVING → 回覆送出 算一輪
+                    send_message(sock, *shot_reply(pipe, chain))
+
+            elif msg == MULTI_CMD:
+                with tracing.cycle(msg):
+                    send_message(sock, *shot_reply(pipe, chain, N_CANDIDATES))
                     
             elif msg == "EXIT":                          # 伺服器要求關閉
-                print("伺服器結束連線，5 秒後嘗試重新連線")
+                log.info("伺服器結束連線，5 秒後嘗試重新連線")
                 sock.close()
                 sock = None
                 time.sleep(5)
@@ -77,9 +169,40 @@ if __name__ == "__main__":
             print(f"\r等待中{loading:<3}", end="", flush=True)
             dots = (dots + 1) % 4
 
+        except ConnectionError as e:          # 伺服器關閉連線 (沒送 EXIT)
+            print()
+            log.warning("%s，5 秒後重新連線", e)
+            sock.close()
+            sock = None
+            time.sleep(5)
+
         except Exception as e:
-            print(f"\n連線異常：{e}，5 秒後重試")
+            print()
+            log.warning("連線異常：%s，5 秒後重試", e)
             if sock:
                 sock.close()
             sock = None
             time.sleep(5)
+
+
+if __name__ == "__main__":
+    tracing.setup_logging()                                # 逐則訊息的 log 需 DEBUG
+    CHAIN = CoordChain.from_files(intrinsics=INTRINSICS)   # 像素 / 桌面 / 手臂 座標鏈，只載入一次
+    DASH = Dashboard(K=CHAIN.K, D=CHAIN.D).start() if DASHBOARD else None   # 影格為原始相機影像
+    yoloball.DASHBOARD = DASH
+    PIPE = Pipeline(intrinsics_path=INTRINSICS, dashboard=DASH).start() if PIPELINE else None
+    RECORDER = SessionRecorder(intrinsics=INTRINSICS) if RECORD else None
+    try:
+        if ASYNC_CLIENT:
+            run_async(PIPE, CHAIN)
+        else:
+            poll_loop(PIPE, CHAIN)
+    finally:
+        if RECORDER is not None:
+            RECORDER.close()
+        if ARCHIVE:
+            from vision.capture import archive
+            archive().close()
+        log.info("各階段延遲 (ms)：\n%s", tracing.report())
+        if TRACE_OUT:
+            tracing.export_chrome(TRACE_OUT)
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+拍照 / 偵測 / 規劃 管線
+───────────────────────────────────────────────────
+main.py 原本單執行緒：收到 MOVING 才開相機 → 等靜止 → 偵測 → 規劃 → 回傳，
+手臂移動期間視覺端完全閒置。Pipeline 改成三個常駐執行緒，以長度 1 的佇列串接
+(只留最新一筆，舊的直接丟掉，記憶體固定)：
+
+    grabber ──(靜止影格)──▶ detector ──(偵測結果)──▶ planner ──▶ 最新桌面狀態
+
+‣ grabber ：相機常開，每幀餵 MotionGate；桌面靜止 still_sec 後才往下送；
+            CornerTracker 更新 H 後，閘門的桌面 ROI 跟著換
+‣ detector：去畸變 + 桌角追蹤 + YOLO (+ BallTracker 穩定球號)；同一段靜止期間只偵測一次
+‣ planner ：plan_shot()，結果連同影格時間存成最新狀態
+‣ request()：MOVING 時呼叫；最新狀態的影格落在目前這段靜止期內 → 立即回傳，
+  否則等下一張靜止確認影格跑完 (最多 timeout 秒)
+
+    pipe = Pipeline(intrinsics_path=INTRINSICS).start()
+    data, result = pipe.request()
+"""
+from __future__ import annotations
+
+import time, queue, threading, cv2
+from typing import Optional, Tuple
+
+from vision import yoloball
+from vision.motion_gate import MotionGate, STILL_SEC, TIMEOUT_SEC
+from vision.tracker import BallTracker
+from run_shot import plan_shot
+import tracing
+
+TARGET = "min"          # plan_shot 的目標球參數
+TRACK_BALLS = True      # 偵測結果先經 BallTracker，球號跨拍照穩定
+log = tracing.get_logger("pipeline")
+
+
+def _put_latest(q: queue.Queue, item) -> None:
+    """有界佇列：滿了先丟最舊的再放新的"""
+    while True:
+        try:
+            q.put_nowait(item)
+            return
+        except queue.Full:
+            try:
+                q.get_nowait()
+            except queue.Empty:
+                pass
+
+
+class Pipeline:
+    def __init__(self, *, intrinsics_path: Optional[str] = None, target=TARGET,
+                 still_sec: float = STILL_SEC, cam=yoloball.CAM_URL, dashboard=None):
+        self.K = self.D = None
+        if intrinsics_path:
+            self.K, self.D = yoloball._load_intrinsics(intrinsics_path)
+        self.target = target
+        self.cam = cam
+        self.tracker = yoloball._tracker()
+        self.gate = MotionGate(yoloball._table_px(self.tracker.H), still_sec=still_sec)
+        self._gate_H = self.tracker.H                   # 閘門 ROI 依據的 H；與 tracker.H 不同就重算
+        self.balls = BallTracker() if TRACK_BALLS else None
+        self.stats = {"frames": 0, "detect": 0, "plan": 0}
+        self.error: Optional[Exception] = None
+        self.dash = dashboard                           # gui.dashboard.Dashboard；只 publish 最新狀態
+        if self.dash is not None:
+            self.dash.publish(H=self.tracker.H)
+
+        self._frames: queue.Queue = queue.Queue(1)      # grabber → detector
+        self._dets: queue.Queue = queue.Queue(1)        # detector → planner
+        self._calm: Optional[float] = None              # 目前靜止期起點；在動 = None
+        self._sent = -1.0                               # 最後送去偵測的影格時間
+        self._state: Optional[dict] = None              # {"t", "data", "result", "frame", "H"}
+        self.last: Optional[dict] = None                # request() 最後回傳的狀態 (session 錄製用)
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._threads = []
+
+    # ── 生命週期 ──────────────────────────────────
+    def start(self) -> "Pipeline":
+        for fn in (self._grab, self._detect, self._plan):
+            t = threading.Thread(target=self._guard, args=(fn,), name=fn.__name__.strip("_"), daemon=True)
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def stop(self, timeout: float = 2.0) -> None:
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        for t in self._threads:
+            t.join(timeout)
+
+    def _guard(self, fn) -> None:
+        """任一階段出錯 → 整條管線停止，request() 立即回 (None, None)"""
+        try:
+            fn()
+        except Exception as e:
+            self.error = e
+            log.error("[Pipeline] %s 停止：%s", fn.__name__.strip('_'), e)
+            self._stop.set()
+            with self._cond:
+                self._cond.notify_all()
+
+    # ── 各階段 ────────────────────────────────────
+    def _grab(self) -> None:
+        cap = cv2.VideoCapture(self.cam)
+        if not cap.isOpened():
+            raise RuntimeError('Camera open fail')
+        try:
+            while not self._stop.is_set():
+                ok, frm = cap.read()
+                if not ok:
+                    time.sleep(0.01)
+                    continue
+                t = time.monotonic()
+                self.stats["frames"] += 1
+                if self.dash is not None:
+                    self.dash.publish(frame=frm)          # 原始影格；面板以 K/D 去畸變
+                H = self.tracker.H                      # detector 更新 H 時整個換掉，比對身分即可
+                if H is not self._gate_H:
+                    self.gate.set_roi(yoloball._table_px(H))
+                    self._gate_H = H
+                if not self.gate.feed(frm, t):
+                    self._calm = None
+                    continue
+                self._calm = self.gate.still_since
+                if self._sent < self._calm:             # 這段靜止期還沒偵測過
+                    self._sent = t
+                    _put_latest(self._frames, (t, frm))
+        finally:
+            cap.release()
+
+    def _detect(self) -> None:
+        yoloball._get_model()                           # 先載模型，不佔第一次 MOVING
+        while not self._stop.is_set():
+            try:
+                t, frm = self._frames.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            with tracing.span("pipeline.detect"):
+                img = frm if self.K is None else yoloball._undistort(frm, self.K, self.D)
+                if yoloball.TRACK_CORNERS:
+                    self.tracker.update(img, force=True)
+                data, _ = yoloball._detect_batch([img], self.tracker.H)[0]
+                if self.balls is not None:
+                    data = {**data, "balls": self.balls.update(data["balls"], t)}
+            self.stats["detect"] += 1
+            if self.dash is not None:
+                self.dash.publish(data=data, H=self.tracker.H)
+            _put_latest(self._dets, (t, data, frm, self.tracker.H))
+
+    def _plan(self) -> None:
+        while not self._stop.is_set():
+            try:
+                t, data, frm, H = self._dets.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            result = plan_shot(data, self.target, show=False)
+            self.stats["plan"] += 1
+            if self.dash is not None:
+                self.dash.publish(plan=result)
+            with self._cond:
+                self._state = {"t": t, "data": data, "result": result, "frame": frm, "H": H}
+                self._cond.notify_all()
+
+    # ── 對外 ──────────────────────────────────────
+    def _fresh(self) -> bool:
+        """最新狀態的影格是否在目前這段靜止期內 (之後桌面沒動過)"""
+        s, calm = self._state, self._calm
+        return s is not None and calm is not None and s["t"] >= calm
+
+    def request(self, timeout: float = TIMEOUT_SEC) -> Tuple[Optional[dict], Optional[tuple]]:
+        """→ (偵測 data, plan_shot 結果)；逾時或管線已停止回 (None, None)"""
+        t0 = time.monotonic()
+        with self._cond:
+            while not self._fresh():
+                left = t0 + timeout - time.monotonic()
+                if left <= 0 or self._stop.is_set():
+                    log.warning("[Pipeline] %.1fs 內沒有靜止桌面的結果", timeout)
+                    return None, None
+                self._cond.wait(min(left, 0.05))         # _calm 由 grabber 更新，短輪詢
+            s = self.last = self._state
+        log.info("[Pipeline] 回應 %.0f ms (影格相對請求 %+.2fs)", (time.monotonic() - t0) * 1e3, s['t'] - t0)
+        yoloball._WRITER.write_json(yoloball.SAVE_DIR / "cords.json", s["data"])
+        return s["data"], s["result"]
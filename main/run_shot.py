@@ -3,7 +3,7 @@
 回傳 angle_deg + cue 座標，可選擇 --show 圖形化。
 
 用法：
-    python run_shot.py <json> [target_id|'min'] [--show]
+    python run_shot.py <json> [target_id|'min'] [--show] [--save out.png] [--multi K]
 
 參數說明
 ---------
@@ -13,17 +13,26 @@
     整數 n      → 指定球號 n
     'min'       → 自動選擇除了 0 以外編號最小的球
 --show      ：顯示圖形化路徑
+--save PNG  ：路徑圖離屏繪製存檔 (gui.headless，不開視窗、不阻塞)
+--multi K   ：改印前 K 個候選路線 (plan_shots，依 score 排序)
+
+即時流程 (main.py) 直接把偵測 dict 傳給 `plan_shot()`，不再寫檔後讀回；
+控制器要多個候選 (MOVING_MULTI) 時改用 `plan_shots()`。
 
 此版本採 **作法 A**：
-  ‑ 所有錯誤在 `plan_shot_from_json()` 內部捕捉並回傳 `None`，
+  ‑ 所有錯誤在 `plan_shot()` / `plan_shot_from_json()` 內部捕捉並回傳 `None`，
   ‑ 呼叫端只需判斷是否為 `None`。
 """
 import json
 import argparse
 from typing import Optional, Tuple, List, Union
 
-from core.billiard_api import compute_shot         # 需 core/__init__.py
+from core.billiard_api import compute_shot, compute_shots, MAX_CANDIDATES   # 需 core/__init__.py
 import gui.visualize as visualize                  # 需 gui/__init__.py
+import gui.headless as headless                    # 離屏繪圖 (不開視窗)
+import tracing
+
+log = tracing.get_logger("run_shot")
 
 
 # ──────────────── 工具 ────────────────
@@ -33,59 +42,110 @@ def cm2m(x_cm: float, y_cm: float) -> Tuple[float, float]:
     return x_cm / 100.0, y_cm / 100.0
 
 
-def plan_shot_from_json(
-    json_path: str,
+def ball_cm(b: dict) -> Tuple[float, float]:
+    """球心 cm；YOLO (x_cm/y_cm) 與 Hough (cx_cm/cy_cm) 兩種欄位都接受"""
+    return (b["x_cm"], b["y_cm"]) if "x_cm" in b else (b["cx_cm"], b["cy_cm"])
+
+
+def _layout(
+    detections: dict,
+    target_id: Optional[Union[int, str]] = None,
+) -> Tuple[Tuple[float, float], Tuple[float, float], List[Tuple[float, float]]]:
+    """偵測結果 → (cue, target, blockers) (m)；找不到球丟 RuntimeError"""
+    balls = [b for b in detections["balls"] if b["conf"] >= 0.30]
+    if not balls:
+        raise RuntimeError("偵測結果沒有信心值 ≥0.30 的球")
+
+    # --- cue 球 ---
+    cue_b = next(b for b in balls if b["type"] == "0")
+
+    # --- 目標球邏輯 ---
+    if target_id is None:
+        # conf 最高
+        tgt_b = max((b for b in balls if b["type"] != "0"), key=lambda b: b["conf"])
+    elif target_id == "min":
+        tgt_b = min((b for b in balls if b["type"] != "0"), key=lambda b: int(b["type"]))
+    else:
+        tgt_b = next((b for b in balls if b["type"] == str(target_id)), None)
+        if tgt_b is None:
+            raise RuntimeError(f"找不到球號 {target_id}")
+
+    blk_bs: List[dict] = [b for b in balls if b not in (cue_b, tgt_b)]
+
+    # --- cm → m ---
+    return (cm2m(*ball_cm(cue_b)), cm2m(*ball_cm(tgt_b)),
+            [cm2m(*ball_cm(b)) for b in blk_bs])
+
+
+def plan_shot(
+    detections: dict,
     target_id: Optional[Union[int, str]] = None,
     show: bool = False,
+    save: Optional[str] = None,
 ) -> Optional[Tuple[float, Tuple[float, float]]]:
-    """讀取偵測結果並規劃擊球
+    """直接吃偵測結果 dict ({"balls": [...]}) 規劃擊球，不經過檔案
 
     成功 → (angle_deg, cue_xy)
     失敗 → None（並印出錯誤訊息）
+    show=True 開視窗 (阻塞到關閉)；save="x.png" 改用離屏繪圖存檔，不開視窗、不阻塞。
     """
     try:
-        # --- 讀檔 ---
-        with open(json_path, "r", encoding="utf-8") as f:
-            raw_balls = json.load(f)["balls"]
-
-        balls = [b for b in raw_balls if b["conf"] >= 0.30]
-        if not balls:
-            raise RuntimeError("JSON 內沒有信心值 ≥0.30 的球")
-
-        # --- cue 球 ---
-        cue_b = next(b for b in balls if b["type"] == "0")
-
-        # --- 目標球邏輯 ---
-        if target_id is None:
-            # conf 最高
-            tgt_b = max((b for b in balls if b["type"] != "0"), key=lambda b: b["conf"])
-        elif target_id == "min":
-            tgt_b = min((b for b in balls if b["type"] != "0"), key=lambda b: int(b["type"]))
-        else:
-            tgt_b = next((b for b in balls if b["type"] == str(target_id)), None)
-            if tgt_b is None:
-                raise RuntimeError(f"找不到球號 {target_id}")
-
-        blk_bs: List[dict] = [b for b in balls if b not in (cue_b, tgt_b)]
-
-        # --- cm → m ---
-        cue_xy = cm2m(cue_b["cx_cm"], cue_b["cy_cm"])
-        target = cm2m(tgt_b["cx_cm"], tgt_b["cy_cm"])
-        blocks = [cm2m(b["cx_cm"], b["cy_cm"]) for b in blk_bs]
+        cue_xy, target, blocks = _layout(detections, target_id)
 
         # --- 求解 ---
-        info = compute_shot(cue_xy, target, blocks)
+        with tracing.span("solver"):
+            info = compute_shot(cue_xy, target, blocks)
         if info is None:
             raise RuntimeError("無可行路徑 (compute_shot 回傳 None)")
 
         if show:
             visualize.show(cue_xy, target, blocks, info)
+        if save:
+            headless.render_plan(cue_xy, target, blocks, info, path=save)
 
         return info["angle_deg"], cue_xy
 
+    except Exception as e:
+        log.warning("[plan_shot] 失敗：%s", e)
+        return None
+
+
+def plan_shots(
+    detections: dict,
+    target_id: Optional[Union[int, str]] = None,
+    k: int = MAX_CANDIDATES,
+) -> List[Tuple[float, Tuple[float, float], float]]:
+    """同 plan_shot，但回傳同一顆目標球的前 k 個可行路線 (不同袋口 / 單庫)，
+    依 score 由高到低：[(angle_deg, cue_xy, score), ...]；無解或失敗回 []。
+    手臂到不了第一個姿勢時，控制器直接改用下一個，不必重拍。
+    """
+    try:
+        cue_xy, target, blocks = _layout(detections, target_id)
+        with tracing.span("solver"):
+            infos = compute_shots(cue_xy, target, blocks, k)
+        if not infos:
+            raise RuntimeError("無可行路徑 (compute_shots 回傳空 list)")
+        return [(i["angle_deg"], cue_xy, i["score"]) for i in infos]
+
+    except Exception as e:
+        log.warning("[plan_shots] 失敗：%s", e)
+        return []
+
+
+def plan_shot_from_json(
+    json_path: str,
+    target_id: Optional[Union[int, str]] = None,
+    show: bool = False,
+    save: Optional[str] = None,
+) -> Optional[Tuple[float, Tuple[float, float]]]:
+    """讀取偵測結果檔再交給 plan_shot()（離線 / CLI 用）"""
+    try:
+        with open(json_path, "r", encoding="utf-8") as f:
+            detections = json.load(f)
     except Exception as e:
         print("[plan_shot] 失敗：", e)
         return None
+    return plan_shot(detections, target_id, show, save)
 
 
 # ──────────────── CLI ────────────────
@@ -94,6 +154,8 @@ if __name__ == "__main__":
     ap.add_argument("json", help="YOLO 偵測結果 .json 路徑")
     ap.add_argument("id", nargs="?", help="目標球號；輸入 'min' 取最小球")
     ap.add_argument("--show", action="store_true", help="顯示圖形化路徑")
+    ap.add_argument("--save", metavar="PNG", help="路徑圖存成 PNG (不開視窗)")
+    ap.add_argument("--multi", type=int, metavar="K", help="列出前 K 個候選路線")
     args = ap.parse_args()
 
     # 解析目標參數
@@ -108,8 +170,16 @@ if __name__ == "__main__":
             print(f"[run_shot] 提供的球號 {args.id!r} 不是整數，也不是 'min'")
             exit(1)
 
+    if args.multi:
+        with open(args.json, "r", encoding="utf-8") as f:
+            cands = plan_shots(json.load(f), target_param, args.multi)
+        for i, (angle_deg, cue_xy, score) in enumerate(cands, 1):
+            print(f"#{i} angle_deg = {angle_deg:.2f}°, score = {score:.3f}")
+        print(f"→ {len(cands)} 個候選")
+        exit(0)
+
     # 呼叫函式 ─ 成功回 (angle, cue)；失敗回 None
-    result = plan_shot_from_json(args.json, target_param, show=args.show)
+    result = plan_shot_from_json(args.json, target_param, show=args.show, save=args.save)
 
     if result is None:
         print("→ None")
@@ -0,0 +1,422 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+擊球 session 錄製 + 決定性重播
+───────────────────────────────────────────────────
+打壞一桿時，要在真桌上重現很難。SessionRecorder 把每一輪 MOVING 的
+影格、H、偵測結果、規劃結果、收送的手臂訊息存下來；replay() 再把整個 session
+依序餵回偵測 / 規劃，比對當時的結果 (不等待，比即時快)。
+
+session 資料夾 (可追加，重開同一資料夾會接續寫)：
+    meta.json                  影格尺寸 / 縮圖比例 / 編碼 / chunk 大小 / 相機內參 (K, D)
+    frames_00000.bin ...       codec = jpg / png：每個 chunk 最多 CHUNK 張編碼後影格依序追加
+    frames.idx                 每張影格一列 (byte offset, 長度)，讀取時 memmap chunk 檔再 imdecode
+    frames_00000.npy ...       codec = raw：np.memmap，每個 chunk (CHUNK, h, w, 3) uint8，預先配置
+    index/<欄位>.bin           欄式索引，每個欄位一個固定 dtype 的 raw 檔 (只追加；
+                               重開時截到完整列數，當掉時寫到一半的列不會讓欄位錯位)
+    events.jsonl               每輪一行 {"cycle","t","cmd","reply","plan","H","det"}
+
+‣ 欄式索引：cycle / t / frame / status / n_balls / angle / score / ev_off，
+  load_index() 一次 np.fromfile 讀回，ev_off 直接 seek 到 events.jsonl 那一行
+‣ 影格：存相機原始影格 (未去畸變)，預設原尺寸 JPEG (1080p 約數百 KB / 張，raw 約 6 MB)；
+  codec="png" 無損 (重播逐像素相同)，codec="raw" 原始像素 memmap (最快、最大，需要時才開)；
+  scale < 1 另存縮圖，重播時放大回原尺寸 (meta["src_shape"]) 再偵測
+‣ 內參：intrinsics= 給 yaml 時 K / D 寫進 meta.json，重播預設用它去畸變，與現場輸入一致
+‣ 寫入交給 AsyncWriter 背景執行緒 (不丟資料)，不佔回覆手臂的路徑
+
+    rec = SessionRecorder(intrinsics=INTRINSICS)     # sessions/<時間戳>
+    rec.record("MOVING", frame=img, H=H, data=data, plan=result, reply=["100", "..."])
+    rec.close()
+
+用法 (於專案根目錄)：
+    PYTHONPATH=main python -m session replay sessions/20261019-130000 -o diff.jsonl
+    PYTHONPATH=main python -m session replay sessions/20261019-130000 --stage plan
+    PYTHONPATH=main python -m session info sessions/20261019-130000
+"""
+from __future__ import annotations
+
+import os, json, time, argparse, cv2, numpy as np
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from vision.async_writer import AsyncWriter
+import tracing
+
+SESSION_DIR = Path("sessions")
+CHUNK       = 32        # 每個 frames_* 檔的影格數
+THUMB_SCALE = 1.0       # 影格縮放比例；1.0 = 原尺寸，< 1 存縮圖
+FRAME_CODEC = "jpg"     # "jpg" (精簡，有損) / "png" (無損) / "raw" (原始像素 memmap)
+JPEG_QUALITY = 90
+FRAME_REC   = np.dtype([("off", "<i8"), ("len", "<i4")])   # frames.idx 一列
+ANGLE_TOL   = 0.01      # 重播角度差在此以內視為一致 (度)
+
+# 欄式索引：欄位 → dtype (檔案為 little-endian raw)
+COLUMNS = {
+    "cycle":   "<i4",
+    "t":       "<f8",
+    "frame":   "<i4",     # 影格序號；-1 = 這輪沒有影格
+    "status":  "<i2",     # 100 / 101 / 200
+    "n_balls": "<i2",
+    "angle":   "<f4",     # 最佳路線角度；無解 = nan
+    "score":   "<f4",     # 多候選時最佳 score；單一路線 = nan
+    "ev_off":  "<i8",     # events.jsonl 中該行的 byte offset
+}
+
+log = tracing.get_logger("session")
+
+
+# ═════════ 序列化 ═════════
+
+def plan_json(plan) -> Optional[object]:
+    """plan_shot 的 (angle, cue_xy) 或 plan_shots 的 [(angle, cue_xy, score), ...] → JSON"""
+    if plan is None:
+        return None
+    if isinstance(plan, list):
+        return [{"angle": float(a), "cue": [float(c) for c in xy], "score": float(s)} for a, xy, s in plan]
+    angle, xy = plan
+    return {"angle": float(angle), "cue": [float(c) for c in xy]}
+
+def _best(plan_j) -> tuple:
+    """→ (angle, score)，無解為 nan"""
+    if not plan_j:
+        return float("nan"), float("nan")
+    if isinstance(plan_j, list):
+        return plan_j[0]["angle"], plan_j[0]["score"]
+    return plan_j["angle"], float("nan")
+
+
+# ═════════ 錄製 ═════════
+
+class SessionRecorder:
+    def __init__(self, folder: Optional[str | Path] = None, *, scale: float = THUMB_SCALE,
+                 codec: str = FRAME_CODEC, quality: int = JPEG_QUALITY,
+                 chunk: int = CHUNK, queue_size: int = 8, intrinsics: Optional[str] = None):
+        if codec not in ("jpg", "png", "raw"):
+            raise ValueError(f"不支援的影格編碼 {codec!r}")
+        self.folder = Path(folder) if folder else SESSION_DIR / time.strftime("%Y%m%d-%H%M%S")
+        (self.folder / "index").mkdir(parents=True, exist_ok=True)
+        self.meta_path = self.folder / "meta.json"
+        self.meta = (json.loads(self.meta_path.read_text(encoding="utf-8")) if self.meta_path.exists()
+                     else {"version": 2, "scale": scale, "codec": codec, "quality": quality,
+                           "chunk": chunk, "shape": None, "src_shape": None})
+        self.meta.setdefault("codec", "raw")          # version 1 只有 raw
+        if intrinsics and not self.meta.get("K"):
+            from vision.coords import load_intrinsics
+            K, D = load_intrinsics(intrinsics)
+            self.meta.update(intrinsics=str(intrinsics), K=K.tolist(), D=D.ravel().tolist())
+        self._save_meta()
+        idx = _truncate_index(self.folder)
+        self.cycle = int(idx["cycle"][-1]) if len(idx["cycle"]) else 0
+        self.n_frames = int(idx["frame"].max()) + 1 if len(idx["frame"]) else 0
+        if self.meta["codec"] != "raw":
+            _truncate_frames(self.folder, self.n_frames, self.meta["chunk"])
+        self._mm: Optional[np.memmap] = None
+        self._mm_id = -1
+        self._blob = None                 # 目前追加中的 frames_*.bin
+        self._fidx = open(self.folder / "frames.idx", "ab") if self.meta["codec"] != "raw" else None
+        self._cols = {k: open(self.folder / "index" / f"{k}.bin", "ab") for k in COLUMNS}
+        self._events = open(self.folder / "events.jsonl", "ab")
+        self._writer = AsyncWriter(maxsize=queue_size, drop_oldest=False, name="session-recorder")
+        log.info("[Session] 錄製到 %s (已有 %d 輪)", self.folder, self.cycle)
+
+    # ── 對外 ──────────────────────────────────────
+    def record(self, cmd: str, *, frame: Optional[np.ndarray] = None, H: Optional[np.ndarray] = None,
+               data: Optional[dict] = None, plan=None, reply: Optional[List[str]] = None) -> int:
+        """排入背景寫入 → 回傳 cycle 編號；frame 交出後不要再修改"""
+        self.cycle += 1
+        self._writer.submit(self._write, self.cycle, time.time(), cmd, frame,
+                            None if H is None else np.asarray(H, float).tolist(),
+                            data, plan_json(plan), list(reply or []))
+        return self.cycle
+
+    def flush(self) -> None:
+        self._writer.flush()
+
+    def close(self) -> None:
+        self._writer.close()
+        for f in self._cols.values():
+            f.close()
+        self._events.close()
+        if self._mm is not None:
+            self._mm.flush()
+        if self._blob is not None:
+            self._blob.close()
+        if self._fidx is not None:
+            self._fidx.close()
+
+    # ── writer 執行緒 ─────────────────────────────
+    def _write(self, cycle, t, cmd, frame, H, data, plan_j, reply) -> None:
+        fid = self._put_frame(frame) if frame is not None else -1
+        off = self._events.tell()
+        ev = {"cycle": cycle, "t": round(t, 3), "cmd": cmd, "reply": reply, "plan": plan_j,
+              "H": H, "det": data, "frame": fid}
+        self._events.write((json.dumps(ev, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8"))
+        self._events.flush()
+
+        angle, score = _best(plan_j)
+        row = {"cycle": cycle, "t": t, "frame": fid,
+               "status": int(reply[0]) if reply and reply[0].isdigit() else 0,
+               "n_balls": len(data["balls"]) if data else 0,
+               "angle": angle, "score": score, "ev_off": off}
+        for k, dt in COLUMNS.items():
+            self._cols[k].write(np.array(row[k], dtype=dt).tobytes())
+            self._cols[k].flush()
+
+    def _save_meta(self) -> None:
+        self.meta_path.write_text(json.dumps(self.meta, indent=2), encoding="utf-8")
+
+    def _put_frame(self, frame: np.ndarray) -> int:
+        m = self.meta
+        if m["shape"] is None:
+            h, w = frame.shape[:2]
+            sh, sw = max(1, round(h * m["scale"])), max(1, round(w * m["scale"]))
+            m["src_shape"], m["shape"] = [h, w], [sh, sw]
+            self._save_meta()
+        sh, sw = m["shape"]
+        if frame.shape[:2] != (sh, sw):
+            frame = cv2.resize(frame, (sw, sh), interpolation=cv2.INTER_AREA)
+        if frame.ndim == 2:
+            frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+
+        fid = self.n_frames
+        cid, slot = divmod(fid, m["chunk"])
+        if m["codec"] != "raw":
+            self._put_encoded(frame, cid)
+            self.n_frames += 1
+            return fid
+        if cid != self._mm_id:
+            if self._mm is not None:
+                self._mm.flush()
+            p = self.folder / f"frames_{cid:05d}.npy"
+            self._mm = (np.load(p, mmap_mode="r+") if p.exists() else
+                        np.lib.format.open_memmap(p, mode="w+", dtype=np.uint8, shape=(m["chunk"], sh, sw, 3)))
+            self._mm_id = cid
+        self._mm[slot] = frame
+        self.n_frames += 1
+        return fid
+
+    def _put_encoded(self, frame: np.ndarray, cid: int) -> None:
+        m = self.meta
+        params = [cv2.IMWRITE_JPEG_QUALITY, int(m.get("quality", JPEG_QUALITY))] if m["codec"] == "jpg" else []
+        ok, buf = cv2.imencode("." + m["codec"], frame, params)
+        if not ok:
+            raise RuntimeError("影格編碼失敗")
+        if cid != self._mm_id:
+            if self._blob is not None:
+                self._blob.close()
+            self._blob = open(self.folder / f"frames_{cid:05d}.bin", "ab")
+            self._mm_id = cid
+        off = self._blob.tell()
+        self._blob.write(buf.tobytes())
+        self._blob.flush()
+        self._fidx.write(np.array((off, buf.size), FRAME_REC).tobytes())
+        self._fidx.flush()
+
+
+# ═════════ 讀取 ═════════
+
+def load_index(folder: str | Path) -> Dict[str, np.ndarray]:
+    """欄式索引 → {欄位: ndarray}；寫到一半的列 (欄位長度不齊) 截掉"""
+    d = Path(folder) / "index"
+    cols = {k: (np.fromfile(d / f"{k}.bin", dtype=dt) if (d / f"{k}.bin").exists() else np.empty(0, dt))
+            for k, dt in COLUMNS.items()}
+    n = min(len(v) for v in cols.values())
+    return {k: v[:n] for k, v in cols.items()}
+
+def _truncate_index(folder: Path) -> Dict[str, np.ndarray]:
+    """接續寫之前：各欄截到完整列數、events.jsonl 截到最後一列之後，再回傳索引
+
+    "ab" 追加不會覆蓋舊資料；不截掉的話，當掉時多寫的半列會讓之後每一列的欄位錯開。
+    """
+    idx = load_index(folder)
+    n = len(idx["cycle"])
+    for k, dt in COLUMNS.items():
+        p = folder / "index" / f"{k}.bin"
+        if p.exists() and p.stat().st_size != n * np.dtype(dt).itemsize:
+            os.truncate(p, n * np.dtype(dt).itemsize)
+    ev = folder / "events.jsonl"
+    if ev.exists():
+        end = 0
+        if n:
+            with open(ev, "rb") as f:
+                f.seek(int(idx["ev_off"][-1]))
+                f.readline()
+                end = f.tell()
+        if ev.stat().st_size != end:
+            os.truncate(ev, end)
+    return idx
+
+def _truncate_frames(folder: Path, n_frames: int, chunk: int) -> None:
+    """編碼影格：frames.idx 截到 n_frames 列，下一張要追加的 chunk 檔截到最後一張完整影格之後"""
+    p = folder / "frames.idx"
+    recs = np.fromfile(p, dtype=FRAME_REC) if p.exists() else np.empty(0, FRAME_REC)
+    n_frames = min(n_frames, len(recs))
+    if p.exists() and p.stat().st_size != n_frames * FRAME_REC.itemsize:
+        os.truncate(p, n_frames * FRAME_REC.itemsize)
+    cid = n_frames // chunk
+    end = 0
+    if n_frames and (n_frames - 1) // chunk == cid:
+        end = int(recs[n_frames - 1]["off"] + recs[n_frames - 1]["len"])
+    b = folder / f"frames_{cid:05d}.bin"
+    if b.exists() and b.stat().st_size != end:
+        os.truncate(b, end)
+
+class Session:
+    """唯讀開啟 session：index 欄位、events、影格 (memmap，用到才讀)"""
+
+    def __init__(self, folder: str | Path):
+        self.folder = Path(folder)
+        self.meta = json.loads((self.folder / "meta.json").read_text(encoding="utf-8")) \
+            if (self.folder / "meta.json").exists() else {"chunk": CHUNK, "shape": None, "src_shape": None}
+        self.index = load_index(self.folder)
+        self._chunks: Dict[int, np.ndarray] = {}
+        p = self.folder / "frames.idx"
+        self._frames = np.fromfile(p, dtype=FRAME_REC) if p.exists() else None
+
+    def __len__(self) -> int:
+        return len(self.index["cycle"])
+
+    def event(self, i: int) -> dict:
+        with open(self.folder / "events.jsonl", "rb") as f:
+            f.seek(int(self.index["ev_off"][i]))
+            return json.loads(f.readline())
+
+    def events(self) -> Iterator[dict]:
+        with open(self.folder / "events.jsonl", "rb") as f:
+            for off in self.index["ev_off"]:
+                f.seek(int(off))
+                yield json.loads(f.readline())
+
+    def frame(self, fid: int, full: bool = True) -> Optional[np.ndarray]:
+        """影格 fid；full=True 時縮圖放大回錄製時的原尺寸"""
+        if fid < 0:
+            return None
+        cid, slot = divmod(fid, self.meta["chunk"])
+        encoded = self.meta.get("codec", "raw") != "raw"
+        mm = self._chunks.get(cid)
+        if mm is None:
+            mm = self._chunks[cid] = (np.memmap(self.folder / f"frames_{cid:05d}.bin", np.uint8, mode="r")
+                                      if encoded else
+                                      np.load(self.folder / f"frames_{cid:05d}.npy", mmap_mode="r"))
+        if encoded:
+            r = self._frames[fid]
+            img = cv2.imdecode(np.asarray(mm[r["off"]:r["off"] + r["len"]]), cv2.IMREAD_COLOR)
+        else:
+            img = np.array(mm[slot])
+        src = self.meta.get("src_shape")
+        if full and src and list(img.shape[:2]) != src:
+            img = cv2.resize(img, (src[1], src[0]), interpolation=cv2.INTER_LINEAR)
+        return img
+
+
+# ═════════ 重播 ═════════
+
+def replay(folder: str | Path, out: Optional[str] = None, *, stage: str = "vision",
+           target="min", k: int = 3, intrinsics: Optional[str] = None, undistort: bool = True,
+           recorded_H: bool = True, batch: int = 8) -> dict:
+    """依錄製順序重跑偵測 (stage="vision") 或只重跑規劃 (stage="plan")，
+    與當時的結果比對。recorded_H=False 時改用目前的 corner.json。
+    去畸變預設用 meta.json 錄下的 K / D (與現場相同)；intrinsics 給 yaml 時改用它，
+    undistort=False 則不去畸變。
+    每輪一行 {"cycle","status","angle","rec_angle","match"} 寫入 out (JSONL)。
+    偵測結果直接交給規劃，不經 Pipeline 的 BallTracker (每輪獨立，順序無關)。"""
+    from run_shot import plan_shot, plan_shots
+    s = Session(folder)
+    evs = list(s.events())
+    K = D = None
+    if stage == "vision":
+        from vision import yoloball
+        yoloball._get_model()
+        if undistort and intrinsics:
+            K, D = yoloball._load_intrinsics(intrinsics)
+        elif undistort and s.meta.get("K"):
+            K = np.array(s.meta["K"], np.float32).reshape(3, 3)
+            D = np.array(s.meta["D"], np.float32)
+        if s.meta.get("scale", 1.0) != 1.0:
+            log.warning("[Replay] 影格以 %.2f 倍縮圖錄製，偵測結果可能與現場不同", s.meta["scale"])
+        if s.meta.get("codec") == "jpg":
+            log.info("[Replay] 影格為 JPEG (有損)，偵測結果可能與現場略有不同；需逐像素重現請錄 codec=png")
+
+    t0 = time.perf_counter()
+    # ── 偵測：依序分批送 YOLO (同一批用同一個 H 才合併) ──
+    dets: List[Optional[dict]] = [ev.get("det") for ev in evs]
+    if stage == "vision":
+        todo = [i for i, ev in enumerate(evs) if ev.get("frame", -1) >= 0]
+        for j in range(0, len(todo), batch):
+            group: Dict[tuple, list] = {}
+            for i in todo[j:j + batch]:
+                H = (np.asarray(evs[i]["H"]) if recorded_H and evs[i].get("H")
+                     else yoloball._tracker().H)
+                group.setdefault(H.tobytes(), [H, []])[1].append(i)
+            for H, ids in group.values():
+                imgs = [s.frame(evs[i]["frame"]) for i in ids]
+                if K is not None:
+                    imgs = [yoloball._undistort(im, K, D) for im in imgs]
+                for i, (d, _) in zip(ids, yoloball._detect_batch(imgs, H)):
+                    dets[i] = d
+
+    # ── 規劃 + 比對 ──
+    rows, match = [], 0
+    for ev, det in zip(evs, dets):
+        multi = ev["cmd"] != "MOVING"
+        if det is None:
+            plan = [] if multi else None
+        else:
+            plan = plan_shots(det, target, k) if multi else plan_shot(det, target)
+        pj = plan_json(plan)
+        angle, _ = _best(pj)
+        rec_angle, _ = _best(ev.get("plan"))
+        status = ("101" if multi else "100") if plan else "200"
+        ok = bool(status == (ev["reply"][0] if ev["reply"] else None)
+              and (np.isnan(angle) and np.isnan(rec_angle) or abs(angle - rec_angle) <= ANGLE_TOL))
+        match += int(ok)
+        rows.append({"cycle": ev["cycle"], "cmd": ev["cmd"], "status": status,
+                     "angle": None if np.isnan(angle) else round(angle, 2),
+                     "rec_angle": None if np.isnan(rec_angle) else round(rec_angle, 2),
+                     "n_balls": len(det["balls"]) if det else 0, "match": ok})
+    dt = time.perf_counter() - t0
+
+    if out:
+        with open(out, "w", encoding="utf-8") as f:
+            for r in rows:
+                f.write(json.dumps(r, ensure_ascii=False, separators=(",", ":")) + "\n")
+    span = float(s.index["t"][-1] - s.index["t"][0]) if len(s) > 1 else 0.0
+    res = {"cycles": len(rows), "match": match, "mismatch": len(rows) - match,
+           "sec": round(dt, 3), "recorded_sec": round(span, 1),
+           "speedup": round(span / dt, 1) if dt > 0 and span > 0 else None}
+    log.info("[Replay] %d 輪，一致 %d，%.2fs (錄製時跨 %.0fs)", res["cycles"], match, dt, span)
+    return res
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser("session 錄製檔工具")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("info", help="列出 session 摘要")
+    p.add_argument("folder")
+    p = sub.add_parser("replay", help="重跑偵測 / 規劃並與錄製結果比對")
+    p.add_argument("folder")
+    p.add_argument("-o", "--out", help="逐輪比對結果 JSONL")
+    p.add_argument("--stage", choices=["vision", "plan"], default="vision",
+                   help="vision = 影格重跑 YOLO + 規劃；plan = 只用錄下的偵測重跑規劃")
+    p.add_argument("--target", default="min")
+    p.add_argument("-k", type=int, default=3, help="MOVING_MULTI 的候選數")
+    p.add_argument("--intrinsics", default=None, help="改用這個內參 (預設 meta.json 錄下的 K / D)")
+    p.add_argument("--no-undistort", action="store_true", help="不去畸變")
+    p.add_argument("--current-H", action="store_true", help="用目前的 corner.json 取代錄下的 H")
+    p.add_argument("--batch", type=int, default=8)
+    args = ap.parse_args()
+    tracing.setup_logging()
+
+    if args.cmd == "info":
+        s = Session(args.folder)
+        ix = s.index
+        st, cnt = np.unique(ix["status"], return_counts=True)
+        print(json.dumps({"cycles": len(s), "frames": int((ix["frame"] >= 0).sum()),
+                          "status": {str(int(a)): int(b) for a, b in zip(st, cnt)},
+                          "meta": s.meta}, ensure_ascii=False, indent=2))
+    else:
+        tgt = int(args.target) if args.target.isdigit() else args.target
+        res = replay(args.folder, args.out, stage=args.stage, target=tgt, k=args.k,
+                     intrinsics=args.intrinsics, undistort=not args.no_undistort,
+                     recorded_H=not args.current_H, batch=args.batch)
+        print(json.dumps(res, ensure_ascii=False, indent=2))
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+擊球循環延遲追蹤 + 分級 log
+───────────────────────────────────────────────────
+只有 print 時看不出一輪慢在相機、YOLO、座標轉換、solver 還是網路。
+‣ span(name)：以 perf_counter_ns 記錄開始 / 長度，丟進環形緩衝 (deque，固定長度)；
+  一次記錄 = 兩次計時 + 一次 append，關閉 ENABLED 時只剩一個判斷
+‣ cycle()：包住一輪 MOVING，期間的 span 都標上同一個 cycle 編號；
+  編號放在 ContextVar，並行的 cycle (asyncio task) 互不干擾；丟到執行緒池的工作要用
+  copy_context().run 帶過去 (async_client.run_blocking 已處理)。沒有 cycle 的背景執行緒
+  (相機 / pipeline) 標 0，匯出時顯示 "bg"
+  每 REPORT_EVERY 輪以 log 印出各階段 p50/p95/p99
+‣ stats()：最近的 span 依名稱統計 (滾動視窗 = 環形緩衝長度)
+‣ export_chrome(path)：Chrome trace-event JSON (chrome://tracing / Perfetto 開啟)
+‣ setup_logging()：取代熱路徑上的 print；get_logger(name) 取得 "hiwin.<name>"
+
+    with tracing.cycle():
+        with tracing.span("yolo.predict"):
+            ...
+"""
+from __future__ import annotations
+
+import os, json, time, logging, threading, contextvars
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+from typing import Dict, Optional
+
+import numpy as np
+
+ENABLED      = True
+RING_SIZE    = 4096     # 保留最近幾個 span
+REPORT_EVERY = 20       # 每幾輪 cycle 印一次統計
+TRACE_OUT    = "trace.json"
+
+_RING: deque = deque(maxlen=RING_SIZE)     # (name, cycle, t0_ns, dur_ns, tid)
+_cycle: contextvars.ContextVar[int] = contextvars.ContextVar("hiwin_cycle", default=0)   # 0 = 背景
+_count = 0                # 已開始的 cycle 數 (新編號來源)
+_lock = threading.Lock()
+_T0 = time.perf_counter_ns()
+_PID = os.getpid()
+
+# ═════════ log ═════════
+
+def setup_logging(level=logging.INFO) -> None:
+    logging.basicConfig(level=level, format="%(asctime)s %(levelname).1s [%(name)s] %(message)s",
+                        datefmt="%H:%M:%S")
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(f"hiwin.{name}")
+
+log = get_logger("trace")
+
+# ═════════ span ═════════
+
+@contextmanager
+def span(name: str):
+    if not ENABLED:
+        yield
+        return
+    t0 = time.perf_counter_ns()
+    try:
+        yield
+    finally:
+        _RING.append((name, _cycle.get(), t0, time.perf_counter_ns() - t0, threading.get_ident()))
+
+def traced(name: str):
+    """裝飾器版 span"""
+    def deco(fn):
+        @wraps(fn)
+        def wrapper(*a, **k):
+            with span(name):
+                return fn(*a, **k)
+        return wrapper
+    return deco
+
+@contextmanager
+def cycle(name: str = "cycle"):
+    """一輪 MOVING：取新編號 (只在目前 context 生效)，結束時記錄總長；每 REPORT_EVERY 輪印統計"""
+    global _count
+    with _lock:
+        _count += 1
+        n = _count
+    tok = _cycle.set(n)
+    try:
+        with span(name):
+            yield n
+    finally:
+        _cycle.reset(tok)
+    if ENABLED and n % REPORT_EVERY == 0:
+        log.info("最近各階段延遲 (ms)：\n%s", report())
+
+# ═════════ 統計 / 匯出 ═════════
+
+def stats(last_cycles: Optional[int] = None) -> Dict[str, dict]:
+    """{span 名稱: {n, p50, p95, p99, max}} (ms)；last_cycles 只看最近幾輪"""
+    rec = list(_RING)
+    if last_cycles is not None:
+        rec = [r for r in rec if r[1] > _count - last_cycles]
+    by: Dict[str, list] = {}
+    for name, _, _, dur, _ in rec:
+        by.setdefault(name, []).append(dur / 1e6)
+    out = {}
+    for name, v in by.items():
+        p50, p95, p99 = np.percentile(v, [50, 95, 99])
+        out[name] = {"n": len(v), "p50": round(float(p50), 2), "p95": round(float(p95), 2),
+                     "p99": round(float(p99), 2), "max": round(max(v), 2)}
+    return out
+
+def report(last_cycles: Optional[int] = None) -> str:
+    rows = [f"{'stage':<20}{'n':>6}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}"]
+    for name, s in sorted(stats(last_cycles).items()):
+        rows.append(f"{name:<20}{s['n']:>6}{s['p50']:>9}{s['p95']:>9}{s['p99']:>9}{s['max']:>9}")
+    return "\n".join(rows)
+
+def export_chrome(path: str = TRACE_OUT) -> str:
+    """環形緩衝 → Chrome trace-event JSON (ph="X" 完整事件，時間單位 µs)"""
+    ev = [{"name": name, "ph": "X", "ts": (t0 - _T0) / 1e3, "dur": dur / 1e3,
+           "pid": _PID, "tid": tid, "args": {"cycle": cyc or "bg"}}
+          for name, cyc, t0, dur, tid in list(_RING)]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": ev, "displayTimeUnit": "ms"}, f)
+    log.info("trace 已匯出 %s (%d spans)", path, len(ev))
+    return path
+
+def clear() -> None:
+    _RING.clear()
+
+
+if __name__ == "__main__":
+    setup_logging()
+    REPORT_EVERY = 50
+    for _ in range(100):
+        with cycle():
+            with span("camera"):  time.sleep(0.002)
+            with span("yolo"):    time.sleep(0.004)
+            with span("solver"):  time.sleep(0.001)
+    t = time.perf_counter()
+    for _ in range(100000):
+        with span("noop"):
+            pass
+    print(f"span 開銷 ≈ {(time.perf_counter() - t) * 10:.2f} µs/次")
+    print(report())
+    export_chrome("/tmp/trace_demo.json")
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+影像封存 (編號索引 + 背景編碼 + 保留策略)
+───────────────────────────────────────────────────
+capture.get_next_filename 每拍一張就 listdir + 解析整個資料夾，檔案越多越慢；
+cv2.imwrite (JPEG 編碼 + 寫檔) 也卡在拍照路徑上。ImageArchive：
+‣ 編號：啟動時掃一次資料夾 / manifest 取最大序號，之後只遞增計數器 (O(1))
+‣ 編碼 + 寫檔：交給 AsyncWriter 背景執行緒 (不丟資料，佇列滿時背壓)；
+  save() 立刻回傳檔名
+‣ 格式：jpg (quality 0~100) / png (壓縮等級 0~9)
+‣ 保留：max_files / max_bytes / max_age_days，超過就從最舊的刪
+‣ manifest.jsonl：一張一行 {"seq","file","t","bytes","det","plan"}，
+  det = [[球號, x_cm, y_cm, conf], ...]；plan = {"angle","cue"} 或候選 list
+  ({"angle","cue","score"}，同 run_shot.plan_shot / plan_shots 的回傳)，也可事後用 annotate() 補上。
+  main.py ARCHIVE=True 時每輪 MOVING 的影格連同偵測與規劃一起存。
+  刪檔與補註記都是追加，作廢行數過多時整檔重寫 (compact)。
+
+    arc = ImageArchive()
+    seq, name = arc.save(frame, det=data, plan=plan_shot(data))
+    arc.annotate(seq, plan={"angle": 12.3, "cue": [0.2, 0.1]})
+"""
+from __future__ import annotations
+
+import os, re, json, time, threading, cv2, numpy as np
+from collections import deque
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from vision.async_writer import AsyncWriter
+
+SAVE_FOLDER  = Path("captured_images")
+PREFIX       = "table"
+FMT          = "jpg"
+JPEG_QUALITY = 90
+PNG_LEVEL    = 3
+MANIFEST     = "manifest.jsonl"
+COMPACT_X    = 2.0      # manifest 行數 > 存活張數 × COMPACT_X 時重寫
+
+
+def _compact_det(det) -> Optional[list]:
+    """偵測 dict / 球列表 → [[球號, x_cm, y_cm, conf], ...]"""
+    if det is None:
+        return None
+    balls = det["balls"] if isinstance(det, dict) else det
+    out = []
+    for b in balls:
+        x, y = (b["x_cm"], b["y_cm"]) if "x_cm" in b else (b["cx_cm"], b["cy_cm"])
+        out.append([b["type"], x, y, b.get("conf")])
+    return out
+
+
+def _compact_plan(plan):
+    """plan_shot 的 (angle, cue_xy) / plan_shots 的 [(angle, cue_xy, score), ...] → JSON 欄位"""
+    if plan is None or isinstance(plan, dict):
+        return plan
+    if isinstance(plan, tuple):
+        angle, cue = plan
+        return {"angle": round(float(angle), 3), "cue": [round(float(v), 4) for v in cue]}
+    return [{"angle": round(float(a), 3), "cue": [round(float(v), 4) for v in cue], "score": round(float(sc), 4)}
+            for a, cue, sc in plan]
+
+
+def read_manifest(path) -> Dict[int, dict]:
+    """manifest.jsonl → {seq: 合併後的紀錄}；已刪除的不列"""
+    recs: Dict[int, dict] = {}
+    path = Path(path)
+    if not path.exists():
+        return recs
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                r = json.loads(line)
+            except json.JSONDecodeError:
+                continue                      # 最後一行寫到一半 (當機) 就略過
+            seq = r.pop("seq")
+            if r.get("deleted"):
+                recs.pop(seq, None)
+            else:
+                recs.setdefault(seq, {}).update(r)
+    return {s: r for s, r in recs.items() if "file" in r}     # 刪檔後才到的註記不算
+
+
+class ImageArchive:
+    def __init__(self, folder=SAVE_FOLDER, *, prefix: str = PREFIX, fmt: str = FMT,
+                 quality: int = JPEG_QUALITY, png_level: int = PNG_LEVEL,
+                 max_files: Optional[int] = None, max_bytes: Optional[int] = None,
+                 max_age_days: Optional[float] = None, queue_size: int = 8):
+        if fmt not in ("jpg", "png"):
+            raise ValueError(f"不支援的格式 {fmt!r}")
+        self.folder = Path(folder)
+        self.folder.mkdir(parents=True, exist_ok=True)
+        self.prefix, self.fmt = prefix, fmt
+        self.params = ([cv2.IMWRITE_JPEG_QUALITY, int(quality)] if fmt == "jpg"
+                       else [cv2.IMWRITE_PNG_COMPRESSION, int(png_level)])
+        self.max_files, self.max_bytes = max_files, max_bytes
+        self.max_age = None if max_age_days is None else max_age_days * 86400
+        self.manifest = self.folder / MANIFEST
+
+        # 以下只在 writer 執行緒內修改
+        recs = read_manifest(self.manifest)
+        self._live = deque(sorted((s, r["file"], r.get("bytes", 0), r.get("t", 0.0))
+                                  for s, r in recs.items() if (self.folder / r["file"]).exists()))
+        self._bytes = sum(e[2] for e in self._live)
+        self._lines = 0
+        if self.manifest.exists():
+            with open(self.manifest, "r", encoding="utf-8") as f:
+                self._lines = sum(1 for _ in f)
+
+        self._lock = threading.Lock()
+        self._seq = max([s for s, *_ in self._live] + [self._scan_max()], default=0)
+        self._writer = AsyncWriter(maxsize=queue_size, drop_oldest=False, name="image-archive")
+
+    def _scan_max(self) -> int:
+        """啟動時掃一次資料夾 (相容 manifest 之前的舊檔)"""
+        pat = re.compile(rf"^{re.escape(self.prefix)}(\d+)\.(jpg|png)$")
+        nums = [int(m.group(1)) for f in os.listdir(self.folder) if (m := pat.match(f))]
+        return max(nums, default=0)
+
+    # ── 對外 ──────────────────────────────────────
+    def next_name(self) -> Tuple[int, str]:
+        with self._lock:
+            self._seq += 1
+            return self._seq, f"{self.prefix}{self._seq}.{self.fmt}"
+
+    def save(self, frame: np.ndarray, det=None, plan=None) -> Tuple[int, str]:
+        """排入背景編碼 → 立刻回傳 (seq, 路徑)；frame 交出後不要再修改
+
+        det = 偵測 dict / 球列表，plan = plan_shot / plan_shots 的回傳 (或已整理好的 dict)
+        """
+        seq, name = self.next_name()
+        self._writer.submit(self._write, seq, name, frame, _compact_det(det), _compact_plan(plan))
+        return seq, str(self.folder / name)
+
+    def annotate(self, seq: int, **fields) -> None:
+        """事後補上規劃結果等欄位 (與 save 同一佇列，順序保證在影像之後)"""
+        if "plan" in fields:
+            fields["plan"] = _compact_plan(fields["plan"])
+        self._writer.submit(self._append, {"seq": seq, **fields})
+
+    def flush(self) -> None:
+        self._writer.flush()
+
+    def close(self) -> None:
+        self._writer.close()
+
+    # ── writer 執行緒 ─────────────────────────────
+    def _write(self, seq: int, name: str, frame: np.ndarray, det, plan) -> None:
+        ok, buf = cv2.imencode("." + self.fmt, frame, self.params)
+        if not ok:
+            raise RuntimeError(f"影像編碼失敗 {name}")
+        with open(self.folder / name, "wb") as f:
+            f.write(buf.tobytes())
+        t = round(time.time(), 3)
+        rec = {"seq": seq, "file": name, "t": t, "bytes": int(buf.size)}
+        if det is not None:  rec["det"] = det
+        if plan is not None: rec["plan"] = plan
+        self._append(rec)
+        self._live.append((seq, name, int(buf.size), t))
+        self._bytes += int(buf.size)
+        self._retain()
+
+    def _append(self, rec: dict) -> None:
+        with open(self.manifest, "a", encoding="utf-8") as f:
+            f.write(json.dumps(rec, ensure_ascii=False, separators=(",", ":")) + "\n")
+        self._lines += 1
+
+    def _retain(self) -> None:
+        now = time.time()
+        while self._live and ((self.max_files is not None and len(self._live) > self.max_files)
+                              or (self.max_bytes is not None and self._bytes > self.max_bytes)
+                              or (self.max_age is not None and now - self._live[0][3] > self.max_age)):
+            seq, name, size, _ = self._live.popleft()
+            self._bytes -= size
+            try:
+                os.remove(self.folder / name)
+            except FileNotFoundError:
+                pass
+            self._append({"seq": seq, "deleted": True})
+        if self._lines > max(16, COMPACT_X * len(self._live)):
+            self._compact()
+
+    def _compact(self) -> None:
+        """只留存活紀錄，整檔重寫 (先寫暫存檔再 rename)"""
+        recs = read_manifest(self.manifest)
+        tmp = self.manifest.with_name(MANIFEST + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            for seq in sorted(recs):
+                f.write(json.dumps({"seq": seq, **recs[seq]}, ensure_ascii=False, separators=(",", ":")) + "\n")
+        os.replace(tmp, self.manifest)
+        self._lines = len(recs)
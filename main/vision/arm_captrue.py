@@ -1,17 +1,13 @@
 
-from ..vision.capture import get_next_filename, capture
-from ..communicate.tcp_communicate import connect
-import os
-
-save_folder = "captured_images"
-os.makedirs(save_folder, exist_ok=True)  # 確保資料夾存在
-get_next_filename(save_folder)
+from vision.capture import capture
+from communicate.tcp_communicate import connect
+from configs.setting import HOST, PORT
 
 
 def arm_capture():
     cap_command = '100'
     while cap_command != "103":
-        output = connect(cap_command)
+        output = connect(HOST, PORT, cap_command)   # 同一條長連線，姿態之間不重連
         if output is None:  # 連線失敗則退出
             break
         else:
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+背景寫檔佇列
+───────────────────────────────────────────────────
+把 JSON 快照等存檔工作移出關鍵路徑：呼叫端只 put 一筆工作就返回，
+由單一背景執行緒依序寫入。佇列有上限 (記憶體有界)：
+‣ drop_oldest=True  → 滿了丟掉最舊的未寫工作 (快照只需要最新的)
+‣ drop_oldest=False → 滿了就等 (背壓，影像封存等不能丟的資料)
+"""
+from __future__ import annotations
+
+import os, json, time, queue, atexit, threading
+from pathlib import Path
+from typing import Callable
+
+
+def write_json_atomic(path, data) -> None:
+    """先寫暫存檔再 os.replace，讀的人不會看到寫一半的檔案"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+class AsyncWriter:
+    def __init__(self, maxsize: int = 8, drop_oldest: bool = True, name: str = "async-writer"):
+        self._q: queue.Queue = queue.Queue(maxsize)
+        self.drop_oldest = drop_oldest
+        self.dropped = 0
+        self._closed = False
+        self._t = threading.Thread(target=self._run, name=name, daemon=True)
+        self._t.start()
+        atexit.register(self.close)
+
+    def submit(self, fn: Callable, *args) -> None:
+        """排入一筆工作 fn(*args)；交出的參數之後不要再修改"""
+        if self._closed:
+            raise RuntimeError("AsyncWriter 已關閉")
+        if not self.drop_oldest:
+            self._q.put((fn, args))
+            return
+        while True:
+            try:
+                self._q.put_nowait((fn, args))
+                return
+            except queue.Full:
+                try:
+                    self._q.get_nowait(); self._q.task_done()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def write_json(self, path, data) -> None:
+        self.submit(write_json_atomic, path, data)
+
+    def _run(self) -> None:
+        while True:
+            item = self._q.get()
+            try:
+                if item is None:
+                    return
+                fn, args = item
+                fn(*args)
+            except Exception as e:
+                print(f"[Writer] 寫入失敗：{e}")
+            finally:
+                self._q.task_done()
+
+    def flush(self) -> None:
+        """等所有已排入的工作寫完"""
+        self._q.join()
+
+    def close(self, timeout: float = 5.0) -> None:
+        """停止收件，等已排入的工作寫完 (最多約 timeout 秒)；佇列一直滿著就放棄等待"""
+        if self._closed:
+            return
+        self._closed = True
+        t_end = time.monotonic() + timeout
+        try:
+            self._q.put(None, timeout=timeout)      # drop_oldest=False 且佇列滿時不能無限等
+        except queue.Full:
+            print(f"[Writer] {self._t.name} 關閉逾時，仍有 {self._q.qsize()} 筆未寫")
+            return
+        self._t.join(max(0.0, t_end - time.monotonic()))
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+離線批次重跑偵測 (影像資料夾 / 影片)
+───────────────────────────────────────────────────
+把存檔的 captured_images/*.jpg 或錄影檔，丟進與 capture_balls 相同的
+偵測 + 座標轉換流程，每幀輸出一行 JSONL (含計時)。模型或 corner.json 更新後
+可一次重算上千張。
+
+‣ 多進程：每個 worker 只載入一次模型 / H / 內參。
+‣ 批次推論：YOLO 每次送 --batch 張。
+‣ 輸出順序與輸入順序一致。
+‣ 背壓：同時在途 (已送出未寫檔) 的批次最多 --inflight 個，影片解碼不會跑在 worker 前面把 RAM 吃光。
+‣ 兩種 backend 都用 --corner 的 H (hough 不讀自己模組的 CORNER_JSON)，換校正檔重跑才會生效。
+
+用法 (於專案根目錄)：
+    PYTHONPATH=main python -m vision.batch_replay main/captured_images -o replay.jsonl
+    PYTHONPATH=main python -m vision.batch_replay run.mp4 --backend hough --workers 8
+"""
+from __future__ import annotations
+
+import os, json, time, logging, argparse, threading, cv2, numpy as np
+from multiprocessing import Pool
+from pathlib import Path
+from typing import Iterator, List, Tuple, Union
+
+import tracing
+
+IMG_EXT = {".jpg", ".jpeg", ".png", ".bmp"}
+INFLIGHT_PER_WORKER = 2      # 預設在途批次數 = workers × 此值
+
+# worker 內的全域狀態 (_init 設定)
+_W: dict = {}
+log = tracing.get_logger("replay")
+
+# ═════════ 輸入來源 ═════════
+
+def iter_chunks(src: Path, batch: int) -> Iterator[List[Tuple[str, Union[str, np.ndarray]]]]:
+    """資料夾 → [(名稱, 路徑)]*batch (worker 自己讀檔)；影片 → [(名稱, 影格)]*batch"""
+    if src.is_dir():
+        files = sorted(p for p in src.iterdir() if p.suffix.lower() in IMG_EXT)
+        for i in range(0, len(files), batch):
+            yield [(p.name, str(p)) for p in files[i:i+batch]]
+        return
+    cap = cv2.VideoCapture(str(src))
+    if not cap.isOpened():
+        raise RuntimeError(f"無法開啟 {src}")
+    idx, chunk = 0, []
+    while True:
+        ok, frm = cap.read()
+        if not ok: break
+        chunk.append((f"{src.name}#{idx}", frm)); idx += 1
+        if len(chunk) == batch:
+            yield chunk; chunk = []
+    cap.release()
+    if chunk: yield chunk
+
+def _bounded(it, sem: threading.Semaphore, stop: threading.Event):
+    """每送出一批先取一個名額 (主迴圈寫完結果才歸還)；stop 後不再產生"""
+    for x in it:
+        while not sem.acquire(timeout=0.1):
+            if stop.is_set(): return
+        yield x
+
+# ═════════ Worker ═════════
+
+def _init(backend: str, corner_json: str, intrinsics: str | None, level: int = logging.INFO) -> None:
+    tracing.setup_logging(level)          # spawn 啟動的 worker 沒有繼承 logging 設定
+    _W["backend"] = backend
+    _W["K"] = _W["D"] = None
+    _W["maps"] = {}
+    if backend == "yolo":
+        from vision import yoloball
+        _W["yolo"] = yoloball
+        _W["H"] = yoloball._load_homography(corner_json)
+        yoloball._get_model()
+        if intrinsics:
+            _W["K"], _W["D"] = yoloball._load_intrinsics(intrinsics)
+    else:
+        from vision import houghball, coords
+        _W["hough"] = houghball
+        _W["H"] = coords.load_homography(corner_json)
+        if intrinsics:
+            from vision.yoloball import _load_intrinsics
+            _W["K"], _W["D"] = _load_intrinsics(intrinsics)
+
+def _undistort(img: np.ndarray) -> np.ndarray:
+    """同 yoloball._undistort，但 remap 表依解析度快取"""
+    K, D = _W["K"], _W["D"]
+    if K is None: return img
+    h, w = img.shape[:2]
+    maps = _W["maps"].get((w, h))
+    if maps is None:
+        newK, _ = cv2.getOptimalNewCameraMatrix(K, D, (w, h), 0)
+        maps = _W["maps"][(w, h)] = cv2.initUndistortRectifyMap(K, D, None, newK, (w, h), cv2.CV_16SC2)
+    return cv2.remap(img, maps[0], maps[1], cv2.INTER_LINEAR)
+
+def _work(chunk) -> List[dict]:
+    names, imgs, t_read = [], [], []
+    for name, item in chunk:
+        t = time.perf_counter()
+        img = cv2.imread(item) if isinstance(item, str) else item
+        if img is None:
+            log.warning("讀取失敗 %s", name); continue
+        names.append(name); imgs.append(_undistort(img))
+        t_read.append((time.perf_counter() - t) * 1e3)
+    if not imgs:                 # 整批都讀取失敗
+        return []
+
+    t1 = time.perf_counter()
+    if _W["backend"] == "yolo":
+        datas = [d for d, _ in _W["yolo"]._detect_batch(imgs, _W["H"])]
+        t_det = [(time.perf_counter() - t1) * 1e3 / max(len(imgs), 1)] * len(imgs)  # 批次平均
+    else:
+        datas, t_det = [], []
+        for img in imgs:
+            t = time.perf_counter()
+            datas.append(_W["hough"].detect_balls(img, H=_W["H"])[0])
+            t_det.append((time.perf_counter() - t) * 1e3)
+
+    return [{"frame": n, "pid": os.getpid(), "batch": len(imgs),
+             "t_read_ms": round(tr, 2), "t_detect_ms": round(td, 2),
+             "balls": d["balls"]}
+            for n, tr, td, d in zip(names, t_read, t_det, datas)]
+
+# ═════════ 主流程 ═════════
+
+def replay(src: str, out: str, *, backend: str = "yolo", workers: int = 1, batch: int = 8,
+           corner_json: str = "main/vision/corner.json", intrinsics: str | None = None,
+           inflight: int | None = None) -> int:
+    """回傳處理幀數；inflight = 同時在途批次上限 (預設 workers × INFLIGHT_PER_WORKER)"""
+    src_p = Path(src)
+    n = 0
+    sem = threading.Semaphore(inflight or workers * INFLIGHT_PER_WORKER)
+    stop = threading.Event()
+    t0 = time.perf_counter()
+    with open(out, "w", encoding="utf-8") as fp, \
+         Pool(workers, initializer=_init,
+              initargs=(backend, corner_json, intrinsics, log.getEffectiveLevel())) as pool:
+        try:
+            for recs in pool.imap(_work, _bounded(iter_chunks(src_p, batch), sem, stop)):
+                sem.release()
+                for r in recs:
+                    fp.write(json.dumps(r, ensure_ascii=False, separators=(",", ":")) + "\n")
+                n += len(recs)
+                if recs:
+                    log.info("%d 幀 (至 %s)", n, recs[-1]["frame"])
+        finally:
+            stop.set()
+    dt = time.perf_counter() - t0
+    log.info("完成 %d 幀 / %.1fs (%.1f fps) → %s", n, dt, n / max(dt, 1e-9), out)
+    return n
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser("離線批次重跑偵測")
+    ap.add_argument("src", help="影像資料夾或影片檔")
+    ap.add_argument("-o", "--out", default="replay.jsonl")
+    ap.add_argument("--backend", choices=["yolo", "hough"], default="yolo")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                    help="進程數 (YOLO 用 GPU 時建議 1~2)")
+    ap.add_argument("--batch", type=int, default=8, help="每批影像數")
+    ap.add_argument("--inflight", type=int, default=None,
+                    help=f"同時在途批次上限 (預設 workers×{INFLIGHT_PER_WORKER})")
+    ap.add_argument("--corner", default="main/vision/corner.json")
+    ap.add_argument("--intrinsics", default=None)
+    args = ap.parse_args()
+    tracing.setup_logging()
+    replay(args.src, args.out, backend=args.backend, workers=args.workers,
+           batch=args.batch, corner_json=args.corner, intrinsics=args.intrinsics,
+           inflight=args.inflight)
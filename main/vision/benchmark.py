@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+偵測器 準確度 + 延遲 基準測試
+───────────────────────────────────────────────────
+影像與標註 JSON 依檔名配對 (table7.jpg ↔ table7.json，captures_json 格式，
+球座標 x_cm/y_cm 或 cx_cm/cy_cm + type)，對每個 backend 報告：
+‣ 定位誤差 (cm)：mean / median / p95
+‣ 球號正確率、漏抓 (missed)、多抓 (phantom)
+‣ 各階段延遲 (ms)：p50 / p95
+
+--save 存成 baseline；--compare 與 baseline 比較，退步則 exit 1。
+
+用法 (於專案根目錄)：
+    PYTHONPATH=main python -m vision.benchmark main/captured_images gt_json --save bench_baseline.json
+    PYTHONPATH=main python -m vision.benchmark main/captured_images gt_json --compare bench_baseline.json
+"""
+from __future__ import annotations
+
+import sys, json, time, argparse, cv2, numpy as np
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+MATCH_R_CM = 3.0     # 偵測與標註距離 ≤ 此值才算同一顆
+# 退步門檻
+TOL_ERR_CM = 0.2     # 平均誤差增加
+TOL_ACC    = 0.02    # 正確率下降
+TOL_LAT    = 0.20    # p50 延遲增加比例
+
+# ═════════ Backends：(img, timings) → balls ═════════
+
+_STATE: dict = {}
+
+def _table():
+    """(H, geom)：yolo / cascade 共用，只載入一次"""
+    from vision import yoloball
+    if "H" not in _STATE:
+        _STATE["H"] = yoloball._load_homography(yoloball.CORNER_JSON)
+        _STATE["geom"] = yoloball._table_geom(_STATE["H"])
+    return _STATE["H"], _STATE["geom"]
+
+def _run_yolo(img: np.ndarray, timings: dict) -> List[dict]:
+    from vision import yoloball
+    H, geom = _table()
+    t0 = time.perf_counter()
+    r = yoloball._get_model().predict([img], imgsz=640, conf=yoloball.CONF_THRES, verbose=False)[0]
+    t1 = time.perf_counter()
+    data, _ = yoloball._convert(img, r, H, geom)
+    t2 = time.perf_counter()
+    timings["predict"] = (t1 - t0) * 1e3
+    timings["post"]    = (t2 - t1) * 1e3
+    return data["balls"]
+
+def _run_hough(img: np.ndarray, timings: dict) -> List[dict]:
+    from vision import houghball
+    return houghball.detect_balls(img, timings=timings)[0]["balls"]
+
+def _run_cascade(img: np.ndarray, timings: dict) -> List[dict]:
+    from vision import cascade
+    H, geom = _table()
+    return cascade.detect(img, H, geom, timings=timings)["balls"]
+
+BACKENDS: Dict[str, Callable[[np.ndarray, dict], List[dict]]] = {
+    "yolo":    _run_yolo,
+    "hough":   _run_hough,
+    "cascade": _run_cascade,
+}
+
+# ═════════ 評分 ═════════
+
+def ball_xy(b: dict) -> Tuple[float, float]:
+    """兩種 JSON 欄位 (x_cm / cx_cm) 都接受"""
+    return (b["x_cm"], b["y_cm"]) if "x_cm" in b else (b["cx_cm"], b["cy_cm"])
+
+def match(det: List[dict], gt: List[dict]):
+    """貪婪最近配對 (≤MATCH_R_CM) → [(det_i, gt_i, 距離cm)], 漏抓數, 多抓數"""
+    if not det or not gt:
+        return [], len(gt), len(det)
+    P = np.array([ball_xy(b) for b in det]); G = np.array([ball_xy(b) for b in gt])
+    D = np.linalg.norm(P[:, None] - G[None], axis=-1)
+    pairs, ud, ug = [], set(), set()
+    for idx in np.argsort(D, axis=None):
+        i, j = divmod(int(idx), len(gt))
+        if D[i, j] > MATCH_R_CM: break
+        if i in ud or j in ug: continue
+        pairs.append((i, j, float(D[i, j]))); ud.add(i); ug.add(j)
+    return pairs, len(gt) - len(pairs), len(det) - len(pairs)
+
+def _pct(a, q):
+    return round(float(np.percentile(a, q)), 3) if len(a) else None
+
+def evaluate(backend: str, samples: List[Tuple[str, np.ndarray, List[dict]]]) -> dict:
+    run = BACKENDS[backend]
+    run(samples[0][1], {})                         # 暖機 (載模型 / LUT)
+    errs, correct, missed, phantom, n_gt = [], 0, 0, 0, 0
+    lat: Dict[str, List[float]] = {}
+    for name, img, gt in samples:
+        t = {}
+        t0 = time.perf_counter()
+        det = run(img, t)
+        t["total"] = (time.perf_counter() - t0) * 1e3
+        for k, v in t.items():
+            lat.setdefault(k, []).append(v)
+        pairs, m, p = match(det, gt)
+        missed += m; phantom += p; n_gt += len(gt)
+        for i, j, d in pairs:
+            errs.append(d)
+            correct += str(det[i]["type"]) == str(gt[j]["type"])
+    return {
+        "frames":  len(samples),
+        "gt":      n_gt,
+        "matched": len(errs),
+        "missed":  missed,
+        "phantom": phantom,
+        "err_cm":  {"mean": round(float(np.mean(errs)), 3) if errs else None,
+                    "median": _pct(errs, 50), "p95": _pct(errs, 95)},
+        "cls_acc": round(correct / len(errs), 4) if errs else None,
+        "latency_ms": {k: {"p50": _pct(v, 50), "p95": _pct(v, 95)} for k, v in lat.items()},
+    }
+
+def compare(cur: dict, base: dict) -> List[str]:
+    """回傳退步項目說明 (空 list = 沒退步)"""
+    bad = []
+    for be, c in cur.items():
+        b = base.get(be)
+        if b is None: continue
+        if c["err_cm"]["mean"] is not None and b["err_cm"]["mean"] is not None \
+           and c["err_cm"]["mean"] > b["err_cm"]["mean"] + TOL_ERR_CM:
+            bad.append(f"{be}: 平均誤差 {b['err_cm']['mean']} → {c['err_cm']['mean']} cm")
+        if c["cls_acc"] is not None and b["cls_acc"] is not None \
+           and c["cls_acc"] < b["cls_acc"] - TOL_ACC:
+            bad.append(f"{be}: 正確率 {b['cls_acc']} → {c['cls_acc']}")
+        for k in ("missed", "phantom"):
+            if c[k] > b[k]:
+                bad.append(f"{be}: {k} {b[k]} → {c[k]}")
+        bt, ct = b["latency_ms"].get("total", {}), c["latency_ms"].get("total", {})
+        if bt.get("p50") and ct.get("p50") and ct["p50"] > bt["p50"] * (1 + TOL_LAT):
+            bad.append(f"{be}: 延遲 p50 {bt['p50']} → {ct['p50']} ms")
+    return bad
+
+# ═════════ 資料 ═════════
+
+def load_samples(img_dir: Path, gt_dir: Path, intrinsics: str | None = None):
+    K = D = None
+    if intrinsics:
+        from vision.yoloball import _load_intrinsics
+        K, D = _load_intrinsics(intrinsics)
+    out = []
+    for js in sorted(gt_dir.glob("*.json")):
+        img_p = next((p for p in img_dir.glob(js.stem + ".*") if p.suffix.lower() != ".json"), None)
+        if img_p is None: continue
+        img = cv2.imread(str(img_p))
+        if img is None: continue
+        if K is not None:
+            h, w = img.shape[:2]
+            newK, _ = cv2.getOptimalNewCameraMatrix(K, D, (w, h), 0)
+            img = cv2.undistort(img, K, D, None, newK)
+        gt = json.loads(js.read_text(encoding="utf-8"))["balls"]
+        out.append((js.stem, img, gt))
+    return out
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser("偵測器基準測試")
+    ap.add_argument("images", help="影像資料夾")
+    ap.add_argument("gt", help="標註 JSON 資料夾 (檔名與影像相同)")
+    ap.add_argument("--backends", nargs="*", default=list(BACKENDS), choices=list(BACKENDS))
+    ap.add_argument("--intrinsics", default=None)
+    ap.add_argument("--save", help="結果存成 baseline JSON")
+    ap.add_argument("--compare", help="與 baseline JSON 比較")
+    args = ap.parse_args()
+
+    samples = load_samples(Path(args.images), Path(args.gt), args.intrinsics)
+    if not samples:
+        sys.exit("找不到成對的影像 / 標註")
+
+    res = {be: evaluate(be, samples) for be in args.backends}
+    print(json.dumps(res, ensure_ascii=False, indent=2))
+
+    if args.save:
+        Path(args.save).write_text(json.dumps(res, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"[Saved] {args.save}")
+    if args.compare:
+        base = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        bad = compare(res, base)
+        for b in bad:
+            print("[Regression]", b)
+        sys.exit(1 if bad else 0)
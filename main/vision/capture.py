@@ -1,11 +1,21 @@
 import cv2
 import os
 
+from vision.archive import ImageArchive
+
 # 設定儲存影像的資料夾
 save_folder = "captured_images"
 os.makedirs(save_folder, exist_ok=True)  # 確保資料夾存在
 
-# 找出下一個可用的檔名
+_ARCHIVE = None   # ImageArchive：序號索引 + 背景編碼寫檔，第一次拍照才建立
+
+def archive():
+    global _ARCHIVE
+    if _ARCHIVE is None:
+        _ARCHIVE = ImageArchive(save_folder)
+    return _ARCHIVE
+
+# 找出下一個可用的檔名 (舊介面；每次都掃整個資料夾，新程式請用 archive().next_name())
 def get_next_filename(folder):
     existing_files = [f for f in os.listdir(folder) if f.startswith("table") and f.endswith(".jpg")]
     
@@ -40,14 +50,13 @@ def capture():
         camera.release()
         return None
 
-    img_filename = get_next_filename(save_folder)
-    img_path = os.path.join(save_folder, img_filename)
-    cv2.imwrite(img_path, frame)
+    # 編碼 + 寫檔在背景執行緒；需要檔案立即落地時呼叫 archive().flush()
+    _, img_path = archive().save(frame)
 
     camera.release()
     cv2.destroyAllWindows()
 
-    print(f"影像已儲存至 {img_path}")
+    print(f"影像排入儲存 {img_path}")
     return img_path  # 回傳影像路徑
 
 
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+串接式偵測 (cascade)：Hough / 查表判色 先跑，YOLO 只看沒把握的球
+───────────────────────────────────────────────────
+houghball (找圓 + HSV) 便宜但遇到反光、相近顏色會判錯；yoloball 準但每幀整張推論。
+cascade.detect() 兩者串接：
+‣ 第一關：houghball._hough 找圓 → 袋口排除 (yoloball 的 H 袋口) → color_lut 查表判色
+‣ 第二關：顏色一致比例 < CASCADE_CONF 或判不出顏色的球，以球心裁切方塊，
+  整批一次送 YOLO (imgsz=CROP_IMGSZ)。裁切邊長依整張推論的縮放比例換算，
+  球在模型眼中的大小與整張推論相同。
+  裁切內有框 → 改用 YOLO 的球號與框中心；沒框且第一關也判不出 → 視為假圓丟掉。
+‣ 球心 px → cm 一律用 yoloball 的 H，與 YOLO 路徑同一套座標。
+
+桌面簡單時幾乎不跑 YOLO；每顆球多一個 src 欄位 ("lut" / "yolo")。
+conf 是偵測信心 (查表球固定 1.0，YOLO 球用 YOLO 的 conf)，color_conf 是判色信心
+(查表票數比例 / YOLO 類別信心)；同 houghball，run_shot._layout 以 conf 過濾，票數比例不能放 conf。
+Hough 沒找到的球第二關也救不回來 (YOLO 只看裁切)。
+
+    data = cascade.detect(img, H)
+"""
+from __future__ import annotations
+
+import time, cv2, numpy as np
+from typing import List, Optional
+
+from vision import houghball, yoloball
+
+CASCADE_CONF = 0.6     # 查表顏色一致比例低於此值 → 交給 YOLO
+CROP_IMGSZ   = 96      # 每塊裁切送 YOLO 的輸入尺寸 (32 的倍數)
+FULL_IMGSZ   = 640     # yoloball 整張推論的 imgsz；裁切比例與其一致
+
+
+def _crops(img: np.ndarray, centers: np.ndarray, side: int) -> List[np.ndarray]:
+    """以各球心為中心切 side×side 方塊 (超出影像補黑)"""
+    h = side // 2
+    pad = cv2.copyMakeBorder(img, h, h, h, h, cv2.BORDER_CONSTANT)
+    return [pad[y:y + side, x:x + side] for x, y in centers.tolist()]
+
+
+def detect(img: np.ndarray, H: np.ndarray, geom=None, timings: Optional[dict] = None) -> dict:
+    """單張 (已去畸變) 影像 → {"timestamp","balls"}；balls 格式同 yoloball (x_cm/y_cm)
+
+    timings 給 dict 時填入各階段耗時 (ms)：hough / classify / yolo
+    """
+    t0 = time.perf_counter()
+    pockets, _ = yoloball._table_geom(H) if geom is None else geom
+    c = houghball._hough(img, H)
+    if len(c):
+        d2 = ((c[:, None, :2] - pockets[None]) ** 2).sum(-1)
+        c = c[~(d2 <= yoloball.POCKET_R_PX ** 2).any(axis=1)]
+    t1 = time.perf_counter()
+
+    labels = houghball._classify_batch(img, c) if len(c) else []
+    src = ["lut"] * len(c)
+    conf = [1.0] * len(c)                                          # 偵測信心：Hough 沒有分數
+    ctr = c[:, :2].astype(np.float64)
+    t2 = time.perf_counter()
+
+    amb = [i for i, (b, cf) in enumerate(labels) if b is None or cf < CASCADE_CONF]
+    if amb:
+        side = int(round(CROP_IMGSZ * max(img.shape[:2]) / FULL_IMGSZ)) | 1
+        rs = yoloball._get_model().predict(_crops(img, c[amb, :2], side), imgsz=CROP_IMGSZ,
+                                           conf=yoloball.CONF_THRES, verbose=False)
+        for i, r in zip(amb, rs):
+            xyxy = r.boxes.xyxy.cpu().numpy()
+            off = (xyxy[:, :2] + xyxy[:, 2:]) / 2 - side // 2      # 框中心相對球心
+            d = np.linalg.norm(off, axis=1)
+            if not len(d) or d.min() > c[i, 2]:                   # 球心附近沒有框 → 維持第一關結果
+                continue
+            j = int(d.argmin())
+            cls = int(r.boxes.cls.cpu().numpy()[j]); cf = float(r.boxes.conf.cpu().numpy()[j])
+            labels[i] = (yoloball.CLASS_NAMES[cls], round(cf, 3))
+            conf[i] = round(cf, 3)
+            src[i] = "yolo"
+            ctr[i] += off[j]
+    t3 = time.perf_counter()
+
+    idx = np.array([i for i, (b, _) in enumerate(labels) if b is not None], int)
+    cm = (cv2.perspectiveTransform(ctr[idx].reshape(-1, 1, 2), H).reshape(-1, 2)
+          if len(idx) else np.empty((0, 2)))
+    balls = [{"type": labels[i][0], "conf": conf[i], "color_conf": labels[i][1],
+              "x_cm": round(float(x), 2), "y_cm": round(float(y), 2), "src": src[i]}
+             for i, (x, y) in zip(idx.tolist(), cm)]
+
+    if timings is not None:
+        timings["hough"]    = (t1 - t0) * 1e3
+        timings["classify"] = (t2 - t1) * 1e3
+        timings["yolo"]     = (t3 - t2) * 1e3
+    return {"timestamp": time.strftime("%Y%m%d_%H%M%S"), "balls": balls}
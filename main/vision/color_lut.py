@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+HSV → 顏色類別 查表 (LUT)
+───────────────────────────────────────────────────
+‣ 由 COLOR_RANGES 預先把量化後的 HSV 空間 (H/2, S/8, V/8 → 90×32×32) 全部判好色，
+  規則同 houghball._classify_stats (先黑、再依序比對 COLOR_RANGES)，不再逐顆球做 Python 比較。
+‣ 判號同 houghball.classify_ball：每顆球 ROI 的平均 HSV 查表得顏色，白色像素比例分
+  母球 / 條紋 / 實心 (同 COLOR_TO_BALL)。不逐像素投票決定顏色 ── 陰影、球緣的暗像素
+  會被算成黑色，彩球會被投成 8 號。平均值落在量化格邊界半格內時可能與 classify_ball 不同。
+‣ 可用已標註的截圖 (captures_json 的 bbox_px + type) 微調 LUT。
+‣ LUT 存成 .npz (使用者快取目錄，不寫進原始碼樹)，下次直接載入；COLOR_RANGES 改變時自動重建。
+‣ classify() 的信心 = 非白色像素中與判定顏色同類的比例 (母球為白色比例)，
+  只代表「顏色有多一致」，不是偵測信心；houghball 放在 color_conf 欄位，conf 維持偵測信心。
+
+用法 (於專案根目錄)：
+    PYTHONPATH=main python -m vision.color_lut                       # 重建並存檔
+    PYTHONPATH=main python -m vision.color_lut --refine img.jpg cap.json [img2.jpg cap2.json ...]
+"""
+from __future__ import annotations
+
+import os, json, hashlib, numpy as np
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+CACHE_DIR = Path(os.environ.get("HIWIN_CACHE",
+                               Path(os.environ.get("XDG_CACHE_HOME", Path.home()/".cache"))/"hiwin_pool"))
+LUT_PATH  = CACHE_DIR/"color_lut.npz"
+H_Q, S_Q, V_Q = 2, 8, 8                     # 量化步長
+NH, NS, NV    = 180//H_Q, 256//S_Q, 256//V_Q
+CLASSES   = ["none","white","yellow","blue","red","purple","orange","green","maroon","black"]
+NC        = len(CLASSES)
+NONE, WHITE, BLACK = CLASSES.index("none"), CLASSES.index("white"), CLASSES.index("black")
+LUT_VERSION = 2        # 查表語意改變時遞增 (舊快取自動重建)
+
+# ═════════ 建表 ═════════
+
+def _key(color_ranges: Dict) -> str:
+    return hashlib.md5(repr((LUT_VERSION, sorted(color_ranges.items()))).encode()).hexdigest()
+
+def build_lut(color_ranges: Dict) -> np.ndarray:
+    """每個量化格取中心值，依序套用 黑 → COLOR_RANGES (先符合者優先)
+
+    查的是整顆球的平均 HSV，白色 (母球 / 條紋) 由白色像素比例另外判斷，表裡沒有白色。
+    """
+    h,s,v = np.meshgrid(np.arange(NH)*H_Q+H_Q/2, np.arange(NS)*S_Q+S_Q/2,
+                        np.arange(NV)*V_Q+V_Q/2, indexing="ij")
+    lut = np.zeros(h.shape, np.uint8)
+    todo = np.ones(h.shape, bool)
+    m = (v<70)&(s<60); lut[m]=BLACK; todo&=~m
+    for name,(lo,hi) in color_ranges.items():
+        base = "red" if name.startswith("red") else name
+        if lo[0]<=hi[0]: hue_ok = (lo[0]<=h)&(h<=hi[0])
+        else:            hue_ok = (h>=lo[0])|(h<=hi[0])
+        m = todo&hue_ok&(lo[1]<=s)&(s<=hi[1])&(lo[2]<=v)&(v<=hi[2])
+        lut[m]=CLASSES.index(base); todo&=~m
+    return lut.ravel()
+
+def load_lut(color_ranges: Dict, path: Path = LUT_PATH) -> np.ndarray:
+    """有存檔且 COLOR_RANGES 沒變 → 直接載入；否則重建並存檔"""
+    key = _key(color_ranges)
+    if path.exists():
+        with np.load(path) as z:
+            if str(z["key"]) == key:
+                return z["lut"]
+    lut = build_lut(color_ranges)
+    try:
+        save_lut(lut, color_ranges, path)
+    except OSError:              # 快取目錄不可寫 → 每次重建 (~數十 ms)，不影響偵測
+        pass
+    return lut
+
+def save_lut(lut: np.ndarray, color_ranges: Dict, path: Path = LUT_PATH) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    np.savez(path, lut=lut, key=_key(color_ranges))
+
+# ═════════ 查表判號 ═════════
+
+def lut_index(hsv: np.ndarray) -> np.ndarray:
+    """(...,3) HSV (uint8 或平均值) → (...) LUT 索引"""
+    hsv = hsv.astype(np.intp, copy=False)
+    return ((hsv[...,0]//H_Q).clip(0,NH-1)*NS + (hsv[...,1]//S_Q).clip(0,NS-1))*NV + (hsv[...,2]//V_Q).clip(0,NV-1)
+
+def is_white(hsv: np.ndarray) -> np.ndarray:
+    """白色像素 (同 classify_ball 的 white_ratio 條件)"""
+    return (hsv[...,2]>200)&(hsv[...,1]<25)
+
+def classify(lut: np.ndarray, hsv: np.ndarray, mask: np.ndarray,
+             color_to_ball: Dict) -> List[Tuple[Optional[str], float]]:
+    """(N,S,S,3) HSV + (N,S,S) 遮罩 → [(球號|None, 信心), ...]
+
+    遮罩內平均 HSV 與白色比例一次算完；平均 HSV 查表得顏色，
+    非白色像素逐一查表 + bincount 只用來算信心。
+    """
+    n = len(hsv)
+    cnt = mask.sum(axis=(1,2))
+    mean = (hsv*mask[...,None]).sum(axis=(1,2), dtype=np.float64)/np.maximum(cnt,1)[:,None]
+    white_px = is_white(hsv)&mask
+    white = white_px.sum(axis=(1,2))/np.maximum(cnt,1)
+    cls = lut[lut_index(hsv)]
+    keep = mask&~white_px
+    ball = np.broadcast_to(np.arange(n)[:,None,None], mask.shape)
+    counts = np.bincount(ball[keep]*NC + cls[keep], minlength=n*NC).reshape(n,NC)
+    return classify_stats(lut[lut_index(mean)], white, cnt, counts, color_to_ball)
+
+def classify_stats(mean_cls: np.ndarray, white: np.ndarray, cnt: np.ndarray, counts: np.ndarray,
+                   color_to_ball: Dict) -> List[Tuple[Optional[str], float]]:
+    """每顆球 (平均 HSV 的類別, 白色比例, 像素數, 非白色像素類別直方圖) → [(球號|None, 信心), ...]"""
+    out = []
+    for c,w,k,row in zip(mean_cls.tolist(), white.tolist(), cnt.tolist(), counts):
+        if k == 0:               out.append((None, 0.0)); continue
+        if w > 0.7:              out.append(("0", round(w,3))); continue
+        if c in (NONE, WHITE):   out.append((None, 0.0)); continue
+        cf = round(float(row[c])/max(int(row.sum()),1), 3)
+        base = CLASSES[c]
+        if base == "black":      out.append(("8", cf)); continue
+        solid,stripe = color_to_ball[base]
+        out.append((stripe if w>0.25 else solid, cf))
+    return out
+
+# ═════════ 以標註資料微調 ═════════
+
+def _ball_class(ball_id: str, color_to_ball: Dict) -> Optional[int]:
+    if ball_id == "0": return WHITE
+    for base,ids in color_to_ball.items():
+        if ball_id in ids: return CLASSES.index(base)
+    return None
+
+def refine_lut(lut: np.ndarray, samples: Iterable[Tuple[np.ndarray, str]],
+               color_to_ball: Dict, min_votes: int = 1) -> np.ndarray:
+    """samples：[(hsv_pixels (M,3), 球號), ...]
+
+    判號查的是整顆球的平均 HSV，所以每顆標註球以平均 HSV 所在格子投票給該球的顏色
+    (母球靠白色比例判斷，不投票)，票數 ≥ min_votes 的格子改成得票最多的類別。
+    """
+    votes = np.zeros((lut.size, NC), np.int64)
+    for px, ball_id in samples:
+        c = _ball_class(ball_id, color_to_ball)
+        if c is None or c == WHITE or len(px) == 0: continue
+        votes[lut_index(px.mean(axis=0)), c] += 1
+    out = lut.copy()
+    hit = votes.sum(axis=1) >= min_votes
+    out[hit] = votes[hit].argmax(axis=1)
+    return out
+
+def samples_from_capture(img: np.ndarray, data: dict):
+    """影像 + 偵測 JSON (需有 bbox_px) → [(球內切圓 HSV 像素, 球號), ...]"""
+    import cv2
+    hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+    out = []
+    for b in data.get("balls", []):
+        if "bbox_px" not in b: continue
+        x1,y1,x2,y2 = b["bbox_px"]
+        patch = hsv[max(0,y1):y2, max(0,x1):x2]
+        if patch.size == 0: continue
+        h,w = patch.shape[:2]
+        yy,xx = np.mgrid[:h,:w]
+        r = min(h,w)/2
+        m = (xx-(w-1)/2)**2 + (yy-(h-1)/2)**2 <= r*r
+        out.append((patch[m], str(b["type"])))
+    return out
+
+# ═════════ CLI ═════════
+if __name__ == "__main__":
+    import argparse, cv2
+    from vision.houghball import COLOR_RANGES, COLOR_TO_BALL
+
+    ap = argparse.ArgumentParser("建立 / 微調 HSV→球號 LUT")
+    ap.add_argument("--refine", nargs="*", default=[], help="影像與 JSON 成對列出")
+    ap.add_argument("-o", "--out", default=str(LUT_PATH))
+    args = ap.parse_args()
+
+    lut = build_lut(COLOR_RANGES)
+    pairs = list(zip(args.refine[::2], args.refine[1::2]))
+    for img_p, js_p in pairs:
+        img = cv2.imread(img_p)
+        if img is None:
+            print(f"[LUT] 找不到影像 {img_p}"); continue
+        data = json.loads(Path(js_p).read_text(encoding="utf-8"))
+        lut = refine_lut(lut, samples_from_capture(img, data), COLOR_TO_BALL)
+    save_lut(lut, COLOR_RANGES, Path(args.out))
+    print(f"[Saved] {args.out} ({len(pairs)} 組標註)")
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+座標鏈：相機像素 ↔ 桌面 (cm) ↔ 手臂 (mm)
+───────────────────────────────────────────────────
+一次載入 內參 (intrinsics.yaml)、桌面 homography (corner.json)、手眼校正
+(handeye_result.yaml)，組成快取好的轉換矩陣，批次點 / 整批擊球計畫一次換算。
+
+座標系 (frame)：
+    raw   ─ 原始相機像素 (有畸變)
+    px    ─ 去畸變後像素 (與 yoloball._undistort 相同 newK，corner.json 在此座標)
+    table ─ 桌面 cm，原點 = 左上角
+    robot ─ 手臂 mm
+
+px → table → robot 都是 3×3 射影矩陣，組合後只剩一次矩陣乘法；
+raw ↔ px 是非線性的，用 cv2.undistortPoints / projectPoints 批次處理。
+
+table → robot：
+‣ configs.setting.CAPTURE_POSE 有值 → 以手眼校正 (R_TC, t_TC) 與拍照時的 TCP 位姿，
+  把桌面四角的像素射線投到桌面高度 TABLE_Z_MM，求出 cm→mm 矩陣。
+‣ 否則用 configs.setting.TABLE_TO_ROBOT (預設即原本 main.py 的 x·10、375−y·10)。
+
+    chain = CoordChain.from_files()
+    robot = chain.transform(pts_px, "px", "robot")
+    angle, x, y = chain.plan_to_robot(angle_deg, cue_xy_m)
+"""
+from __future__ import annotations
+
+import json, math, yaml, cv2, numpy as np
+from typing import Optional, Sequence, Tuple
+
+from configs.setting import TABLE_TO_ROBOT, CAPTURE_POSE, TABLE_Z_MM
+
+TABLE_W_CM     = 73.5
+TABLE_H_CM     = 37.5
+CORNER_JSON    = "main/vision/corner.json"
+INTRINSICS     = "main/vision/intrinsics.yaml"
+HANDEYE        = "main/vision/handeye_result.yaml"
+IMG_SIZE       = (1920, 1080)
+FRAMES         = ("raw", "px", "table", "robot")
+
+# ═════════ 載入 ═════════
+
+def table_corners_cm(w_cm: float = TABLE_W_CM, h_cm: float = TABLE_H_CM) -> np.ndarray:
+    return np.array([[0, 0], [w_cm, 0], [w_cm, h_cm], [0, h_cm]], dtype=np.float32)
+
+def load_homography(corner_json: str = CORNER_JSON, w_cm: float = TABLE_W_CM,
+                    h_cm: float = TABLE_H_CM) -> np.ndarray:
+    """corner.json → H (pixel → cm)"""
+    with open(corner_json, 'r', encoding='utf-8') as f:
+        c = json.load(f)
+    src = np.array([[c[k]['x'], c[k]['y']] for k in
+                    ('top_left', 'top_right', 'bottom_right', 'bottom_left')], dtype=np.float32)
+    return cv2.getPerspectiveTransform(src, table_corners_cm(w_cm, h_cm))
+
+def load_intrinsics(p: str = INTRINSICS) -> Tuple[np.ndarray, np.ndarray]:
+    with open(p, 'r') as f:
+        d = yaml.safe_load(f)
+    M = d.get('camera_matrix', d.get('K'))
+    if isinstance(M, dict): M = M['data']
+    K = np.array(M, dtype=np.float32).reshape(3, 3)
+    D_ = d.get('distortion_coefficients', d.get('dist_coeff', d.get('D')))
+    if isinstance(D_, dict): D_ = D_['data']
+    return K, np.array(D_, dtype=np.float32)
+
+def load_handeye(p: str = HANDEYE) -> Tuple[np.ndarray, np.ndarray]:
+    """→ (R_TC 3×3, t_TC 3)：相機在 TCP 座標下的位姿 (mm)"""
+    with open(p, 'r') as f:
+        d = yaml.safe_load(f)
+    return np.array(d['R_TC'], float).reshape(3, 3), np.array(d['t_TC'], float).reshape(3)
+
+def pose_to_matrix(pose: Sequence[float]) -> np.ndarray:
+    """HIWIN 位姿 (x,y,z mm, A,B,C deg) → 4×4；R = Rz(C)·Ry(B)·Rx(A)"""
+    x, y, z, a, b, c = pose
+    a, b, c = np.radians([a, b, c])
+    Rx = np.array([[1, 0, 0], [0, math.cos(a), -math.sin(a)], [0, math.sin(a), math.cos(a)]])
+    Ry = np.array([[math.cos(b), 0, math.sin(b)], [0, 1, 0], [-math.sin(b), 0, math.cos(b)]])
+    Rz = np.array([[math.cos(c), -math.sin(c), 0], [math.sin(c), math.cos(c), 0], [0, 0, 1]])
+    T = np.eye(4)
+    T[:3, :3] = Rz @ Ry @ Rx
+    T[:3, 3] = (x, y, z)
+    return T
+
+def _apply(M: np.ndarray, pts: np.ndarray) -> np.ndarray:
+    """(N,2) 點套 3×3 射影矩陣"""
+    v = pts @ M[:, :2].T + M[:, 2]
+    return v[:, :2] / v[:, 2:]
+
+# ═════════ 座標鏈 ═════════
+
+class CoordChain:
+    def __init__(self, H: np.ndarray, A: np.ndarray, K: Optional[np.ndarray] = None,
+                 D: Optional[np.ndarray] = None, img_size: Tuple[int, int] = IMG_SIZE):
+        self.H = np.asarray(H, np.float64)          # px → table
+        self.A = np.asarray(A, np.float64)          # table → robot
+        self.K, self.D = K, D
+        self.newK = None
+        if K is not None:
+            self.newK, _ = cv2.getOptimalNewCameraMatrix(K, D, tuple(img_size), 0)
+        self._build()
+
+    def _build(self) -> None:
+        """所有線性段 (px/table/robot 兩兩) 預先組好"""
+        M = {("px", "table"): self.H, ("table", "robot"): self.A}
+        M[("px", "robot")] = self.A @ self.H
+        for (a, b), m in list(M.items()):
+            M[(b, a)] = np.linalg.inv(m)
+        for f in ("px", "table", "robot"):
+            M[(f, f)] = np.eye(3)
+        self._M = M
+
+    @classmethod
+    def from_files(cls, intrinsics: Optional[str] = INTRINSICS, corner_json: str = CORNER_JSON,
+                   handeye: Optional[str] = HANDEYE, capture_pose=CAPTURE_POSE,
+                   table_z: float = TABLE_Z_MM, img_size: Tuple[int, int] = IMG_SIZE) -> "CoordChain":
+        K = D = None
+        if intrinsics:
+            K, D = load_intrinsics(intrinsics)
+        H = load_homography(corner_json)
+        A = np.array(TABLE_TO_ROBOT, np.float64)
+        chain = cls(H, A, K, D, img_size)
+        if handeye and capture_pose is not None:
+            R_TC, t_TC = load_handeye(handeye)
+            chain.A = chain.table_to_robot_from_handeye(R_TC, t_TC, capture_pose, table_z)
+            chain._build()
+        return chain
+
+    def table_to_robot_from_handeye(self, R_TC: np.ndarray, t_TC: np.ndarray,
+                                    capture_pose: Sequence[float], table_z: float) -> np.ndarray:
+        """桌面四角 → 像素射線 → 與桌面 (z = table_z) 交點 → 求 cm→mm 矩陣"""
+        T_TC = np.eye(4); T_TC[:3, :3] = R_TC; T_TC[:3, 3] = t_TC
+        T_BC = pose_to_matrix(capture_pose) @ T_TC
+        cm = table_corners_cm()
+        px = _apply(np.linalg.inv(self.H), cm.astype(np.float64))
+        Kp = self.newK if self.newK is not None else self.K
+        if Kp is None:
+            raise RuntimeError("手眼換算需要相機內參")
+        rays = np.c_[px, np.ones(len(px))] @ np.linalg.inv(Kp).T      # 相機座標方向
+        d = rays @ T_BC[:3, :3].T
+        o = T_BC[:3, 3]
+        s = (table_z - o[2]) / d[:, 2]
+        xy = (o + s[:, None] * d)[:, :2]
+        return cv2.getPerspectiveTransform(cm, xy.astype(np.float32)).astype(np.float64)
+
+    # ── 批次轉換 ──────────────────────────────────
+    def transform(self, pts, src: str, dst: str) -> np.ndarray:
+        """(N,2) 點從 src 座標系換到 dst；一次呼叫處理整批"""
+        if src not in FRAMES or dst not in FRAMES:
+            raise ValueError(f"未知座標系 {src!r} / {dst!r}")
+        pts = np.asarray(pts, np.float64).reshape(-1, 2)
+        if len(pts) == 0:
+            return pts
+        if src == "raw":
+            pts, src = self._undistort_pts(pts), "px"
+        if dst == "raw":
+            return self._distort_pts(_apply(self._M[(src, "px")], pts))
+        return _apply(self._M[(src, dst)], pts)
+
+    def _undistort_pts(self, pts: np.ndarray) -> np.ndarray:
+        if self.K is None: return pts
+        return cv2.undistortPoints(pts.reshape(-1, 1, 2), self.K, self.D, P=self.newK).reshape(-1, 2)
+
+    def _distort_pts(self, pts: np.ndarray) -> np.ndarray:
+        if self.K is None: return pts
+        n = np.c_[pts, np.ones(len(pts))] @ np.linalg.inv(self.newK).T   # 正規化座標
+        out, _ = cv2.projectPoints(n.reshape(-1, 1, 3), np.zeros(3), np.zeros(3), self.K, self.D)
+        return out.reshape(-1, 2)
+
+    # ── 擊球計畫 ──────────────────────────────────
+    def plans_to_robot(self, angles_deg, cues_m, tool_offset_mm: float = 0.0) -> np.ndarray:
+        """N 組 (angle_deg, cue_xy m) → (N,3) [arm_angle, x_mm, y_mm]
+
+        角度由桌面方向向量經 table→robot 轉換後重新求得 (預設矩陣即 arm_angle = −angle)；
+        tool_offset_mm 沿擊球方向補償 (原 main.py 的 j6_diff)。
+        """
+        ang = np.radians(np.asarray(angles_deg, np.float64).reshape(-1))
+        cue = np.asarray(cues_m, np.float64).reshape(-1, 2) * 100.0           # m → cm
+        tip = cue + np.c_[np.cos(ang), np.sin(ang)]                            # 沿方向 1 cm
+        M = self._M[("table", "robot")]
+        p0, p1 = _apply(M, cue), _apply(M, tip)
+        v = p1 - p0
+        arm_ang = np.degrees(np.arctan2(v[:, 1], v[:, 0]))
+        if tool_offset_mm:
+            p0 = p0 + tool_offset_mm * np.c_[np.cos(np.radians(arm_ang)), np.sin(np.radians(arm_ang))]
+        return np.c_[arm_ang, p0]
+
+    def plan_to_robot(self, angle_deg: float, cue_xy_m, tool_offset_mm: float = 0.0
+                      ) -> Tuple[float, float, float]:
+        a, x, y = self.plans_to_robot([angle_deg], [cue_xy_m], tool_offset_mm)[0]
+        return round(float(a), 2), round(float(x), 2), round(float(y), 2)
+
+
+# ═════════ 自我檢查：往返誤差 ═════════
+if __name__ == "__main__":
+    chain = CoordChain.from_files()
+    rng = np.random.default_rng(0)
+    raw = rng.uniform([200, 150], [1700, 950], (1000, 2))
+    err = {}
+    for a, b in (("raw", "px"), ("px", "table"), ("table", "robot"), ("raw", "robot")):
+        back = chain.transform(chain.transform(raw if a == "raw" else chain.transform(raw, "raw", a), a, b), b, a)
+        ref = raw if a == "raw" else chain.transform(raw, "raw", a)
+        err[f"{a}↔{b}"] = float(np.abs(back - ref).max())
+    for k, v in err.items():
+        print(f"{k:14s} 最大往返誤差 {v:.2e}")
+    a, x, y = chain.plan_to_robot(30.0, (0.2, 0.1))
+    print(f"plan (30°, 0.2 m, 0.1 m) → {a:.2f}°, {x:.2f} mm, {y:.2f} mm")
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+線上桌角追蹤 + 相機位移偵測
+───────────────────────────────────────────────────
+corner.json 校正後就被當成固定值，相機被碰到就默默算錯所有座標。
+CornerTracker 在即時流程裡 (每 N 幀或每次拍照) 於縮小影像上找桌面綠色外框，
+與目前 H 推得的外框 (baseline) 比較：
+‣ 外框與 corner.json 四角的相對位置因校正方式而異 (tools/test_corner.py、
+  auto_corners.py --inner-cm 存的是內框)，所以不假設兩者重合：
+  第一次量到的外框經目前 H 換成桌面 cm 記下 (outline)，之後 baseline = outline 經 H⁻¹ 投回像素。
+  外框是桌子的實體邊界，cm 座標不隨相機移動，更新 H 後不會以量測值重新定錨而累積誤差
+‣ 定錨前先與 corner.json 四角比對四邊長比例，避免把遮擋 / 誤偵測的外框當基準
+‣ 單幀異常 (手臂遮住一角、minAreaRect 退化) 先剔除：輪廓填不滿四邊形、四邊長比例與
+  baseline 差太多，或與前一次超標的量測不一致，都不算數
+‣ 平均位移 > DRIFT_PX 且連續 CONFIRM 次 → 視為相機位移
+‣ 以 baseline→目前 四角 (取這幾次的中位數) 求 G (新 px → 舊 px)，H_new = H · G，並記錄事件
+‣ persist=True 時同步寫回 corner.json
+
+啟動時相機就已經歪掉 (corner.json 過期) 量不出來，定錨的是當下的外框。
+corner.json 被手動更新 (tools/test_corner.py) 時會自動重新載入並重新定錨。
+"""
+from __future__ import annotations
+
+import os, json, time, cv2, numpy as np
+from typing import List, Optional
+
+import tracing
+
+TRACK_EVERY = 15        # 每 N 幀檢查一次
+TRACK_SCALE = 0.25      # 偵測用縮小倍率
+DRIFT_PX    = 4.0       # 四角平均位移門檻 (全解析度 px)
+CONFIRM     = 2         # 連續超過門檻次數
+TABLE_W_CM  = 73.5
+TABLE_H_CM  = 37.5
+SHAPE_TOL   = 0.05      # 四邊長佔周長比例與 baseline 相差超過此值 → 視為遮擋 / 誤偵測
+FILL_TOL    = 0.01      # 綠色輪廓與四邊形不重疊的面積比例超過此值 → 四角不可信 (被遮住一角)
+HSV_LO, HSV_HI = (35, 40, 40), (85, 255, 255)    # 桌布綠 (同 tools/auto_corners.py)
+
+log = tracing.get_logger("corner")
+
+
+def detect_outer(frame: np.ndarray, scale: float = TRACK_SCALE) -> Optional[np.ndarray]:
+    """縮小影像找最大綠色區域 → 四角 (tl,tr,br,bl) 全解析度 px；找不到回 None
+
+    四邊形與輪廓面積對不上 (手臂遮住一角時 minAreaRect / approxPolyDP 會補出假角) 也回 None。
+    """
+    small = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    mask = cv2.inRange(cv2.cvtColor(small, cv2.COLOR_BGR2HSV), HSV_LO, HSV_HI)
+    k = max(3, int(25 * scale) | 1)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (k, k)))
+    cnts, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not cnts:
+        return None
+    cnt = max(cnts, key=cv2.contourArea)
+    if cv2.contourArea(cnt) < 0.1 * mask.size:
+        return None
+    poly = cv2.approxPolyDP(cnt, 0.02 * cv2.arcLength(cnt, True), True)
+    pts = poly.reshape(-1, 2).astype(np.float32) if len(poly) == 4 else cv2.boxPoints(cv2.minAreaRect(cnt))
+    quad = np.zeros_like(mask); cv2.fillPoly(quad, [np.round(pts).astype(np.int32)], 255)
+    blob = np.zeros_like(mask); cv2.drawContours(blob, [cnt], -1, 255, cv2.FILLED)
+    if cv2.countNonZero(quad ^ blob) > FILL_TOL * cv2.countNonZero(blob):
+        return None
+    s, d = pts.sum(axis=1), np.diff(pts, axis=1).ravel()
+    return np.array([pts[s.argmin()], pts[d.argmin()], pts[s.argmax()], pts[d.argmax()]], np.float32) / scale
+
+
+def table_corners_cm() -> np.ndarray:
+    """corner.json 四角 (tl,tr,br,bl) 的桌面 cm 座標"""
+    return np.float32([[0, 0], [TABLE_W_CM, 0], [TABLE_W_CM, TABLE_H_CM], [0, TABLE_H_CM]]).reshape(-1, 1, 2)
+
+
+def _side_ratio(pts: np.ndarray) -> np.ndarray:
+    """四邊長 / 周長 (對平移、旋轉、縮放不變；單一角被遮住時會明顯改變)"""
+    s = np.linalg.norm(np.roll(pts, -1, axis=0) - pts, axis=1)
+    return s / s.sum()
+
+
+def save_corners(H: np.ndarray, path: str) -> None:
+    """H (pixel→cm) → corner.json (桌面四角像素)"""
+    tl, tr, br, bl = cv2.perspectiveTransform(table_corners_cm(), np.linalg.inv(H)).reshape(-1, 2).astype(float)
+    data = {
+        "top_left":     {"x": tl[0], "y": tl[1]},
+        "top_right":    {"x": tr[0], "y": tr[1]},
+        "bottom_right": {"x": br[0], "y": br[1]},
+        "bottom_left":  {"x": bl[0], "y": bl[1]},
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+
+
+class CornerTracker:
+    """持有目前的 H (pixel→cm)；update() 餵影格，相機位移時自動更新 H"""
+
+    def __init__(self, H: np.ndarray, *, corner_json: Optional[str] = None, loader=None, persist: bool = False,
+                 every: int = TRACK_EVERY, scale: float = TRACK_SCALE,
+                 drift_px: float = DRIFT_PX, confirm: int = CONFIRM, shape_tol: float = SHAPE_TOL):
+        self.H = np.asarray(H, np.float64)
+        self.corner_json = corner_json
+        self.loader = loader              # corner.json → H；給了才會自動重新載入
+        self.persist = persist
+        self.every, self.scale = every, scale
+        self.drift_px, self.confirm = drift_px, confirm
+        self.outline: Optional[np.ndarray] = None    # 綠色外框四角 (cm)；第一次量到時定錨
+        self.shape_tol = shape_tol
+        self.last_drift = 0.0
+        self.rejected = 0                 # 被當成單幀異常丟掉的量測數
+        self.events: List[dict] = []
+        self._n = 0
+        self._pending: List[np.ndarray] = []   # 連續超標的量測
+        self._mtime = self._stat()
+
+    @property
+    def baseline(self) -> Optional[np.ndarray]:
+        """目前 H 下外框四角應在的像素位置；尚未定錨回 None"""
+        if self.outline is None:
+            return None
+        return cv2.perspectiveTransform(self.outline, np.linalg.inv(self.H)).reshape(-1, 2)
+
+    def _anchor(self, pts: np.ndarray) -> bool:
+        """第一次量到的外框 → outline (cm)；四邊長比例與 corner.json 四角對不上就不定錨"""
+        ref = cv2.perspectiveTransform(table_corners_cm(), np.linalg.inv(self.H)).reshape(-1, 2)
+        if np.abs(_side_ratio(pts) / _side_ratio(ref) - 1).max() > self.shape_tol:
+            self.rejected += 1
+            return False
+        self.outline = cv2.perspectiveTransform(pts.reshape(-1, 1, 2).astype(np.float64), self.H).astype(np.float32)
+        log.info("外框定錨 (cm) %s", np.round(self.outline.reshape(-1, 2), 2).tolist())
+        return True
+
+    def _stat(self) -> Optional[float]:
+        try:
+            return os.path.getmtime(self.corner_json) if self.corner_json else None
+        except OSError:
+            return None
+
+    def reload_if_changed(self) -> bool:
+        m = self._stat()
+        if self.loader is None or m is None or m == self._mtime:
+            return False
+        self._mtime = m
+        self.H = np.asarray(self.loader(self.corner_json), np.float64)
+        self._pending = []
+        self.outline = None               # 校正方式可能不同 → 以新 H 重新定錨
+        log.info("%s 已更新，重新載入 H", self.corner_json)
+        return True
+
+    def update(self, frame: np.ndarray, force: bool = False) -> bool:
+        """回傳 True = 這次更新了 H。force=True 忽略 every (每次拍照都檢查)"""
+        self.reload_if_changed()
+        self._n += 1
+        if not force and self._n % self.every:
+            return False
+        pts = detect_outer(frame, self.scale)
+        if pts is None:
+            return False
+        if self.outline is None:
+            self._anchor(pts)
+            return False
+        base = self.baseline
+        if np.abs(_side_ratio(pts) / _side_ratio(base) - 1).max() > self.shape_tol:
+            self.rejected += 1
+            return False
+
+        self.last_drift = float(np.linalg.norm(pts - base, axis=1).mean())
+        if self.last_drift < self.drift_px:
+            self._pending = []
+            return False
+        if self._pending and np.linalg.norm(pts - self._pending[-1], axis=1).mean() >= self.drift_px:
+            self.rejected += 1            # 與上一次超標量測對不上 → 從這一次重新累計
+            self._pending = []
+        self._pending.append(pts)
+        if len(self._pending) < self.confirm:
+            return False
+
+        cur = np.median(self._pending, axis=0).astype(np.float32)
+        G = cv2.getPerspectiveTransform(cur, base.astype(np.float32))      # 新 px → 舊 px
+        self.H = self.H @ G
+        self._pending = []
+        ev = {"time": time.strftime("%Y%m%d_%H%M%S"), "drift_px": round(self.last_drift, 2)}
+        self.events.append(ev)
+        log.warning("偵測到相機位移 %.2f px，已更新 H", ev["drift_px"])
+        if self.persist and self.corner_json:
+            save_corners(self.H, self.corner_json)
+            self._mtime = self._stat()
+            log.info("已寫回 %s", self.corner_json)
+        return True
@@ -3,26 +3,42 @@
 """
 billiard_capture_nocorner.py
 ----------------------------
-相機已與桌面平行且填滿整張桌子，不使用 Homography。
+有 corner.json (或呼叫端給 H) 時以 Homography 換算；沒有時才假設相機與桌面平行、
+畫面即整張桌子，用線性比例。corner.json 被 CornerTracker / 重新校正改寫後下次呼叫即生效。
 capture_balls(countdown=3, show=False)：
     1) 倒數拍照
     2) HoughCircles 找球
-    3) 像素 → cm (線性比例)
+    3) 像素 → cm (有 corner.json 用 H，否則線性比例)
     4) 輸出 CORDS.json
+detect_balls(img)：單張影像偵測 (不開相機)，
+    只在桌面 ROI 內找圓，半徑範圍由桌面 px/cm 推得；
+    每顆球只取小塊 ROI 批次判色，成本跟球數成正比而不是影像大小。
+    判色用 color_lut 預先建好的 HSV 查表 (每顆球的平均 HSV 查表，結果同 classify_ball)，
+    color_conf = 非白色像素中與判定顏色同類的比例；conf 是偵測信心，Hough 沒有分數固定 1.0
+    (run_shot._layout 以 conf ≥ 0.30 過濾，不能拿票數比例當 conf)。
+    給 tracker (vision.tracker.BallTracker) 時，已穩定標記的球跳過判色。
+    有 corner.json (或呼叫端給 H) 時，球心 cm 與袋口都經 H 換算，與 yoloball 一致。
 """
 
 from __future__ import annotations
 import cv2, json, time, numpy as np
 from pathlib import Path
-from typing import Tuple, Optional
+from functools import lru_cache
+from typing import Tuple, Optional, List
+
+from vision import color_lut, coords
+from vision.tracker import BallTracker
 
 # ======== 需自行設定 ========
-TABLE_W_CM   = 73        # 桌面水平長度 (cm)  ← 換成你的
-TABLE_H_CM   = 40        # 桌面垂直長度 (cm) ← 換成你的
+TABLE_W_CM   = coords.TABLE_W_CM   # 桌面尺寸 (cm)：與 H / yoloball 同一組
+TABLE_H_CM   = coords.TABLE_H_CM
 CAM_URL      = 0           # 攝影機 ID / RTSP
 SAVE_DIR     = Path(".")   # CORDS.json 儲存位置
 POCKET_R_PX  = 70          # 口袋半徑 (px) 視畫面解析度調整
 POCKET_OFFSET_PX = 75
+CORNER_JSON  = Path("main/vision/corner.json")   # 有就用來縮小搜尋範圍；沒有則整張
+BALL_R_CM    = 1.25        # 球半徑 (cm)
+R_TOL        = 0.35        # 半徑容許誤差 ±35%
 
 # ---------- 顏色區段 & 球號對應 ----------
 COLOR_RANGES = {
@@ -42,46 +58,204 @@ COLOR_TO_BALL = {
     "maroon":("7","15"), "black":("8",)
 }
 
+_LUT = None       # 第一次用到才載入 (color_lut.npz)
+
 # ---------- 分色判號 ----------
+def _lut() -> np.ndarray:
+    global _LUT
+    if _LUT is None:
+        _LUT = color_lut.load_lut(COLOR_RANGES)
+    return _LUT
+
 def classify_ball(hsv_pixels: np.ndarray) -> Optional[str]:
     if hsv_pixels.size == 0: return None
-    h,s,v = hsv_pixels.mean(axis=0)
+    mean = hsv_pixels.mean(axis=0)[None]
     white_ratio = np.sum((hsv_pixels[:,2]>200)&(hsv_pixels[:,1]<25))/len(hsv_pixels)
-    if white_ratio > 0.7: return "0"
-    if v<70 and s<60: return "8"
+    return _classify_stats(mean, np.array([white_ratio]))[0]
+
+def _classify_stats(mean: np.ndarray, white_ratio: np.ndarray) -> List[Optional[str]]:
+    """(N,3) 平均 HSV + (N,) 白色比例 → N 個球號；規則同舊版逐顆判斷"""
+    h,s,v = mean.T
+    ids = np.full(len(mean), None, dtype=object)
+    todo = np.ones(len(mean), bool)
+    m = white_ratio>0.7;           ids[m]="0"; todo&=~m
+    m = todo&(v<70)&(s<60);        ids[m]="8"; todo&=~m
     for name,(lo,hi) in COLOR_RANGES.items():
         base = "red" if name.startswith("red") else name
-        l,u = np.array(lo),np.array(hi)
-        hue_ok = l[0]<=h<=u[0] if l[0]<=u[0] else (h>=l[0] or h<=u[0])
-        if not hue_ok or not(l[1]<=s<=u[1] and l[2]<=v<=u[2]): continue
-        if base=="black": return "8"
-        solid,stripe = COLOR_TO_BALL[base]
-        return stripe if white_ratio>0.25 else solid
-    return None
+        if lo[0]<=hi[0]: hue_ok = (lo[0]<=h)&(h<=hi[0])
+        else:            hue_ok = (h>=lo[0])|(h<=hi[0])
+        m = todo&hue_ok&(lo[1]<=s)&(s<=hi[1])&(lo[2]<=v)&(v<=hi[2])
+        if not m.any(): continue
+        if base=="black": ids[m]="8"
+        else:
+            solid,stripe = COLOR_TO_BALL[base]
+            ids[m] = np.where(white_ratio[m]>0.25, stripe, solid)
+        todo&=~m
+    return ids.tolist()
+
+# ---------- 桌面校正 ----------
+def _calib(shape: Tuple[int,int], H: Optional[np.ndarray]):
+    """影像尺寸 + H (pixel → cm，可為 None) → (ROI x0,y0,x1,y1, r_min, r_max)"""
+    return _calib_at(tuple(shape), None if H is None else np.asarray(H,np.float64).tobytes())
+
+@lru_cache(maxsize=8)
+def _calib_at(shape: Tuple[int,int], H_bytes: Optional[bytes]):
+    """有 H 時 ROI = 桌面四角 (H⁻¹ 反推) 外接框，px/cm 由四角推算；
+    否則整張影像即桌面 (與 capture_balls 的線性比例一致)。H 以位元組當快取鍵，H 一變就重算。
+    """
+    H_img, W_img = shape
+    if H_bytes is not None:
+        H = np.frombuffer(H_bytes).reshape(3,3)
+        pts = cv2.perspectiveTransform(coords.table_corners_cm().reshape(-1,1,2),
+                                       np.linalg.inv(H)).reshape(-1,2)
+        tl,tr,br,bl = pts
+        px_per_cm = (np.linalg.norm(tr-tl)/TABLE_W_CM + np.linalg.norm(bl-tl)/TABLE_H_CM)/2
+        x0,y0 = pts.min(axis=0); x1,y1 = pts.max(axis=0)
+    else:
+        px_per_cm = (W_img/TABLE_W_CM + H_img/TABLE_H_CM)/2
+        x0,y0,x1,y1 = 0,0,W_img,H_img
+    r_min = int(BALL_R_CM*px_per_cm*(1-R_TOL))
+    r_max = int(np.ceil(BALL_R_CM*px_per_cm*(1+R_TOL)))
+    # 外擴 r_max，邊庫旁的球也找得到
+    x0,y0 = max(0,int(x0)-r_max), max(0,int(y0)-r_max)
+    x1,y1 = min(W_img,int(x1)+r_max), min(H_img,int(y1)+r_max)
+    return x0,y0,x1,y1,r_min,r_max
+
+def _table_H() -> Optional[np.ndarray]:
+    """corner.json → H (pixel → cm，桌面尺寸同 coords / yoloball)；沒有檔案回 None
+
+    以檔案 mtime 當快取鍵：CornerTracker 寫回或重新校正後自動重新載入。
+    """
+    try:
+        mtime = CORNER_JSON.stat().st_mtime_ns
+    except OSError:
+        return None
+    return _load_H(mtime)
+
+@lru_cache(maxsize=1)
+def _load_H(mtime: int) -> np.ndarray:
+    return coords.load_homography(str(CORNER_JSON))
+
+def _pockets_H(H: np.ndarray) -> np.ndarray:
+    """H⁻¹ 反推 4 角 + 上下邊中點 → 口袋中心 (像素)；同 yoloball._table_geom"""
+    tl,tr,br,bl = cv2.perspectiveTransform(coords.table_corners_cm().reshape(-1,1,2),
+                                           np.linalg.inv(H)).reshape(-1,2)
+    return np.array([tl,tr,br,bl,(tl+tr)/2,(bl+br)/2], dtype=np.float64)
+
+def _pockets(W_img:int, H_img:int) -> np.ndarray:
+    """口袋中心位置 (以像素為單位)；沒有 H 時的線性版本"""
+    return np.array([
+        (POCKET_OFFSET_PX, POCKET_OFFSET_PX),                              # 左上
+        (W_img - POCKET_OFFSET_PX, POCKET_OFFSET_PX),                      # 右上
+        (W_img - POCKET_OFFSET_PX, H_img - POCKET_OFFSET_PX),              # 右下
+        (POCKET_OFFSET_PX, H_img - POCKET_OFFSET_PX),                      # 左下
+        (W_img // 2, POCKET_OFFSET_PX // 2),                               # 上側中袋
+        (W_img // 2, H_img - POCKET_OFFSET_PX // 2)                        # 下側中袋
+    ])
+
+def _ball_patches(img: np.ndarray, circles: np.ndarray):
+    """每顆球切 (2R+1)² 小塊 → (N,S,S,3) HSV + (N,S,S) 圓形遮罩，只轉換這些像素"""
+    R = int(circles[:,2].max()); S = 2*R+1
+    pad = cv2.copyMakeBorder(img,R,R,R,R,cv2.BORDER_CONSTANT)
+    dy,dx = np.mgrid[-R:R+1,-R:R+1]
+    ys = circles[:,1,None,None]+R+dy
+    xs = circles[:,0,None,None]+R+dx
+    bgr = pad[ys,xs]                                                # (N,S,S,3)
+    hsv = cv2.cvtColor(bgr.reshape(-1,S,3),cv2.COLOR_BGR2HSV).reshape(bgr.shape)
+    mask = (dx*dx+dy*dy)[None] <= (circles[:,2]**2)[:,None,None]
+    return hsv, mask
+
+def _classify_batch(img: np.ndarray, circles: np.ndarray) -> List[Tuple[Optional[str],float]]:
+    """所有球的 ROI 一次算平均 HSV 查表 → [(球號|None, 顏色一致比例), ...]；判號同 classify_ball"""
+    hsv, mask = _ball_patches(img, circles)
+    return color_lut.classify(_lut(), hsv, mask, COLOR_TO_BALL)
+
+def _hough(img: np.ndarray, H: Optional[np.ndarray] = None) -> np.ndarray:
+    """只在桌面 ROI 內找圓 → (N,3) int (cx,cy,r) 全圖像素；沒有回空陣列
+
+    H (pixel → cm) 決定 ROI 與半徑範圍；None 時整張影像線性比例。
+    """
+    x0,y0,x1,y1,r_min,r_max = _calib(img.shape[:2], H)
+    gray=cv2.medianBlur(cv2.cvtColor(img[y0:y1,x0:x1],cv2.COLOR_BGR2GRAY),5)
+    circles=cv2.HoughCircles(gray,cv2.HOUGH_GRADIENT,1.1,35,
+                             param1=80,param2=25,minRadius=r_min,maxRadius=r_max)
+    if circles is None:
+        return np.empty((0,3),int)
+    c = np.round(circles[0]).astype(int)
+    c[:,0]+=x0; c[:,1]+=y0
+    return c
+
+def detect_balls(img: np.ndarray, show: bool=False, timings: Optional[dict]=None,
+                 tracker: Optional[BallTracker]=None, H: Optional[np.ndarray]=None):
+    """單張影像 → ({"timestamp","balls"}, vis)；vis 只在 show=True 時產生
+
+    H (pixel → cm) 省略時用 corner.json；兩者都沒有才退回整張影像線性比例。
+
+    timings 給 dict 時填入各階段耗時 (ms)：hough / classify
+    tracker 給 BallTracker 時：已穩定標記的球跳過判色，直接沿用 track 標籤；
+    輸出改為追蹤後的穩定狀態 (每顆多 track 欄位)。
+    """
+    t0 = time.perf_counter()
+    H_img, W_img = img.shape[:2]
+    if H is None:
+        H = _table_H()
+    if H is not None:
+        pockets = _pockets_H(np.asarray(H, np.float64))
+        to_cm = lambda p: cv2.perspectiveTransform(
+            p.astype(np.float64).reshape(-1,1,2), np.asarray(H, np.float64)).reshape(-1,2)
+    else:
+        pockets = _pockets(W_img, H_img)
+        to_cm = lambda p: p / [W_img / TABLE_W_CM, H_img / TABLE_H_CM]   # px / cm
+    c = _hough(img, H)
+    t1 = time.perf_counter()
+
+    balls=[]
+    obs=[]            # 給 tracker 的觀測；沿用標籤的球 type=None (不重複投票)
+    vis = img.copy() if show else None
+    if len(c):
+        d2 = ((c[:,None,:2]-pockets[None])**2).sum(-1)
+        c = c[~(d2<=POCKET_R_PX**2).any(axis=1)]
+        cm = to_cm(c[:,:2])
+        ids = tracker.labels_hint(cm) if tracker is not None else [None]*len(c)
+        todo = [i for i,h in enumerate(ids) if h is None]
+        hinted = set(range(len(c))) - set(todo)
+        if todo:
+            for i,res in zip(todo,_classify_batch(img, c[todo])):
+                ids[i] = res
+        if timings is not None:
+            timings["classify"] = (time.perf_counter()-t1)*1e3
+        for i,((cx,cy,r),(ball_id,color_conf)) in enumerate(zip(c.tolist(),ids)):
+            obs.append({"type":None if i in hinted else ball_id,"conf":1.0,"color_conf":color_conf,
+                        "cx_cm":cm[i,0],"cy_cm":cm[i,1]})
+            if ball_id is None: continue
+            if show:
+                cv2.circle(vis,(cx,cy),r,(0,255,255),2)
+                cv2.putText(vis,ball_id,(cx-r,cy-r),
+                            cv2.FONT_HERSHEY_SIMPLEX,0.7,(0,255,255),2)
+            balls.append({
+                "type":ball_id,"conf":1.0,"color_conf":color_conf,
+                "cx_cm":round(float(cm[i,0]),2),"cy_cm":round(float(cm[i,1]),2)
+            })
+
+    if tracker is not None:
+        balls = [{"type":b["type"],"conf":b["conf"],"color_conf":b["label_conf"],
+                  "cx_cm":b["x_cm"],"cy_cm":b["y_cm"],"track":b["track"]} for b in tracker.update(obs)]
+
+    if timings is not None:
+        timings["hough"] = (t1-t0)*1e3
+        timings.setdefault("classify", 0.0)
+
+    # 口袋視覺化
+    if show:
+        for px,py in pockets.tolist():
+            cv2.circle(vis,(int(px),int(py)),POCKET_R_PX,(255,0,255),2)
+    return {"timestamp":time.strftime("%Y%m%d_%H%M%S"),"balls":balls}, vis
 
 # ========= 主功能 =========
 def capture_balls(countdown:int=3, show:bool=False):
     cap=cv2.VideoCapture(CAM_URL)
     if not cap.isOpened(): raise RuntimeError("無法開啟攝影機")
 
-    # 先抓一張畫面，推算解析度與縮放比例
-    ret, frame0 = cap.read()
-    if not ret: raise RuntimeError("讀取影像失敗")
-    H_img, W_img = frame0.shape[:2]
-    scale_x = W_img / TABLE_W_CM      # px / cm
-    scale_y = H_img / TABLE_H_CM
-
-    # 口袋中心位置 (以像素為單位)
-    pockets = [
-    (POCKET_OFFSET_PX, POCKET_OFFSET_PX),                              # 左上
-    (W_img - POCKET_OFFSET_PX, POCKET_OFFSET_PX),                      # 右上
-    (W_img - POCKET_OFFSET_PX, H_img - POCKET_OFFSET_PX),              # 右下
-    (POCKET_OFFSET_PX, H_img - POCKET_OFFSET_PX),                      # 左下
-    (W_img // 2, POCKET_OFFSET_PX // 2),                               # 上側中袋
-    (W_img // 2, H_img - POCKET_OFFSET_PX // 2)                        # 下側中袋
-]
-
-
     # 倒數
     end=time.time()+countdown
     while time.time()<end:
@@ -96,41 +270,14 @@ def capture_balls(countdown:int=3, show:bool=False):
     ok, img = cap.read(); cap.release(); cv2.destroyAllWindows()
     if not ok: raise RuntimeError("拍照失敗")
 
-    # Hough 找球
-    gray=cv2.medianBlur(cv2.cvtColor(img,cv2.COLOR_BGR2GRAY),5)
-    circles=cv2.HoughCircles(gray,cv2.HOUGH_GRADIENT,1.1,35,
-                             param1=80,param2=25,minRadius=20,maxRadius=45)
-
-    hsv=cv2.cvtColor(img,cv2.COLOR_BGR2HSV)
-    balls=[]
-    if circles is not None:
-        for cx,cy,r in np.round(circles[0]).astype(int):
-            if any((cx-px)**2+(cy-py)**2<=POCKET_R_PX**2 for px,py in pockets):
-                continue
-            mask=np.zeros(gray.shape,np.uint8);cv2.circle(mask,(cx,cy),r,255,-1)
-            ball_id=classify_ball(hsv[mask==255])
-            if ball_id is None: continue
-            x_cm = cx / scale_x
-            y_cm = cy / scale_y
-            if show:
-                cv2.circle(img,(cx,cy),r,(0,255,255),2)
-                cv2.putText(img,ball_id,(cx-r,cy-r),
-                            cv2.FONT_HERSHEY_SIMPLEX,0.7,(0,255,255),2)
-            balls.append({
-                "type":ball_id,"conf":1.0,
-                "cx_cm":round(x_cm,2),"cy_cm":round(y_cm,2)
-            })
-
-    # 口袋視覺化
+    out, vis = detect_balls(img, show=show)
+    balls = out["balls"]
     if show:
-        for px,py in pockets:
-            cv2.circle(img,(px,py),POCKET_R_PX,(255,0,255),2)
-        cv2.imshow("Result",img);cv2.waitKey(0);cv2.destroyAllWindows()
+        cv2.imshow("Result",vis);cv2.waitKey(0);cv2.destroyAllWindows()
 
     # 儲存
     SAVE_DIR.mkdir(exist_ok=True)
     json_path = SAVE_DIR/"CORDS.json"
-    out={"timestamp":time.strftime("%Y%m%d_%H%M%S"),"balls":balls}
     with open(json_path,"w",encoding="utf-8") as fp:
         json.dump(out,fp,ensure_ascii=False,indent=2)
     print(f"[Saved] {json_path} ({len(balls)} balls)")
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+動態閘門 (motion gate)
+───────────────────────────────────────────────────
+取代固定倒數：在低解析度灰階影像上、只看桌面 ROI，
+連續 still_sec 秒幀差都低於門檻就觸發拍照；超過 timeout 仍未靜止則回報。
+
+    gate = MotionGate(table_px)        # table_px：桌面四角 (4,2) 像素，None=整張；H 更新後 set_roi()
+    while ...:
+        if gate.feed(frame): break     # True = 已靜止
+"""
+from __future__ import annotations
+
+import time, cv2, numpy as np
+from typing import Optional
+
+GATE_SCALE  = 0.25     # 縮小倍率 (1920→480)
+DIFF_THRES  = 12       # 灰階差 > 此值視為變動像素
+MOVE_FRAC   = 0.002    # ROI 內變動像素比例 > 此值視為場景在動
+STILL_SEC   = 0.4      # 連續靜止多久才觸發
+TIMEOUT_SEC = 6.0      # 最長等待
+
+
+class MotionGate:
+    """餵入連續影格，回報場景是否已靜止 still_sec 秒"""
+
+    def __init__(self, table_px: Optional[np.ndarray] = None, *,
+                 scale: float = GATE_SCALE, still_sec: float = STILL_SEC,
+                 diff_thres: int = DIFF_THRES, move_frac: float = MOVE_FRAC):
+        self.table_px   = None if table_px is None else np.asarray(table_px, np.float32)
+        self.scale      = scale
+        self.still_sec  = still_sec
+        self.diff_thres = diff_thres
+        self.move_frac  = move_frac
+        self._mask = None
+        self.reset()
+
+    def set_roi(self, table_px: Optional[np.ndarray]) -> None:
+        """換桌面 ROI (相機位移、H 更新後)；靜止狀態保留，遮罩下一幀重算"""
+        self.table_px = None if table_px is None else np.asarray(table_px, np.float32)
+        self._mask = None
+
+    def reset(self) -> None:
+        self._prev = None
+        self._still_since = None
+        self.last_frac = 1.0          # 最近一次的變動比例 (回報用)
+
+    @property
+    def still_since(self) -> Optional[float]:
+        """目前這段靜止期的起點 (feed 的時間軸)；場景在動時為 None"""
+        return self._still_since
+
+    def _small(self, frame: np.ndarray) -> np.ndarray:
+        small = cv2.resize(frame, None, fx=self.scale, fy=self.scale,
+                           interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+
+    def _roi_mask(self, shape) -> np.ndarray:
+        if self._mask is None or self._mask.shape != shape:
+            if self.table_px is None:
+                self._mask = np.ones(shape, bool)
+            else:
+                m = np.zeros(shape, np.uint8)
+                cv2.fillConvexPoly(m, np.round(self.table_px*self.scale).astype(np.int32), 1)
+                self._mask = m.astype(bool)
+            self._n_roi = max(int(self._mask.sum()), 1)
+        return self._mask
+
+    def feed(self, frame: np.ndarray, t: Optional[float] = None) -> bool:
+        t = time.monotonic() if t is None else t
+        g = self._small(frame)
+        mask = self._roi_mask(g.shape)
+        prev, self._prev = self._prev, g
+        if prev is None:
+            return False
+
+        moving = (cv2.absdiff(g, prev) > self.diff_thres) & mask
+        self.last_frac = int(moving.sum()) / self._n_roi
+        if self.last_frac > self.move_frac:
+            self._still_since = None
+            return False
+        if self._still_since is None:
+            self._still_since = t
+        return t - self._still_since >= self.still_sec
+
+
+def wait_still(cap: cv2.VideoCapture, gate: MotionGate, *,
+               timeout: float = TIMEOUT_SEC, preview: bool = True, on_frame=None):
+    """讀取 cap 直到靜止 → (frame, 等待秒數)
+
+    逾時回 (None, 等待秒數) 並印出最後變動比例；預覽視窗按 Esc 也回 (None, ...)。
+    on_frame(frame)：每張影格的回呼 (如 Dashboard.publish)，不想開預覽視窗時用。
+    """
+    gate.reset()
+    t0 = time.monotonic()
+    while True:
+        ok, frm = cap.read()
+        now = time.monotonic()
+        if ok and on_frame is not None:
+            on_frame(frm)
+        if ok and gate.feed(frm, now):
+            return frm, now - t0
+        if now - t0 > timeout:
+            print(f"[Gate] {timeout:.1f}s 內場景未靜止 (變動比例 {gate.last_frac:.2%})")
+            return None, now - t0
+        if preview and ok:
+            cv2.putText(frm, f"等待靜止 {gate.last_frac:.2%}", (20, 40),
+                        cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0, 255, 0), 3)
+            cv2.imshow("Preview", frm)
+            if cv2.waitKey(1) & 0xFF == 27:
+                return None, now - t0
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多視角桌面拼接 (手臂多姿態拍攝)
+───────────────────────────────────────────────────
+取代 tools/stinch.py (寫死像素位移 + np.maximum) 與 tools/size.py (每次 SIFT)：
+‣ 每個姿態一個 homography G_i (pixel → 桌面 cm)，只在校正時算一次：
+    - offsets：手臂平移量已知 (cm) → G_i = T(offset_i) · H0
+    - images ：第一次用 SIFT + RANSAC 對齊到 view 0 → G_i = H0 · H_i→0
+‣ 輸出畫布 = 拉正後的桌面 (CANVAS_PX_PER_CM px/cm)，
+  每個 view 預先算好 remap 表 (CV_16SC2) + 羽化權重，存成 .npz 快取。
+‣ 新影格只做 remap + 加權相加，沒有任何特徵匹配。
+‣ detect_views：每個 view 各自偵測，用各自的 G_i 換到桌面座標再合併。
+‣ remap 快取放使用者快取目錄 (同 color_lut：$HIWIN_CACHE 或 ~/.cache/hiwin_pool)，不寫進原始碼樹。
+
+目前是獨立工具 (校正 / 離線拼接)，main.py 的單一拍照姿態流程沒有接上多視角。
+
+用法 (於專案根目錄)：
+    PYTHONPATH=main python -m vision.stitch calib --offsets 0,0 12.7264,0 25.1932,0 --size 1280x960
+    PYTHONPATH=main python -m vision.stitch calib --images t5.jpg t6.jpg t7.jpg
+    PYTHONPATH=main python -m vision.stitch run t5.jpg t6.jpg t7.jpg -o stitched.jpg
+"""
+from __future__ import annotations
+
+import time, argparse, cv2, numpy as np
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+from vision.color_lut import CACHE_DIR
+from vision.coords import load_homography
+
+TABLE_W_CM       = 73.5
+TABLE_H_CM       = 37.5
+CANVAS_PX_PER_CM = 10.0
+CORNER_JSON      = "main/vision/corner.json"        # view 0 的桌角
+CACHE_PATH       = CACHE_DIR / "stitch_cache.npz"
+MERGE_R_CM       = 2.0                              # 跨 view 同一顆球的距離
+
+
+def _h0(corner_json: str = CORNER_JSON) -> np.ndarray:
+    """view 0 的 pixel → cm"""
+    return load_homography(corner_json, TABLE_W_CM, TABLE_H_CM)
+
+
+class StitchCalib:
+    """每個 view 的 G_i + 預先算好的 remap 表 / 權重"""
+
+    def __init__(self, G: Sequence[np.ndarray], img_size: Tuple[int, int],
+                 px_per_cm: float = CANVAS_PX_PER_CM):
+        self.G = [np.asarray(g, np.float64) for g in G]
+        self.img_size = tuple(int(v) for v in img_size)          # (w, h)
+        self.px_per_cm = float(px_per_cm)
+        self.canvas_size = (int(round(TABLE_W_CM * px_per_cm)), int(round(TABLE_H_CM * px_per_cm)))
+        self._build()
+
+    # ── 預算 remap 表 ──────────────────────────────
+    def _build(self) -> None:
+        cw, ch = self.canvas_size
+        w, h = self.img_size
+        S = np.diag([self.px_per_cm, self.px_per_cm, 1.0])
+        gx, gy = np.meshgrid(np.arange(cw, dtype=np.float64), np.arange(ch, dtype=np.float64))
+        grid = np.stack([gx, gy, np.ones_like(gx)], -1)            # canvas px (homog.)
+        self.maps, weights = [], []
+        for G in self.G:
+            inv = np.linalg.inv(S @ G)                             # canvas px → src px
+            src = grid @ inv.T
+            src = (src[..., :2] / src[..., 2:]).astype(np.float32)
+            valid = (src[..., 0] >= 0) & (src[..., 0] <= w - 1) & (src[..., 1] >= 0) & (src[..., 1] <= h - 1)
+            m1, m2 = cv2.convertMaps(src[..., 0], src[..., 1], cv2.CV_16SC2)
+            self.maps.append((m1, m2))
+            # 羽化：離 view 邊界越遠權重越大
+            weights.append(cv2.distanceTransform(valid.astype(np.uint8), cv2.DIST_L2, 3) + 1e-3 * valid)
+        Wt = np.stack(weights)
+        Wt /= np.maximum(Wt.sum(0, keepdims=True), 1e-6)
+        self.weights = [w_[..., None].astype(np.float32) for w_ in Wt]
+
+    # ── 快取 ──────────────────────────────────────
+    def save(self, path: Path = CACHE_PATH) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        np.savez(path, G=np.stack(self.G), img_size=self.img_size, px_per_cm=self.px_per_cm,
+                 m1=np.stack([m[0] for m in self.maps]), m2=np.stack([m[1] for m in self.maps]),
+                 wt=np.stack(self.weights).astype(np.float16))
+        print(f"[Saved] {path}")
+
+    @classmethod
+    def load(cls, path: Path = CACHE_PATH) -> "StitchCalib":
+        """直接載入 remap 表，不重算"""
+        z = np.load(path)
+        self = cls.__new__(cls)
+        self.G = list(z["G"]); self.img_size = tuple(int(v) for v in z["img_size"])
+        self.px_per_cm = float(z["px_per_cm"])
+        self.canvas_size = (int(round(TABLE_W_CM * self.px_per_cm)), int(round(TABLE_H_CM * self.px_per_cm)))
+        self.maps = list(zip(z["m1"], z["m2"]))
+        self.weights = [w.astype(np.float32) for w in z["wt"]]
+        return self
+
+    # ── 校正來源 ──────────────────────────────────
+    @classmethod
+    def from_offsets(cls, offsets_cm: Sequence[Tuple[float, float]], img_size: Tuple[int, int],
+                     H0: Optional[np.ndarray] = None, **kw) -> "StitchCalib":
+        """相機隨手臂平移 (dx,dy) cm：同一像素看到的桌面點也平移 (dx,dy)"""
+        H0 = _h0() if H0 is None else H0
+        G = [np.array([[1, 0, dx], [0, 1, dy], [0, 0, 1]], np.float64) @ H0 for dx, dy in offsets_cm]
+        return cls(G, img_size, **kw)
+
+    @classmethod
+    def from_images(cls, imgs: Sequence[np.ndarray], H0: Optional[np.ndarray] = None,
+                    **kw) -> "StitchCalib":
+        """只在校正時跑一次 SIFT + RANSAC，把每個 view 對齊到 view 0"""
+        H0 = _h0() if H0 is None else H0
+        sift = cv2.SIFT_create(); bf = cv2.BFMatcher()
+        kp0, des0 = sift.detectAndCompute(imgs[0], None)
+        G = [H0]
+        for img in imgs[1:]:
+            kp, des = sift.detectAndCompute(img, None)
+            good = [m for m, n in bf.knnMatch(des, des0, k=2) if m.distance < 0.75 * n.distance]
+            if len(good) < 4:
+                raise RuntimeError(f"匹配點太少 ({len(good)})，無法校正")
+            src = np.float32([kp[m.queryIdx].pt for m in good]).reshape(-1, 1, 2)
+            dst = np.float32([kp0[m.trainIdx].pt for m in good]).reshape(-1, 1, 2)
+            Hi0, _ = cv2.findHomography(src, dst, cv2.RANSAC, 5.0)
+            G.append(H0 @ Hi0)
+        h, w = imgs[0].shape[:2]
+        return cls(G, (w, h), **kw)
+
+    # ── 拼接 ──────────────────────────────────────
+    def stitch(self, frames: Sequence[np.ndarray]) -> np.ndarray:
+        """各 view remap 到桌面畫布，再以羽化權重相加"""
+        acc = np.zeros((self.canvas_size[1], self.canvas_size[0], 3), np.float32)
+        for frm, (m1, m2), wt in zip(frames, self.maps, self.weights):
+            warped = cv2.remap(frm, m1, m2, cv2.INTER_LINEAR, borderMode=cv2.BORDER_CONSTANT)
+            acc += warped * wt
+        return np.clip(acc, 0, 255).astype(np.uint8)
+
+    def canvas_to_cm(self, pts_px: np.ndarray) -> np.ndarray:
+        return np.asarray(pts_px, np.float64) / self.px_per_cm
+
+
+# ═════════ 各 view 偵測 → 桌面座標合併 ═════════
+
+def merge_views(views: List[List[dict]], r_cm: float = MERGE_R_CM) -> List[dict]:
+    """多個 view 的球 (已是桌面 cm) 合併：距離 ≤ r_cm 視為同一顆，
+    位置以 conf 加權平均，球號取 conf 最高者；views 欄位 = 看到它的 view 數"""
+    allb = sorted((b for v in views for b in v), key=lambda b: b["conf"], reverse=True)
+    groups: List[List[dict]] = []
+    centers: List[np.ndarray] = []
+    for b in allb:
+        p = np.array([b["x_cm"], b["y_cm"]])
+        if centers:
+            d = np.linalg.norm(np.array(centers) - p, axis=1)
+            i = int(d.argmin())
+            if d[i] <= r_cm:
+                groups[i].append(b)
+                w = np.array([g["conf"] for g in groups[i]])
+                centers[i] = (np.array([[g["x_cm"], g["y_cm"]] for g in groups[i]]) * w[:, None]).sum(0) / max(w.sum(), 1e-9)
+                continue
+        groups.append([b]); centers.append(p)
+    return [{"type": g[0]["type"], "conf": g[0]["conf"],
+             "x_cm": round(float(c[0]), 2), "y_cm": round(float(c[1]), 2), "views": len(g)}
+            for g, c in zip(groups, centers)]
+
+def detect_views(frames: Sequence[np.ndarray], calib: StitchCalib) -> dict:
+    """YOLO 一次批次推論所有 view，各自用 G_i 轉桌面座標後合併"""
+    from vision import yoloball
+    rs = yoloball._get_model().predict(list(frames), imgsz=640, conf=yoloball.CONF_THRES, verbose=False)
+    views = [yoloball._convert(f, r, G, yoloball._table_geom(G))[0]["balls"]
+             for f, r, G in zip(frames, rs, calib.G)]
+    return {"timestamp": time.strftime("%Y%m%d_%H%M%S"), "balls": merge_views(views)}
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser("多視角桌面拼接")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    c = sub.add_parser("calib", help="建立 remap 快取")
+    c.add_argument("--offsets", nargs="*", help="各姿態平移 dx,dy (cm)")
+    c.add_argument("--size", default="1280x960", help="影像尺寸 WxH (offsets 模式)")
+    c.add_argument("--images", nargs="*", help="各姿態一張影像 (SIFT 一次性校正)")
+    c.add_argument("-o", "--out", default=str(CACHE_PATH))
+    r = sub.add_parser("run", help="用快取拼接")
+    r.add_argument("images", nargs="+")
+    r.add_argument("--cache", default=str(CACHE_PATH))
+    r.add_argument("-o", "--out", default="stitched.jpg")
+    args = ap.parse_args()
+
+    if args.cmd == "calib":
+        if args.images:
+            cal = StitchCalib.from_images([cv2.imread(p) for p in args.images])
+        else:
+            w, h = map(int, args.size.lower().split("x"))
+            offs = [tuple(map(float, o.split(","))) for o in args.offsets or ["0,0"]]
+            cal = StitchCalib.from_offsets(offs, (w, h))
+        cal.save(Path(args.out))
+    else:
+        cal = StitchCalib.load(Path(args.cache))
+        frames = [cv2.imread(p) for p in args.images]
+        t = time.perf_counter()
+        out = cal.stitch(frames)
+        print(f"[Stitch] {len(frames)} views → {out.shape[1]}x{out.shape[0]} ({(time.perf_counter()-t)*1e3:.1f} ms)")
+        cv2.imwrite(args.out, out)
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+球追蹤 (跨幀身分 + 球號穩定)
+───────────────────────────────────────────────────
+每次拍照都從零偵測，YOLO 類別在幀間跳動 (例：同一顆球這幀 '3' 下幀 '5')，
+plan_shot 選到的目標球就跟著變。BallTracker 在桌面 cm 座標上做跨幀關聯：
+‣ 預測：每條 track 等速模型 pos + vel·dt
+‣ 指派：預測位置 ↔ 偵測 的距離矩陣跑 Hungarian (匈牙利演算法，numpy 實作)，
+  超過 GATE_CM 不配；球號與 track 標籤不同加 CLASS_PENALTY_CM
+‣ 每條 track 累積球號直方圖 (以偵測 conf 加權)，標籤 = 最多票，
+  label_conf = 該票佔比；偵測 conf 另以 EMA 平滑
+‣ labels_hint()：已穩定標記的 track 直接給標籤，偵測端可跳過判色 / 分類
+  (每 REVERIFY 次仍完整分類一次)
+
+    trk = BallTracker()
+    state = trk.update(data["balls"])     # 穩定後的桌面狀態 (x_cm/y_cm)
+"""
+from __future__ import annotations
+
+import time, numpy as np
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+GATE_CM          = 3.0     # 預測位置與偵測距離上限
+CLASS_PENALTY_CM = 1.0     # 球號不同時額外的距離成本
+MAX_MISS         = 5       # 連續幾次沒配到就刪除 track
+LOCK_VOTES       = 3       # 至少幾次投票才算穩定
+LOCK_CONF        = 0.8     # 標籤票數佔比門檻
+REVERIFY         = 10      # 穩定 track 每 N 次仍完整分類一次，錯誤標籤不會鎖死
+CONF_EMA         = 0.5     # 偵測 conf 平滑係數
+VEL_EMA          = 0.5     # 速度平滑係數
+_BIG             = 1e6
+
+
+# ═════════ Hungarian ═════════
+
+def hungarian(cost) -> Tuple[np.ndarray, np.ndarray]:
+    """最小成本指派 (矩形矩陣可)，回傳 (rows, cols)，依 row 排序
+
+    位勢法 O(n²m)，內層以 numpy 向量化；球數 ≤ 16，一次 < 1 ms。
+    """
+    C = np.asarray(cost, np.float64)
+    n, m = C.shape
+    if n == 0 or m == 0:
+        return np.empty(0, int), np.empty(0, int)
+    flip = n > m
+    if flip:
+        C = C.T; n, m = m, n
+    u = np.zeros(n + 1); v = np.zeros(m + 1)
+    p = np.zeros(m + 1, int); way = np.zeros(m + 1, int)
+    for i in range(1, n + 1):
+        p[0] = i; j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, bool)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            cur = C[i0 - 1] - u[i0] - v[1:]
+            free = ~used[1:]
+            upd = free & (cur < minv[1:])
+            minv[1:][upd] = cur[upd]
+            way[1:][upd] = j0
+            mv = np.where(free, minv[1:], np.inf)
+            j1 = int(mv.argmin()) + 1
+            delta = mv[j1 - 1]
+            u[p[used]] += delta
+            v[used] -= delta
+            minv[1:][free] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]; p[j0] = p[j1]; j0 = j1
+    rows, cols = p[1:] - 1, np.arange(m)
+    keep = rows >= 0
+    rows, cols = rows[keep], cols[keep]
+    if flip:
+        rows, cols = cols, rows
+    order = np.argsort(rows)
+    return rows[order], cols[order]
+
+
+# ═════════ Track ═════════
+
+def _xy(b: dict) -> Tuple[float, float]:
+    """x_cm / cx_cm 兩種欄位都接受"""
+    return (b["x_cm"], b["y_cm"]) if "x_cm" in b else (b["cx_cm"], b["cy_cm"])
+
+
+class Track:
+    def __init__(self, tid: int, pos: np.ndarray, t: float):
+        self.id = tid
+        self.pos = pos.astype(np.float64)
+        self.vel = np.zeros(2)
+        self.t = t
+        self.hist: Dict[str, float] = defaultdict(float)
+        self.votes = 0
+        self.conf = 0.0
+        self.hits = 0
+        self.miss = 0
+
+    def predict(self, t: float) -> np.ndarray:
+        return self.pos + self.vel * (t - self.t)
+
+    @property
+    def label(self) -> Optional[str]:
+        return max(self.hist, key=self.hist.get) if self.hist else None
+
+    @property
+    def label_conf(self) -> float:
+        tot = sum(self.hist.values())
+        return self.hist[self.label] / tot if tot > 0 else 0.0
+
+    @property
+    def locked(self) -> bool:
+        return self.votes >= LOCK_VOTES and self.label_conf >= LOCK_CONF
+
+    def observe(self, pos: np.ndarray, b: dict, t: float) -> None:
+        dt = t - self.t
+        if dt > 0 and self.hits:
+            self.vel = VEL_EMA * (pos - self.pos) / dt + (1 - VEL_EMA) * self.vel
+        self.pos, self.t = pos, t
+        self.hits += 1; self.miss = 0
+        c = float(b.get("conf", 0.0))
+        self.conf = c if self.hits == 1 else CONF_EMA * c + (1 - CONF_EMA) * self.conf
+        if b.get("type") is not None:              # type=None：只更新位置，不投票
+            w = float(b.get("color_conf", c))      # 有判色票數比例 (houghball) 時以它加權
+            self.hist[str(b["type"])] += max(w, 1e-3)
+            self.votes += 1
+
+
+# ═════════ Tracker ═════════
+
+class BallTracker:
+    def __init__(self, gate_cm: float = GATE_CM, max_miss: int = MAX_MISS):
+        self.gate_cm = gate_cm
+        self.max_miss = max_miss
+        self.tracks: List[Track] = []
+        self._next = 0
+
+    def reset(self) -> None:
+        self.tracks = []
+
+    def _cost(self, P: np.ndarray, dets: Sequence[dict], D: np.ndarray) -> np.ndarray:
+        C = np.linalg.norm(P[:, None] - D[None], axis=-1)
+        for i, trk in enumerate(self.tracks):
+            lab = trk.label
+            if lab is None: continue
+            for j, b in enumerate(dets):
+                if b.get("type") is not None and str(b["type"]) != lab:
+                    C[i, j] += CLASS_PENALTY_CM
+        C[C > self.gate_cm + CLASS_PENALTY_CM] = _BIG
+        return C
+
+    def update(self, balls: Sequence[dict], t: Optional[float] = None) -> List[dict]:
+        """餵一幀偵測結果 → 回傳 state()"""
+        t = time.monotonic() if t is None else t
+        D = np.array([_xy(b) for b in balls], np.float64).reshape(-1, 2)
+        P = np.array([trk.predict(t) for trk in self.tracks]).reshape(-1, 2)
+        matched_t, matched_d = set(), set()
+        if len(P) and len(D):
+            C = self._cost(P, balls, D)
+            for i, j in zip(*hungarian(C)):
+                if C[i, j] >= _BIG: continue
+                self.tracks[i].observe(D[j], balls[j], t)
+                matched_t.add(i); matched_d.add(j)
+        for i, trk in enumerate(self.tracks):
+            if i not in matched_t:
+                trk.miss += 1
+                trk.vel *= 0.5
+        self.tracks = [trk for trk in self.tracks if trk.miss <= self.max_miss]
+        for j, b in enumerate(balls):
+            if j not in matched_d:
+                trk = Track(self._next, D[j], t); self._next += 1
+                trk.observe(D[j], b, t)
+                self.tracks.append(trk)
+        return self.state()
+
+    def state(self, max_miss: int = 0) -> List[dict]:
+        """穩定桌面狀態：最近 max_miss 幀內看過、且已有標籤的 track
+
+        預設只含這一幀有配到的球 (被打進袋的球不會殘留)；
+        連續串流時可放寬 max_miss 以蓋過偶發漏抓。
+        """
+        return [{"type": trk.label, "conf": round(trk.conf, 3),
+                 "x_cm": round(float(trk.pos[0]), 2), "y_cm": round(float(trk.pos[1]), 2),
+                 "track": trk.id, "label_conf": round(trk.label_conf, 3), "locked": trk.locked}
+                for trk in self.tracks if trk.miss <= max_miss and trk.label is not None]
+
+    def labels_hint(self, pts_cm, t: Optional[float] = None) -> List[Optional[Tuple[str, float]]]:
+        """每個點 → 已穩定 track 的 (球號, conf)，沒有就 None (需要完整分類)"""
+        t = time.monotonic() if t is None else t
+        pts = np.asarray(pts_cm, np.float64).reshape(-1, 2)
+        locked = [trk for trk in self.tracks if trk.locked and (trk.hits + 1) % REVERIFY]
+        if not locked or not len(pts):
+            return [None] * len(pts)
+        P = np.array([trk.predict(t) for trk in locked])
+        C = np.linalg.norm(pts[:, None] - P[None], axis=-1)
+        out: List[Optional[Tuple[str, float]]] = [None] * len(pts)
+        for i, j in zip(*hungarian(C)):
+            if C[i, j] <= self.gate_cm:
+                out[i] = (locked[j].label, round(locked[j].conf, 3))
+        return out
+
+
+# ═════════ 自我檢查 ═════════
+if __name__ == "__main__":
+    from itertools import permutations
+    rng = np.random.default_rng(0)
+    for _ in range(300):
+        n, m = rng.integers(1, 7, 2)
+        C = rng.uniform(0, 10, (n, m))
+        r, c = hungarian(C)
+        T = C if n <= m else C.T                     # 暴力解：短邊每列挑不重複的欄
+        best = min(sum(T[i, j] for i, j in enumerate(cols))
+                   for cols in permutations(range(T.shape[1]), T.shape[0]))
+        assert len(r) == min(n, m) and abs(C[r, c].sum() - best) < 1e-9, (C, r, c)
+    print("hungarian OK")
+
+    # 球號跳動：真實 '3' 偶爾被判成 '5'
+    trk = BallTracker()
+    for k in range(10):
+        flip = k in (3, 7)
+        trk.update([{"type": "0", "conf": 0.9, "x_cm": 10.0, "y_cm": 10.0},
+                    {"type": "5" if flip else "3", "conf": 0.6 if flip else 0.8,
+                     "x_cm": 40.0 + rng.normal(0, 0.2), "y_cm": 20.0}], t=k * 0.1)
+    print([(b["type"], b["label_conf"], b["locked"]) for b in trk.state()])
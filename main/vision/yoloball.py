@@ -6,14 +6,26 @@ YOLO 撞球偵測（Base = 球桌左上角）
 ‣ 使用 corner.json → Homography H(pixel→cm)，Base 原點 = 左上角 (0,0)。
 ‣ 偵測球心後直接輸出 Base‑XY (cm)。
 ‣ 修正袋口像素座標計算錯誤：改用 **H⁻¹(cm→pixel)** 反推四角。
+‣ burst=K：連拍 K 張一次批次推論，跨幀配對後輸出中位數球心 / 多數決球號 / 穩定度。
+‣ settle=True：以 motion_gate 偵測桌面靜止即拍，取代固定倒數 wait_sec。
+‣ cords.json 由背景 AsyncWriter 寫入 (佇列有上限，只保留最新快照)，不佔拍照→規劃的關鍵路徑；
+  需要檔案落地時呼叫 _WRITER.flush()。
+‣ H 由 CornerTracker 持有：每次拍照在縮小影像上檢查桌角，相機被碰歪時自動更新。
+‣ 各階段以 tracing.span 計時 (camera / undistort / corners / yolo.predict / yolo.convert / fuse)。
 """
 from __future__ import annotations
 
-import cv2, json, time, yaml, numpy as np
+import cv2, time, numpy as np
 from pathlib import Path
 from typing import Tuple, List
 from ultralytics import YOLO
 
+from vision.motion_gate import MotionGate, wait_still, STILL_SEC, TIMEOUT_SEC
+from vision.corner_tracker import CornerTracker
+from vision import coords
+from vision.async_writer import AsyncWriter
+import tracing
+
 # === 參數 ===
 CAM_URL     = 0
 SAVE_DIR    = Path("captures_json"); SAVE_DIR.mkdir(exist_ok=True)
@@ -25,73 +37,143 @@ MIN_SEP_CM  = 1.0
 MODEL_PATH  = "main/vision/best2.pt"
 CLASS_NAMES = ['2','2','2','3','3','14','6','3','5','2','4','3','3','0','1','1']
 CORNER_JSON = "main/vision/corner.json"
+FUSE_R_CM   = 2.0     # 跨幀配對半徑 (cm)
+MIN_STABLE  = 0.5     # 出現比例低於此值視為雜訊 (反光 / 模糊)
+TRACK_CORNERS = True  # 每次拍照檢查相機是否位移
+TRACK_PERSIST = False # 位移後是否寫回 corner.json
+DASHBOARD   = None    # gui.dashboard.Dashboard：有設定時預覽改送面板，不開 cv2 視窗
+
+_MODEL = None         # YOLO 只載入一次
+_TRACKER = None       # CornerTracker，持有目前的 H
+_WRITER = AsyncWriter(maxsize=4)   # cords.json 背景寫檔 (滿了丟最舊)
+_LAST = {"frame": None, "H": None}   # 最後一次 capture_balls 的原始影格 + H (session 錄製用)
+log = tracing.get_logger("yoloball")
 
 # ═════════ 公開 API ═════════
 
-def capture_balls(*, wait_sec:int=3, show:bool=False, intrinsics_path:str|None=None
-                  ) -> Tuple[str|None, dict|None]:
-    """拍照→偵測→座標轉換→JSON；Esc 取消回 (None,None)"""
+def capture_balls(*, wait_sec:int=3, show:bool=False, intrinsics_path:str|None=None,
+                  burst:int=1, settle:bool=False, still_sec:float=STILL_SEC,
+                  settle_timeout:float=TIMEOUT_SEC) -> Tuple[str|None, dict|None]:
+    """拍照→偵測→座標轉換→JSON；Esc 取消回 (None,None)
+
+    burst>1：連拍 burst 張，一次批次推論後做時間融合，
+    每顆球多一個 stability 欄位 (0~1，出現幀數比例)。
+    settle=True：忽略 wait_sec，桌面 ROI 靜止 still_sec 秒即拍；
+    settle_timeout 秒內未靜止回 (None,None)。
+    """
 
-    H = _load_homography(CORNER_JSON)   # pixel → cm
+    tracker=_tracker()
+    tracker.reload_if_changed()
+    H = tracker.H                       # pixel → cm
     K=D=None
     if intrinsics_path:
         K,D=_load_intrinsics(intrinsics_path)
 
-    img=_snap(wait_sec)
-    if img is None: return None,None
+    with tracing.span("camera"):
+        if settle:
+            imgs=_snap_settled(H,max(1,burst),still_sec,settle_timeout)
+        else:
+            imgs=_snap_burst(wait_sec,max(1,burst))
+    if imgs is None: return None,None
+    raw=imgs[0]
     if K is not None:
-        img=_undistort(img,K,D)
+        with tracing.span("undistort"):
+            imgs=[_undistort(im,K,D) for im in imgs]
+    if TRACK_CORNERS:
+        with tracing.span("corners"):
+            if tracker.update(imgs[0],force=True):
+                H=tracker.H
 
-    data,vis=_detect_and_convert(img,H)
+    _LAST.update(frame=raw,H=H)
+    if DASHBOARD is not None:
+        DASHBOARD.publish(frame=raw,H=H)   # 原始影格；面板以 K/D 去畸變後再套 H
+    results=_detect_batch(imgs,H,draw=show)
+    if len(results)==1:
+        data,vis=results[0]
+    else:
+        with tracing.span("fuse"):
+            data=_fuse([d['balls'] for d,_ in results],len(results))
+        vis=results[-1][1]
     if show:
-        cv2.imshow("YOLO",vis);cv2.waitKey(0);cv2.destroyAllWindows()
+        cv2.imshow("YOLO",vis);cv2.waitKey(0)
+        if DASHBOARD is None: cv2.destroyAllWindows()
+        else: cv2.destroyWindow("YOLO")        # 不關到面板視窗
 
+    if DASHBOARD is not None:
+        DASHBOARD.publish(data=data)
     out=SAVE_DIR/"cords.json"
-    with open(out,"w",encoding="utf-8") as f:
-        json.dump(data,f,ensure_ascii=False,indent=2)
-    print(f"[Saved] {out} ({len(data['balls'])} balls)")
+    _WRITER.write_json(out,data)        # 背景寫檔；呼叫端直接用回傳的 data
+    log.debug("[Queued] %s (%d balls)",out,len(data['balls']))
     return str(out),data
 
+def last_frame()->Tuple[np.ndarray|None,np.ndarray|None]:
+    """最後一次 capture_balls 的 (原始影格, H)"""
+    return _LAST["frame"],_LAST["H"]
+
 # ═════════ 私用工具 ═════════
 
 def _load_homography(corner_json:str)->np.ndarray:
-    with open(corner_json,'r',encoding='utf-8') as f:
-        c=json.load(f)
-    src=np.array([
-        [c['top_left']['x'],     c['top_left']['y']],
-        [c['top_right']['x'],    c['top_right']['y']],
-        [c['bottom_right']['x'], c['bottom_right']['y']],
-        [c['bottom_left']['x'],  c['bottom_left']['y']],
-    ],dtype=np.float32)
-    dst=np.array([[0,0],[TABLE_W_CM,0],[TABLE_W_CM,TABLE_H_CM],[0,TABLE_H_CM]],dtype=np.float32)
-    return cv2.getPerspectiveTransform(src,dst)   # 3×3 pixel→cm
+    return coords.load_homography(corner_json,TABLE_W_CM,TABLE_H_CM)   # 3×3 pixel→cm
+
+def _tracker()->CornerTracker:
+    global _TRACKER
+    if _TRACKER is None:
+        _TRACKER=CornerTracker(_load_homography(CORNER_JSON),corner_json=CORNER_JSON,
+                               loader=_load_homography,persist=TRACK_PERSIST)
+    return _TRACKER
 
 def _load_intrinsics(p:str):
-    d=yaml.safe_load(open(p,'r'))
-    M=d.get('camera_matrix',d.get('K'))
-    if isinstance(M,dict):M=M['data']
-    K=np.array(M,dtype=np.float32).reshape(3,3)
-    D_=d.get('distortion_coefficients',d.get('dist_coeff',d.get('D')))
-    if isinstance(D_,dict):D_=D_['data']
-    D=np.array(D_,dtype=np.float32)
-    return K,D
+    return coords.load_intrinsics(p)
 
 # --- 拍照工具 ---
 
 def _snap(wait:int):
+    imgs=_snap_burst(wait,1)
+    return None if imgs is None else imgs[0]
+
+def _snap_burst(wait:int,k:int):
+    """倒數後連拍 k 張 (中間不做任何處理，縮短連拍間隔)"""
     cap=cv2.VideoCapture(CAM_URL)
     if not cap.isOpened():raise RuntimeError('Camera open fail')
     end=time.time()+wait
-    img=None
     while time.time()<end:
         ok,frm=cap.read()
+        if DASHBOARD is not None:
+            if ok: DASHBOARD.publish(frame=frm)
+            time.sleep(0.03);continue
         if ok:
             _draw_preview(frm,int(end-time.time())+1)
         if cv2.waitKey(30)&0xFF==27:
-            cap.release();cv2.destroyAllWindows();return None
-    ok,img=cap.read();cap.release();cv2.destroyAllWindows()
-    if not ok:raise RuntimeError('Snap fail')
-    return img
+            _release(cap);return None
+    imgs=[]
+    for _ in range(k):
+        ok,img=cap.read()
+        if ok: imgs.append(img)
+    _release(cap)
+    if not imgs:raise RuntimeError('Snap fail')
+    return imgs
+
+def _snap_settled(H:np.ndarray,k:int,still_sec:float,timeout:float):
+    """等桌面靜止 → 靜止那張 + 再連拍 k-1 張；未靜止回 None"""
+    cap=cv2.VideoCapture(CAM_URL)
+    if not cap.isOpened():raise RuntimeError('Camera open fail')
+    gate=MotionGate(_table_px(H),still_sec=still_sec)
+    on_frame=None if DASHBOARD is None else (lambda f:DASHBOARD.publish(frame=f))
+    frm,waited=wait_still(cap,gate,timeout=timeout,preview=DASHBOARD is None,on_frame=on_frame)
+    if frm is None:
+        _release(cap);return None
+    imgs=[frm]
+    for _ in range(k-1):
+        ok,img=cap.read()
+        if ok: imgs.append(img)
+    _release(cap)
+    log.info("[Gate] 靜止觸發，等待 %.2fs",waited)
+    return imgs
+
+def _release(cap):
+    """關相機；有 Dashboard 時不關視窗 (面板視窗由主執行緒 show())"""
+    cap.release()
+    if DASHBOARD is None: cv2.destroyAllWindows()
 
 def _draw_preview(f,sec):
     cv2.putText(f,f"倒數 {sec}s",(20,40),cv2.FONT_HERSHEY_SIMPLEX,1.2,(0,255,0),3)
@@ -105,49 +187,124 @@ def _undistort(img,K,D):
     return cv2.undistort(img,K,D,None,newK)
 
 
-def _detect_and_convert(img:np.ndarray,H:np.ndarray):
-    H_inv=np.linalg.inv(H)
-    # 4 corner cm → pixel
-    cm_corners=np.array([[0,0],[TABLE_W_CM,0],[TABLE_W_CM,TABLE_H_CM],[0,TABLE_H_CM]],dtype=np.float32)
-    px_corners=cv2.perspectiveTransform(cm_corners.reshape(-1,1,2),H_inv).reshape(-1,2)
-    tl,tr,br,bl=px_corners
+def _get_model():
+    global _MODEL
+    if _MODEL is None:
+        _MODEL=YOLO(MODEL_PATH)
+    return _MODEL
 
-    # pockets: 4角+2邊中點
-    pockets=[tuple(tl),tuple(tr),tuple(br),tuple(bl),tuple((tl+tr)/2),tuple((bl+br)/2)]
+def _detect_and_convert(img:np.ndarray,H:np.ndarray,draw:bool=True):
+    return _detect_batch([img],H,draw=draw)[0]
 
-    vis=img.copy()
-    for px,py in pockets:
-        cv2.circle(vis,(int(px),int(py)),POCKET_R_PX,(255,0,255),2)
+def _detect_batch(imgs:List[np.ndarray],H:np.ndarray,draw:bool=False):
+    """多張影像一次送進 YOLO (batch)，回傳 [(data,vis), ...]；draw=False 時 vis=None"""
+    with tracing.span("yolo.predict"):
+        rs=_get_model().predict(imgs,imgsz=640,conf=CONF_THRES,verbose=False)
+    with tracing.span("yolo.convert"):
+        geom=_table_geom(H)
+        return [_convert(img,r,H,geom,draw) for img,r in zip(imgs,rs)]
+
+def _table_px(H:np.ndarray)->np.ndarray:
+    """4 corner cm → pixel (tl,tr,br,bl)"""
+    H_inv=np.linalg.inv(H)
+    cm_corners=np.array([[0,0],[TABLE_W_CM,0],[TABLE_W_CM,TABLE_H_CM],[0,TABLE_H_CM]],dtype=np.float32)
+    return cv2.perspectiveTransform(cm_corners.reshape(-1,1,2),H_inv).reshape(-1,2)
 
-    model=YOLO(MODEL_PATH)
-    r=model.predict(img,imgsz=640,conf=CONF_THRES,verbose=False)[0]
-    dets=sorted(zip(r.boxes.xyxy.cpu().numpy(), r.boxes.cls.cpu().numpy(), r.boxes.conf.cpu().numpy()),
-                key=lambda x:float(x[2]), reverse=True)
+def _table_geom(H:np.ndarray):
+    """H → (6 袋口像素座標 (6,2), 最小球距 px)；每批只算一次"""
+    tl,tr,br,bl=_table_px(H)
 
-    # 影像→cm 轉換函式
-    def px2cm(pt):
-        x,y=pt; v=H @ np.array([x,y,1.0]); return v[0]/v[2], v[1]/v[2]
+    # pockets: 4角+2邊中點
+    pockets=np.array([tl,tr,br,bl,(tl+tr)/2,(bl+br)/2],dtype=np.float64)
 
     # px_per_cm for min‑sep
     table_px_w=np.linalg.norm(tr-tl)
     table_px_h=np.linalg.norm(bl-tl)
     min_sep_px=MIN_SEP_CM*(table_px_w/TABLE_W_CM+table_px_h/TABLE_H_CM)/2
+    return pockets,float(min_sep_px)
 
-    balls,centers=[],[]
-    for box,cls,cf in dets:
-        x1,y1,x2,y2=map(int,box); cx,cy=(x1+x2)//2,(y1+y2)//2
-        if any((cx-px)**2+(cy-py)**2<=POCKET_R_PX**2 for px,py in pockets):
-            continue
-        if any((cx-x0)**2+(cy-y0)**2<min_sep_px**2 for x0,y0 in centers):
-            continue
-        x_cm,y_cm=px2cm((cx,cy))
-        balls.append({"type":CLASS_NAMES[int(cls)],"conf":round(float(cf),3),"x_cm":round(x_cm,2),"y_cm":round(y_cm,2)})
-        centers.append((cx,cy))
-        cv2.rectangle(vis,(x1,y1),(x2,y2),(0,255,255),2)
-        cv2.putText(vis,CLASS_NAMES[int(cls)],(x1,y1-6),cv2.FONT_HERSHEY_SIMPLEX,0.6,(0,255,255),2)
+def _convert(img:np.ndarray,r,H:np.ndarray,geom,draw:bool=False):
+    """YOLO 結果 → 球列表；袋口排除 / 最小距離抑制 / 座標轉換皆以陣列一次完成"""
+    pockets,min_sep_px=geom
+    xyxy=r.boxes.xyxy.cpu().numpy(); cls=r.boxes.cls.cpu().numpy().astype(int); cf=r.boxes.conf.cpu().numpy()
+
+    order=np.argsort(-cf,kind='stable')                 # 信心高→低
+    boxes=xyxy[order].astype(int); cls=cls[order]; cf=cf[order]
+    ctr=(boxes[:,:2]+boxes[:,2:])//2                    # (N,2) 球心 px
 
+    # 袋口遮罩：(N,6) 距離平方一次算完
+    d2=((ctr[:,None,:]-pockets[None,:,:])**2).sum(-1)
+    keep=~(d2<=POCKET_R_PX**2).any(axis=1)
+    boxes,ctr,cls,cf=boxes[keep],ctr[keep],cls[keep],cf[keep]
+
+    # 最小距離抑制：兩兩距離矩陣 + 依信心貪婪保留 (只處理有衝突的列)
+    close=((ctr[:,None,:]-ctr[None,:,:])**2).sum(-1)<min_sep_px**2
+    close=np.triu(close,1)
+    alive=np.ones(len(ctr),bool)
+    for i in np.flatnonzero(close.any(axis=1)):
+        if alive[i]: alive&=~close[i]
+    boxes,ctr,cls,cf=boxes[alive],ctr[alive],cls[alive],cf[alive]
+
+    # 影像→cm：全部球心一次 perspectiveTransform
+    if len(ctr):
+        cm=cv2.perspectiveTransform(ctr.astype(np.float64).reshape(-1,1,2),H).reshape(-1,2)
+    else:
+        cm=np.empty((0,2))
+    names=[CLASS_NAMES[c] for c in cls]
+    balls=[{"type":n,"conf":c,"x_cm":x,"y_cm":y}
+           for n,c,(x,y) in zip(names,np.round(cf.astype(float),3).tolist(),np.round(cm,2).tolist())]
+
+    vis=_draw_vis(img,pockets,boxes,names) if draw else None
     return {"timestamp":time.strftime("%Y%m%d_%H%M%S"),"balls":balls},vis
 
+def _draw_vis(img,pockets,boxes,names):
+    vis=img.copy()
+    for px,py in pockets:
+        cv2.circle(vis,(int(px),int(py)),POCKET_R_PX,(255,0,255),2)
+    for (x1,y1,x2,y2),n in zip(boxes.tolist(),names):
+        cv2.rectangle(vis,(x1,y1),(x2,y2),(0,255,255),2)
+        cv2.putText(vis,n,(x1,y1-6),cv2.FONT_HERSHEY_SIMPLEX,0.6,(0,255,255),2)
+    return vis
+
+# --- 多幀融合 ---
+
+def _fuse(frames:List[List[dict]],k:int)->dict:
+    """跨幀配對 → 中位數球心、多數決球號、穩定度
+
+    逐幀以貪婪最近鄰 (≤FUSE_R_CM) 把偵測掛到既有軌跡，
+    每條軌跡每幀最多一筆；配不上的開新軌跡。
+    """
+    tracks:List[List[dict]]=[]
+    for balls in frames:
+        if not balls: continue
+        P=np.array([[b['x_cm'],b['y_cm']] for b in balls])
+        used=np.zeros(len(balls),bool)
+        if tracks:
+            C=np.array([np.median([[b['x_cm'],b['y_cm']] for b in t],axis=0) for t in tracks])
+            D2=((C[:,None,:]-P[None,:,:])**2).sum(-1)
+            taken=np.zeros(len(tracks),bool)
+            for idx in np.argsort(D2,axis=None):
+                ti,bi=divmod(int(idx),len(balls))
+                if D2[ti,bi]>FUSE_R_CM**2: break
+                if taken[ti] or used[bi]: continue
+                tracks[ti].append(balls[bi]); taken[ti]=used[bi]=True
+        tracks+=[[b] for b,u in zip(balls,used) if not u]
+
+    out=[]
+    for t in tracks:
+        stab=len(t)/k
+        if stab<MIN_STABLE: continue
+        votes={}
+        for b in t:
+            n,c=votes.get(b['type'],(0,0.0)); votes[b['type']]=(n+1,c+b['conf'])
+        typ,(n,c)=max(votes.items(),key=lambda kv:kv[1])   # 票數優先，同票比信心和
+        out.append({"type":typ,"conf":round(c/n,3),
+                    "x_cm":round(float(np.median([b['x_cm'] for b in t])),2),
+                    "y_cm":round(float(np.median([b['y_cm'] for b in t])),2),
+                    "stability":round(stab,2)})
+    out.sort(key=lambda b:b['conf'],reverse=True)
+    return {"timestamp":time.strftime("%Y%m%d_%H%M%S"),"balls":out,"frames":k}
+
 # ═════════ CLI ═════════
 if __name__=='__main__':
     capture_balls(wait_sec=3,show=True)
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# 模組以 main/ 為根匯入 (from vision.x import ...)，同 PYTHONPATH=main
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "main"))
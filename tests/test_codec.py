@@ -0,0 +1,77 @@
+"""communicate.codec：任意切段、整批串接、夾雜雜訊都能還原原本的訊息序列"""
+import random
+
+import pytest
+
+from communicate.codec import MAX_FRAME, STX, FrameDecoder, encode, encode_batch
+
+WORDS = ["MOVING", "EXIT", "100", "200", "12.50, -3.20, 375.00", "", "中文"]
+NOISE = bytes(b for b in range(256) if b not in (0x7B, STX))      # 不會被當成訊框開頭的位元組
+
+
+def random_msgs(rng, binary):
+    msgs = []
+    for _ in range(rng.randint(1, 20)):
+        if binary and rng.random() < 0.3:
+            msgs.append(bytes(rng.randrange(256) for _ in range(rng.randint(0, 40))))
+        else:
+            msgs.append(rng.choice(WORDS))
+    return msgs
+
+
+def feed_split(dec, stream, rng):
+    """隨機切段餵入 (含 1 byte 一段、整段一次)"""
+    got, i = [], 0
+    while i < len(stream):
+        k = rng.choice([1, 2, 3, rng.randint(1, 64), len(stream)])
+        got += dec.feed(bytes(stream[i:i + k]))
+        i += k
+    return got
+
+
+@pytest.mark.parametrize("binary", [False, True], ids=["text", "binary"])
+def test_random_split(binary):
+    rng = random.Random(0)
+    for trial in range(1000):
+        msgs = random_msgs(rng, binary)
+        dec = FrameDecoder(binary=binary)
+        assert feed_split(dec, encode_batch(msgs), rng) == msgs, trial
+        assert len(dec) == 0
+
+
+@pytest.mark.parametrize("binary", [False, True], ids=["text", "binary"])
+def test_concatenated_batches(binary):
+    """多批 encode_batch 接在一起一次收到 (控制器一次送好幾則)"""
+    rng = random.Random(1)
+    for _ in range(200):
+        batches = [random_msgs(rng, binary) for _ in range(rng.randint(2, 6))]
+        dec = FrameDecoder(binary=binary)
+        assert dec.feed(b"".join(encode_batch(b) for b in batches)) == [m for b in batches for m in b]
+        assert len(dec) == 0
+
+
+@pytest.mark.parametrize("binary", [False, True], ids=["text", "binary"])
+def test_garbage_between_frames(binary):
+    rng = random.Random(2)
+    for trial in range(1000):
+        msgs = random_msgs(rng, binary)
+        stream, noise = bytearray(), 0
+        for m in msgs:
+            if rng.random() < 0.3:
+                junk = bytes(rng.choice(NOISE) for _ in range(rng.randint(1, 8)))
+                stream += junk
+                noise += len(junk)
+            stream += encode_batch([m])
+        dec = FrameDecoder(binary=binary)
+        assert feed_split(dec, stream, rng) == msgs, trial
+        assert dec.dropped == noise
+        assert len(dec) == 0
+
+
+def test_resync_after_unterminated_frame():
+    """'{' 之後一直等不到 '}' → 超過 MAX_FRAME 就丟掉，後面的訊框照常收到"""
+    dec = FrameDecoder(max_frame=64)
+    assert dec.feed(b"{" + b"x" * 100) == []
+    assert dec.feed(encode("MOVING")) == ["MOVING"]
+    assert dec.dropped > 0
+    assert len(FrameDecoder().feed(b"{" + b"x" * MAX_FRAME)) == 0
@@ -0,0 +1,64 @@
+"""vision.color_lut：查表判號與 houghball.classify_ball (逐顆平均 HSV 規則) 結果一致"""
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+
+from vision import color_lut, houghball
+
+CAPTURES = sorted((Path(__file__).resolve().parents[1] / "main" / "captured_images").glob("*.jpg"))
+
+
+@pytest.fixture(autouse=True)
+def fresh_lut(monkeypatch):
+    """直接建表，不讀寫使用者快取"""
+    monkeypatch.setattr(houghball, "_LUT", color_lut.build_lut(houghball.COLOR_RANGES))
+
+
+def circles(img):
+    """舊版 capture_balls 的整張 Hough 參數，不依賴 corner.json 的解析度"""
+    gray = cv2.medianBlur(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY), 5)
+    c = cv2.HoughCircles(gray, cv2.HOUGH_GRADIENT, 1.1, 35,
+                         param1=80, param2=25, minRadius=20, maxRadius=45)
+    return np.empty((0, 3), int) if c is None else np.round(c[0]).astype(int)
+
+
+def legacy(img, c):
+    """舊版逐顆判號：整張 HSV + 圓形遮罩 → classify_ball"""
+    hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+    out = []
+    for cx, cy, r in c.tolist():
+        m = np.zeros(img.shape[:2], np.uint8)
+        cv2.circle(m, (cx, cy), r, 255, -1)
+        out.append(houghball.classify_ball(hsv[m == 255]))
+    return out
+
+
+@pytest.mark.parametrize("path", CAPTURES, ids=lambda p: p.stem)
+def test_lut_matches_classify_ball(path):
+    img = cv2.imread(str(path))
+    c = circles(img)
+    assert len(c)
+    assert [b for b, _ in houghball._classify_batch(img, c)] == legacy(img, c)
+
+
+def test_shadow_pixels_do_not_turn_balls_black():
+    """球緣一圈暗像素 (陰影) 佔多數時，平均色仍是彩球，不能被投成 8 號"""
+    S, R = 41, 20
+    yy, xx = np.mgrid[:S, :S] - R
+    d2 = xx ** 2 + yy ** 2
+    patch = np.zeros((S, S, 3), np.uint8)
+    patch[d2 <= R ** 2] = (60, 40, 40)                 # 暗綠陰影 (單像素判成黑)
+    patch[d2 <= 9 ** 2] = (60, 230, 230)               # 中心綠色
+    img = cv2.cvtColor(patch, cv2.COLOR_HSV2BGR)
+    c = np.array([[R, R, R]])
+    assert houghball._classify_batch(img, c)[0][0] == legacy(img, c)[0] == "6"
+
+
+def test_cue_and_empty():
+    img = np.full((41, 41, 3), 255, np.uint8)
+    assert houghball._classify_batch(img, np.array([[20, 20, 18]]))[0][0] == "0"
+    lut = houghball._lut()
+    hsv = np.zeros((1, 3, 3, 3), np.uint8)
+    assert color_lut.classify(lut, hsv, np.zeros((1, 3, 3), bool), houghball.COLOR_TO_BALL) == [(None, 0.0)]
@@ -0,0 +1,74 @@
+"""vision.coords：像素 ↔ 桌面 ↔ 手臂 往返，以及 plan_to_robot 與舊版 main.py 算式一致"""
+import math
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from vision import coords
+from vision.coords import CoordChain
+
+VISION = Path(__file__).resolve().parents[1] / "main" / "vision"
+TABLE_TO_ROBOT = [[10.0, 0.0, 0.0], [0.0, -10.0, 375.0], [0.0, 0.0, 1.0]]
+
+
+@pytest.fixture(scope="module")
+def chain():
+    H = coords.load_homography(str(VISION / "corner.json"))
+    K, D = coords.load_intrinsics(str(VISION / "intrinsics.yaml"))
+    return CoordChain(H, np.array(TABLE_TO_ROBOT), K, D)
+
+
+@pytest.fixture(scope="module")
+def raw():
+    return np.random.default_rng(0).uniform([200, 150], [1700, 950], (500, 2))
+
+
+def legacy(angle, cue_xy, j6_diff=0.0):
+    """原本 main.py 的換算：arm_angle = −angle，x = cue·1000，y = 375 − cue·1000，再沿出桿方向補 j6_diff"""
+    arm_angle = -angle
+    x, y = cue_xy[0] * 1000, 375 - cue_xy[1] * 1000
+    x += j6_diff * math.cos(math.radians(arm_angle))
+    y += j6_diff * math.sin(math.radians(arm_angle))
+    return arm_angle, x, y
+
+
+def test_corner_json_maps_to_table_corners(chain):
+    c = coords.table_corners_cm()
+    px = chain.transform(c, "table", "px")
+    assert np.allclose(chain.transform(px, "px", "table"), c, atol=1e-6)
+
+
+@pytest.mark.parametrize("a,b", [("raw", "px"), ("px", "table"), ("table", "robot"), ("raw", "robot")])
+def test_round_trip(chain, raw, a, b):
+    src = raw if a == "raw" else chain.transform(raw, "raw", a)
+    back = chain.transform(chain.transform(src, a, b), b, a)
+    assert np.abs(back - src).max() < (1e-2 if a == "raw" else 1e-6)
+
+
+def test_pixel_to_robot_composes(chain, raw):
+    step = chain.transform(chain.transform(chain.transform(raw, "raw", "px"), "px", "table"), "table", "robot")
+    assert np.allclose(chain.transform(raw, "raw", "robot"), step, atol=1e-6)
+
+
+def test_empty_batch(chain):
+    assert chain.transform(np.empty((0, 2)), "raw", "robot").shape == (0, 2)
+
+
+@pytest.mark.parametrize("angle,cue", [(30.0, (0.2, 0.1)), (-135.0, (0.6, 0.3)), (90.0, (0.0, 0.375)),
+                                       (179.5, (0.735, 0.0))])
+@pytest.mark.parametrize("j6", [0.0, 4.0])
+def test_plan_to_robot_matches_legacy(chain, angle, cue, j6):
+    a, x, y = chain.plan_to_robot(angle, cue, tool_offset_mm=j6)
+    la, lx, ly = legacy(angle, cue, j6)
+    assert ((a - la + 180) % 360 - 180) == pytest.approx(0, abs=0.01)
+    assert (x, y) == pytest.approx((lx, ly), abs=0.01)
+
+
+def test_plans_to_robot_batch(chain):
+    rng = np.random.default_rng(1)
+    angles = rng.uniform(-180, 180, 50)
+    cues = rng.uniform([0, 0], [0.735, 0.375], (50, 2))
+    batch = chain.plans_to_robot(angles, cues, tool_offset_mm=4.0)
+    for (a, x, y), ang, cue in zip(batch, angles, cues):
+        assert (round(a, 2), round(x, 2), round(y, 2)) == chain.plan_to_robot(ang, cue, 4.0)